@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, List, cast
+from typing import Any, List, Optional, cast
 
 import mitzu.adapters.generic_adapter as GA
 import mitzu.adapters.sqlalchemy.athena.sqlalchemy.datatype as DA_T
@@ -52,6 +52,12 @@ class AthenaAdapter(SQLAlchemyAdapter):
             return M.DataType.STRUCT
         return super().map_type(sa_type)
 
+    def _information_schema_support(self) -> bool:
+        return True
+
+    def _parse_information_schema_type(self, type_str: str) -> Optional[TypeEngine]:
+        return DA_T.parse_sqltype(type_str)
+
     def _parse_map_type(
         self, sa_type: Any, name: str, event_data_table: M.EventDataTable
     ) -> M.Field:
@@ -43,6 +43,14 @@ class GenericDatasetAdapter(ABC):
         """Returns physical columns including structs for a table"""
         raise NotImplementedError()
 
+    def list_all_table_columns_bulk(
+        self, schema: str, table_names: List[str]
+    ) -> Dict[str, List[M.Field]]:
+        """Returns physical columns including structs for multiple tables of a schema.
+        Tables that couldn't be reflected are left out of the result.
+        """
+        raise NotImplementedError()
+
     def get_distinct_event_names(self, event_data_table: M.EventDataTable) -> List[str]:
         raise NotImplementedError()
 
@@ -17,6 +17,9 @@ class MySQLAdapter(SQLAlchemyAdapter):
     def __init__(self, project: M.Project):
         super().__init__(project)
 
+    def _information_schema_support(self) -> bool:
+        return True
+
     def _get_distinct_array_agg_func(self, field_ref: FieldReference) -> Any:
         return SA.func.cast(
             SA.func.json_keys(
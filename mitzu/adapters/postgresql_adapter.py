@@ -23,6 +23,9 @@ class PostgresqlAdapter(SQLAlchemyAdapter):
     def __init__(self, project: M.Project):
         super().__init__(project)
 
+    def _information_schema_support(self) -> bool:
+        return True
+
     def get_field_reference(
         self,
         field: M.Field,
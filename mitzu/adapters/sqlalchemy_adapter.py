@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 import logging
-from typing import Any, Dict, List, Optional, Union, cast
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union, cast
 
 import mitzu.adapters.generic_adapter as GA
 import mitzu.model as M
@@ -15,7 +17,7 @@ import sqlalchemy as SA
 import sqlalchemy.sql.expression as EXP
 import sqlalchemy.sql.sqltypes as SA_T
 from sqlalchemy.orm import aliased
-from sqlalchemy.sql.type_api import TypeEngine
+from sqlalchemy.sql.type_api import TypeEngine, to_instance
 from mitzu.helper import LOGGER
 import traceback
 
@@ -29,6 +31,7 @@ COLUMN_NAME_REPLACE_STR = "___"
 
 FieldReference = Union[SA.Column, EXP.Label]
 SAMPLED_SOURCE_CTE_NAME = "sampled_source"
+REFLECTION_CONCURRENCY = 8
 
 
 SIMPLE_TYPE_MAPPINGS = {
@@ -82,7 +85,13 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
     def __init__(self, project: M.Project):
         super().__init__(project)
         self._table_cache: Dict[str, SA.Table] = {}
+        self._table_cache_lock = threading.Lock()
+        self._table_alias_count = 0
+        self._restored_tables: Set[str] = set()
         self._connection: SA.engine.Connection = None
+        self._connection_lock = threading.Lock()
+        # connections of the queries running in other threads, stop_current_execution closes them
+        self._running_connections: Set[SA.engine.Connection] = set()
         self._engine: SA.engine.Engine = None
 
     def get_event_name_field(
@@ -126,30 +135,48 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
     def keep_alive_connection(self) -> bool:
         return False
 
+    def _fetch_df(self, connection: SA.engine.Connection, query: Any) -> pd.DataFrame:
+        cursor_result = connection.execute(query)
+        columns = cursor_result.keys()
+        fetched = cursor_result.fetchall()
+        if len(fetched) > 0:
+            pdf = pd.DataFrame(fetched)
+            pdf.columns = columns
+        else:
+            pdf = pd.DataFrame(columns=columns)
+        return pdf
+
     def execute_query(self, query: Any) -> pd.DataFrame:
+        """
+        The adapter may be shared by threads (e.g. dashboard refreshes), every query gets its own connection
+        from the pool of the engine, only the kept alive connection is shared and used by one query at a time.
+        """
         engine = self.get_engine()
 
+        if H.LOGGER.isEnabledFor(logging.DEBUG):
+            H.LOGGER.debug(f"Query:\n{format_query(query)}")
         try:
-            if H.LOGGER.isEnabledFor(logging.DEBUG):
-                H.LOGGER.debug(f"Query:\n{format_query(query)}")
-            if self._connection is None:
-                self._connection = engine.connect()
-            cursor_result = self._connection.execute(query)
-            columns = cursor_result.keys()
-            fetched = cursor_result.fetchall()
-            if len(fetched) > 0:
-                pdf = pd.DataFrame(fetched)
-                pdf.columns = columns
-            else:
-                pdf = pd.DataFrame(columns=columns)
-            return pdf
+            if self.keep_alive_connection():
+                with self._connection_lock:
+                    if self._connection is None:
+                        self._connection = engine.connect()
+                    try:
+                        return self._fetch_df(self._connection, query)
+                    except Exception:
+                        self._connection = None
+                        raise
+
+            with engine.connect() as connection:
+                with self._connection_lock:
+                    self._running_connections.add(connection)
+                try:
+                    return self._fetch_df(connection, query)
+                finally:
+                    with self._connection_lock:
+                        self._running_connections.discard(connection)
         except Exception as exc:
-            self._connection = None
             H.LOGGER.error(f"Failed Query:\n{format_query(query)}")
             raise exc
-        finally:
-            if not self.keep_alive_connection():
-                self._connection = None
 
     def get_engine(self) -> SA.engine.Engine:
         con = self.project.connection
@@ -169,16 +196,23 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
             raise SQLAlchemyAdapterError(f"Failed to connect to {full_name}") from e
 
         if full_name not in self._table_cache:
-            metadata_obj = SA.MetaData()
-            self._table_cache[full_name] = SA.Table(
+            # Reflection happens outside of the lock, so tables can be reflected concurrently
+            table = SA.Table(
                 table_name,
-                metadata_obj,
+                SA.MetaData(),
                 schema=schema,
                 autoload_with=engine,
                 autoload=True,
-            ).alias(f"t{len(self._table_cache)+1}")
+            )
+            with self._table_cache_lock:
+                if full_name not in self._table_cache:
+                    self._add_table_to_cache(full_name, table)
         return self._table_cache[full_name]
 
+    def _add_table_to_cache(self, full_name: str, table: SA.Table):
+        self._table_alias_count += 1
+        self._table_cache[full_name] = table.alias(f"t{self._table_alias_count}")
+
     def get_table(self, event_data_table: M.EventDataTable) -> SA.Table:
         if event_data_table.schema is not None:
             schema = event_data_table.schema
@@ -186,7 +220,32 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
             schema = self.project.connection.schema
         else:
             raise ValueError("Event data table doesn't have schema defined")
-        return self.get_table_by_name(schema, event_data_table.table_name)
+
+        table_name = event_data_table.table_name
+        full_name = f"{schema}.{table_name}"
+        columns = self.project.get_table_columns(event_data_table)
+        with self._table_cache_lock:
+            if columns is not None and full_name not in self._table_cache:
+                # Building the table from the known columns spares the reflection round trip
+                table = SA.Table(
+                    table_name,
+                    SA.MetaData(),
+                    *[SA.Column(name, sa_type) for name, sa_type in columns],
+                    schema=schema,
+                )
+                self._add_table_to_cache(full_name, table)
+                self._restored_tables.add(full_name)
+            elif columns is None and full_name in self._restored_tables:
+                # The known columns were invalidated, the table needs to be reflected again
+                self._table_cache.pop(full_name)
+                self._restored_tables.remove(full_name)
+
+        table = self.get_table_by_name(schema, table_name)
+        if columns is None:
+            self.project.restore_table_columns(
+                event_data_table, [(col.name, col.type) for col in table.columns]
+            )
+        return table
 
     def get_field_reference(
         self,
@@ -344,16 +403,23 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
 
     def list_all_table_columns(self, schema: str, table_name: str) -> List[M.Field]:
         table = self.get_table_by_name(schema, table_name)
-        field_types = table.columns
+        return self._columns_to_fields(
+            (field_name, field_type.type)
+            for field_name, field_type in table.columns.items()
+        )
+
+    def _columns_to_fields(
+        self, columns: Iterable[Tuple[str, TypeEngine]]
+    ) -> List[M.Field]:
         res = []
-        for field_name, field_type in field_types.items():
+        for field_name, sa_type in columns:
             if "." in field_name:
                 # Columns with periods are not supported
                 continue
-            data_type = self.map_type(field_type.type)
+            data_type = self.map_type(sa_type)
             if data_type == M.DataType.STRUCT:
                 complex_field = self._parse_struct_type(
-                    sa_type=field_type.type,
+                    sa_type=sa_type,
                     name=field_name,
                     path=field_name,
                 )
@@ -368,6 +434,93 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
                 res.append(field)
         return res
 
+    def list_all_table_columns_bulk(
+        self, schema: str, table_names: List[str]
+    ) -> Dict[str, List[M.Field]]:
+        res: Dict[str, List[M.Field]] = {}
+        if len(table_names) == 0:
+            return res
+
+        if self._information_schema_support():
+            try:
+                column_types = self._get_information_schema_column_types(
+                    schema, table_names
+                )
+            except Exception as exc:
+                LOGGER.warn(f"Failed to list columns from information schema: {exc}")
+                column_types = {}
+            for table_name, columns in column_types.items():
+                # Tables with unrecognized column types are reflected one by one
+                if all(sa_type is not None for _, sa_type in columns):
+                    res[table_name] = self._columns_to_fields(
+                        cast(List[Tuple[str, TypeEngine]], columns)
+                    )
+
+        def reflect(table_name: str) -> Optional[List[M.Field]]:
+            try:
+                return self.list_all_table_columns(schema, table_name)
+            except Exception as exc:
+                LOGGER.warn(f"Failed to reflect {schema}.{table_name}: {exc}")
+                return None
+
+        missing = [t for t in table_names if t not in res]
+        workers = min(len(missing), self._reflection_concurrency())
+        if workers <= 1:
+            reflected = [reflect(t) for t in missing]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                reflected = list(executor.map(reflect, missing))
+
+        for table_name, fields in zip(missing, reflected):
+            if fields is not None:
+                res[table_name] = fields
+        return res
+
+    def _reflection_concurrency(self) -> int:
+        return REFLECTION_CONCURRENCY
+
+    def _information_schema_support(self) -> bool:
+        return False
+
+    def _parse_information_schema_type(self, type_str: str) -> Optional[TypeEngine]:
+        type_cls = self.get_engine().dialect.ischema_names.get(type_str.lower())
+        if type_cls is None:
+            return None
+        return to_instance(type_cls)
+
+    def _get_information_schema_column_types(
+        self, schema: str, table_names: List[str]
+    ) -> Dict[str, List[Tuple[str, Optional[TypeEngine]]]]:
+        columns = SA.table(
+            "columns",
+            SA.column("table_schema"),
+            SA.column("table_name"),
+            SA.column("column_name"),
+            SA.column("data_type"),
+            SA.column("ordinal_position"),
+            schema="information_schema",
+        )
+        pdf = self.execute_query(
+            SA.select(
+                columns=[
+                    columns.c.table_name,
+                    columns.c.column_name,
+                    columns.c.data_type,
+                ],
+                whereclause=(
+                    (columns.c.table_schema == schema)
+                    & (columns.c.table_name.in_(table_names))
+                ),
+            ).order_by(columns.c.table_name, columns.c.ordinal_position)
+        )
+        res: Dict[str, List[Tuple[str, Optional[TypeEngine]]]] = {}
+        for table_name, column_name, data_type in pdf.itertuples(index=False):
+            sa_type = self._parse_information_schema_type(data_type)
+            if isinstance(sa_type, SA_T.NullType):
+                sa_type = None
+            res.setdefault(table_name, []).append((column_name, sa_type))
+        return res
+
     def get_distinct_event_names(self, event_data_table: M.EventDataTable) -> List[str]:
         cte = aliased(
             self._get_dataset_discovery_cte(event_data_table),
@@ -1076,5 +1229,8 @@ class SQLAlchemyAdapter(GA.GenericDatasetAdapter):
         )
 
     def stop_current_execution(self):
+        connections = list(self._running_connections)
         if self._connection is not None:
-            self._connection.connection.close()
+            connections.append(self._connection)
+        for connection in connections:
+            connection.connection.close()
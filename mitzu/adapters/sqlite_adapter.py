@@ -33,6 +33,10 @@ class SQLiteAdapter(SQLAlchemyAdapter):
     def keep_alive_connection(self) -> bool:
         return True
 
+    def _reflection_concurrency(self) -> int:
+        # In-memory SQLite databases are bound to a single connection
+        return 1
+
     def _get_date_trunc(self, time_group: M.TimeGroup, field_ref: FieldReference):
         if time_group == M.TimeGroup.WEEK:
             return SA.func.datetime(SA.func.date(field_ref, "weekday 0", "-6 days"))
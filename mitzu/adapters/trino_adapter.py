@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, List, Union, cast
+from typing import Any, List, Optional, Union, cast
 
 import mitzu.adapters.generic_adapter as GA
 import mitzu.model as M
@@ -97,6 +97,12 @@ class TrinoAdapter(SQLAlchemyAdapter):
             return M.DataType.MAP
         return super().map_type(sa_type)
 
+    def _information_schema_support(self) -> bool:
+        return True
+
+    def _parse_information_schema_type(self, type_str: str) -> Optional[TypeEngine]:
+        return SA_T.parse_sqltype(type_str)
+
     def _parse_map_type(
         self,
         sa_type: Any,
@@ -830,6 +830,9 @@ class Project(Identifiable):
     _connection_ref: Reference[Connection]
     _adapter_cache: State[GA.GenericDatasetAdapter]
     _discovered_project: State[DiscoveredProject]
+    _table_columns: State[Dict[str, List[Tuple[str, Any]]]] = field(
+        compare=False, repr=False
+    )
 
     def __init__(
         self,
@@ -870,6 +873,7 @@ class Project(Identifiable):
         )
         object.__setattr__(self, "_adapter_cache", State())
         object.__setattr__(self, "_discovered_project", State())
+        object.__setattr__(self, "_table_columns", State())
 
     def get_adapter(self) -> GA.GenericDatasetAdapter:
         val = self._adapter_cache.get_value()
@@ -880,6 +884,35 @@ class Project(Identifiable):
         else:
             return val
 
+    def set_adapter(self, adapter: GA.GenericDatasetAdapter):
+        """Replaces the adapter of the project, e.g. with one that wraps the default adapter"""
+        self._adapter_cache.set_value(adapter)
+
+    def get_table_columns(
+        self, event_data_table: EventDataTable
+    ) -> Optional[List[Tuple[str, Any]]]:
+        """
+        Returns the reflected column names and types of an Event Data Table,
+        None if the table wasn't reflected yet.
+        """
+        table_columns = self._table_columns.get_value()
+        if table_columns is None:
+            return None
+        return table_columns.get(event_data_table.id)
+
+    def get_all_table_columns(self) -> Dict[str, List[Tuple[str, Any]]]:
+        res = self._table_columns.get_value()
+        return res if res is not None else {}
+
+    def restore_table_columns(
+        self, event_data_table: EventDataTable, columns: List[Tuple[str, Any]]
+    ):
+        table_columns = self._table_columns.get_value()
+        if table_columns is None:
+            table_columns = {}
+            self._table_columns.set_value(table_columns)
+        table_columns[event_data_table.id] = columns
+
     @property
     def connection(self) -> Connection:
         res = self._connection_ref.get_value()
@@ -934,6 +967,8 @@ class Project(Identifiable):
         :param callback: callback function for each EDT discovered
         :return: DiscoveredProject containing all the discovered event properties
         """
+        # The tables are reflected again during the discovery
+        self._table_columns.set_value(None)
         return D.ProjectDiscovery(project=self, callback=callback).discover_project(
             progress_bar
         )
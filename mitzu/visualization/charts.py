@@ -5,6 +5,7 @@ import mitzu.adapters.generic_adapter as GA
 import pandas as pd
 import mitzu.visualization.labels as L
 import mitzu.visualization.common as C
+import mitzu.visualization.downsampling as DS
 import mitzu.visualization.tooltips as T
 import mitzu.visualization.titles as TI
 import mitzu.visualization.transform_conv as TC
@@ -35,9 +36,7 @@ def filter_top_groups(
 
 def fix_na_cols_group_col(pdf: pd.DataFrame) -> pd.DataFrame:
     pdf[GA.GROUP_COL] = pdf[GA.GROUP_COL].fillna("<n/a>")
-    pdf[GA.GROUP_COL] = pdf[GA.GROUP_COL].apply(
-        lambda val: val if val != "" else "<no value>"
-    )
+    pdf[GA.GROUP_COL] = pdf[GA.GROUP_COL].replace("", "<no value>")
     return pdf
 
 
@@ -78,7 +77,10 @@ def get_default_chart_type(metric: M.Metric) -> M.SimpleChartType:
 
 
 def get_preprocessed_conversion_dataframe(
-    pdf: pd.DataFrame, metric: M.ConversionMetric, suffix: str
+    pdf: pd.DataFrame,
+    metric: M.ConversionMetric,
+    suffix: str,
+    chart_type: M.SimpleChartType,
 ) -> pd.DataFrame:
     pdf = fix_na_cols_group_col(pdf)
 
@@ -100,8 +102,9 @@ def get_preprocessed_conversion_dataframe(
 
     pdf = TC.get_conversion_mapping(pdf, metric)
 
-    pdf[C.TEXT_COL] = pdf[C.Y_AXIS_COL].apply(lambda val: (f"{val:.1f} {suffix}"))
-    pdf = T.add_conversion_tooltip(pdf, metric, suffix)
+    pdf[C.TEXT_COL] = C.format_numbers(pdf[C.Y_AXIS_COL], suffix=" " + suffix)
+    if chart_type == M.SimpleChartType.HEATMAP:
+        pdf = T.add_conversion_tooltip(pdf, metric, suffix)
 
     pdf = pdf.sort_values(
         [C.X_AXIS_COL, C.COLOR_COL, GA.USER_COUNT_COL], ascending=[True, True, False]
@@ -110,7 +113,7 @@ def get_preprocessed_conversion_dataframe(
 
 
 def get_preprocessed_segmentation_dataframe(
-    pdf: pd.DataFrame, metric: M.SegmentationMetric
+    pdf: pd.DataFrame, metric: M.SegmentationMetric, chart_type: M.SimpleChartType
 ):
     pdf = fix_na_cols_group_col(pdf)
     pdf = filter_top_groups(pdf, metric, order_by_col=GA.AGG_VALUE_COL)
@@ -123,7 +126,8 @@ def get_preprocessed_segmentation_dataframe(
     )
     pdf[C.TEXT_COL] = pdf[C.Y_AXIS_COL]
     pdf = pdf.sort_values([C.X_AXIS_COL, C.Y_AXIS_COL], ascending=[True, False])
-    pdf = T.get_segmentation_tooltip(pdf, metric)
+    if chart_type == M.SimpleChartType.HEATMAP:
+        pdf = T.get_segmentation_tooltip(pdf, metric)
 
     pdf[C.COLOR_COL] = pdf[C.COLOR_COL].fillna("")
     pdf[C.X_AXIS_COL] = pdf[C.X_AXIS_COL].fillna("")
@@ -132,21 +136,42 @@ def get_preprocessed_segmentation_dataframe(
 
 
 def get_preprocessed_retention_dataframe(
-    pdf: pd.DataFrame, metric: M.RetentionMetric
+    pdf: pd.DataFrame, metric: M.RetentionMetric, chart_type: M.SimpleChartType
 ) -> pd.DataFrame:
     size = pdf.shape[0]
     pdf = fix_na_cols_group_col(pdf)
     pdf = TR.fix_retention(pdf, metric)
     pdf = filter_top_groups(pdf, metric, order_by_col=GA.USER_COUNT_COL + "_1")
     pdf = TR.get_retention_mapping(pdf, metric)
-    pdf = T.get_retention_tooltip(pdf, metric)
-    pdf[C.TEXT_COL] = pdf[C.Y_AXIS_COL].apply(
-        lambda val: f"{val:.1f}%" if val > 0 and size <= 200 else ""
-    )
+    if chart_type == M.SimpleChartType.HEATMAP:
+        # only the heatmaps send the formatted tooltips, the other charts use hover templates
+        pdf = T.get_retention_tooltip(pdf, metric)
+    if size <= 200:
+        pdf[C.TEXT_COL] = C.format_numbers(pdf[C.Y_AXIS_COL], suffix="%").where(
+            pdf[C.Y_AXIS_COL] > 0, ""
+        )
+    else:
+        pdf[C.TEXT_COL] = ""
     pdf = pdf.sort_values([C.X_AXIS_COL, C.COLOR_COL], ascending=[True, True])
     return pdf
 
 
+def downsample_time_series(
+    pdf: pd.DataFrame, metric: M.Metric, chart_type: M.SimpleChartType
+) -> pd.DataFrame:
+    """
+    Dense line and area charts are reduced to the points visible on the chart,
+    the tables and exports use the full metric result.
+    """
+    if metric._time_group == M.TimeGroup.TOTAL:
+        return pdf
+    if chart_type == M.SimpleChartType.LINE:
+        return DS.downsample_series(pdf)
+    if chart_type == M.SimpleChartType.STACKED_AREA:
+        return DS.downsample_stacked_series(pdf)
+    return pdf
+
+
 def get_simple_chart(
     metric: M.Metric, result_df: Optional[pd.DataFrame] = None
 ) -> C.SimpleChart:
@@ -174,7 +199,8 @@ def get_simple_chart(
         result_df = metric.get_df()
 
     if isinstance(metric, M.SegmentationMetric):
-        pdf = get_preprocessed_segmentation_dataframe(result_df, metric)
+        pdf = get_preprocessed_segmentation_dataframe(result_df, metric, chart_type)
+        pdf = downsample_time_series(pdf, metric, chart_type)
         return C.SimpleChart(
             x_axis_label="",
             y_axis_label=y_axis_label,
@@ -188,7 +214,10 @@ def get_simple_chart(
 
     if isinstance(metric, M.ConversionMetric):
         suffix = TC.get_conversion_value_suffix(result_df, metric)
-        pdf = get_preprocessed_conversion_dataframe(result_df, metric, suffix)
+        pdf = get_preprocessed_conversion_dataframe(
+            result_df, metric, suffix, chart_type
+        )
+        pdf = downsample_time_series(pdf, metric, chart_type)
         return C.SimpleChart(
             x_axis_label="",
             y_axis_label=y_axis_label,
@@ -201,7 +230,7 @@ def get_simple_chart(
         )
 
     if isinstance(metric, M.RetentionMetric):
-        pdf = get_preprocessed_retention_dataframe(result_df, metric)
+        pdf = get_preprocessed_retention_dataframe(result_df, metric, chart_type)
         return C.SimpleChart(
             x_axis_label="",
             y_axis_label=y_axis_label,
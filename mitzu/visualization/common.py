@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import pandas as pd
-from typing import Any, Callable, Optional
+from typing import Callable, Optional
 import mitzu.model as M
 
 
@@ -18,23 +18,49 @@ COLOR_COL = "_color"
 TOOLTIP_COL = "_tooltip"
 
 
-def retention_period_label(val: int, metric: M.Metric) -> str:
+def format_numbers(values: pd.Series, decimals: int = 1, suffix: str = "") -> pd.Series:
+    """
+    Formats the values like "{:.1f}" with array operations on the integer and fractional digits,
+    the ties are rounded to even. The values too large for int64 and the NaN values are formatted by pandas.
+    """
+    numbers = pd.to_numeric(values, errors="coerce").astype(float)
+    scale = 10**decimals
+    scaled = (numbers.abs() * scale).round()
+    exact = scaled < 2**62
+    digits = scaled.where(exact, 0).astype("int64")
+    res = (digits // scale).astype(str)
+    if decimals > 0:
+        fraction = (digits % scale).astype(str)
+        if decimals > 1:
+            fraction = fraction.str.zfill(decimals)
+        res = res + "." + fraction
+    res = res.where(~(numbers < 0), "-" + res)
+    return res.where(exact, numbers.astype(str)) + suffix
+
+
+def retention_period_label(values: pd.Series, metric: M.Metric) -> pd.Series:
     if isinstance(metric, M.RetentionMetric):
-        return f"{val} to {val+ metric._retention_window.value} {metric._retention_window.period.name.lower()}"
-    return str(val)
+        window = metric._retention_window
+        return (
+            values.astype(str)
+            + " to "
+            + (values + window.value).astype(str)
+            + f" {window.period.name.lower()}"
+        )
+    return values.astype(str)
 
 
-def fix_date_label(val: pd.Timestamp, metric: M.Metric) -> str:
+def fix_date_label(values: pd.Series, metric: M.Metric) -> pd.Series:
     if metric._time_group not in (
         M.TimeGroup.SECOND,
         M.TimeGroup.MINUTE,
         M.TimeGroup.HOUR,
     ):
-        res = str(val.date())
+        res = pd.to_datetime(values).dt.strftime("%Y-%m-%d")
         if metric._chart_type == M.SimpleChartType.HEATMAP:
             res = res + "."
         return res
-    return val
+    return values
 
 
 @dataclass(frozen=True)
@@ -48,9 +74,10 @@ class SimpleChart:
     chart_type: M.SimpleChartType
     dataframe: pd.DataFrame
     hover_mode: str = "closest"
-    x_axis_labels_func: Optional[Callable[[Any, M.Metric], Any]] = None
-    y_axis_labels_func: Optional[Callable[[Any, M.Metric], Any]] = None
-    color_labels_func: Optional[Callable[[Any, M.Metric], Any]] = None
+    # label functions map a whole column of the dataframe
+    x_axis_labels_func: Optional[Callable[[pd.Series, M.Metric], pd.Series]] = None
+    y_axis_labels_func: Optional[Callable[[pd.Series, M.Metric], pd.Series]] = None
+    color_labels_func: Optional[Callable[[pd.Series, M.Metric], pd.Series]] = None
 
     def __eq__(self, value: object) -> bool:
         if not isinstance(value, SimpleChart):
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+import mitzu.visualization.common as C
+
+# a series of a time series chart is reduced to about as many points as the width of the chart in pixels
+MAX_POINTS_PER_SERIES = 1000
+
+
+def _x_values(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype("int64").to_numpy(dtype=float)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    # e.g. dates mixed with empty strings, the points are treated as evenly spaced
+    return np.arange(len(values), dtype=float)
+
+
+def _y_values(values: pd.Series) -> np.ndarray:
+    return pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(dtype=float)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Returns the positions of the points kept by the largest-triangle-three-buckets algorithm.
+    The first and last points are always kept, from every bucket in between the point forming
+    the largest triangle with the previously kept point and the average of the next bucket is kept.
+    The points must be ordered by x.
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    every = (size - 2) / (threshold - 2)
+    indices = np.zeros(threshold, dtype=int)
+    kept = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, size)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[kept] - avg_x) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (avg_y - y[kept])
+        )
+        kept = start + int(areas.argmax())
+        indices[bucket + 1] = kept
+    indices[-1] = size - 1
+    return indices
+
+
+def downsample_series(
+    pdf: pd.DataFrame, max_points: int = MAX_POINTS_PER_SERIES
+) -> pd.DataFrame:
+    """Reduces every color group of the chart dataframe to at most max_points with LTTB"""
+    if pdf.shape[0] <= max_points:
+        return pdf
+
+    keep = []
+    groups = pdf.groupby(C.COLOR_COL, sort=False, dropna=False).indices
+    for positions in groups.values():
+        if len(positions) > max_points:
+            group = pdf.iloc[positions]
+            order = np.argsort(_x_values(group[C.X_AXIS_COL]), kind="stable")
+            group = group.iloc[order]
+            positions = positions[order][
+                lttb_indices(
+                    _x_values(group[C.X_AXIS_COL]),
+                    _y_values(group[C.Y_AXIS_COL]),
+                    max_points,
+                )
+            ]
+        keep.append(positions)
+
+    return pdf.iloc[np.sort(np.concatenate(keep))]
+
+
+def downsample_stacked_series(
+    pdf: pd.DataFrame, max_points: int = MAX_POINTS_PER_SERIES
+) -> pd.DataFrame:
+    """
+    Reduces the x values of a stacked chart to at most max_points with LTTB on the stacked totals,
+    so every color group keeps the same x values.
+    """
+    totals = (
+        pdf.groupby(C.X_AXIS_COL, sort=True)[C.Y_AXIS_COL]
+        .sum(min_count=1)
+        .fillna(0)
+        .reset_index()
+    )
+    if totals.shape[0] <= max_points:
+        return pdf
+
+    indices = lttb_indices(
+        _x_values(totals[C.X_AXIS_COL]),
+        _y_values(totals[C.Y_AXIS_COL]),
+        max_points,
+    )
+    return pdf[pdf[C.X_AXIS_COL].isin(totals[C.X_AXIS_COL].iloc[indices])]
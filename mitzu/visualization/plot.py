@@ -3,16 +3,27 @@ from __future__ import annotations
 
 import plotly.express as px
 import plotly.figure_factory as ff
+import plotly.graph_objects as go
 
 import pandas as pd
 import mitzu.model as M
 import mitzu.helper as H
 import mitzu.visualization.common as C
-from typing import Dict, List, Tuple
+import mitzu.visualization.tooltips as T
+from typing import Any, Dict, Optional, Tuple
 from base64 import b64encode
 import plotly.io as pio
 import traceback
 
+# 1x1 pixel PNG used while an image is not rendered or when the rendering fails
+EMPTY_IMAGE_BASE64 = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mO8XQ8AAjsBXM7pODsAAAAASUVORK5CYII="
+
+# the labels of the data points are formatted column-wise, plotly handles this many points in the browser
+MAX_DATA_POINTS = 20000
+# above this many points the line and area charts are drawn with WebGL and without text labels
+WEBGL_DATA_POINTS = 1000
+STACKED_Y_COL = "_stacked_y"
+
 PRISM2 = [
     "rgb(95, 70, 144)",
     "rgb(237, 173, 8)",
@@ -114,17 +125,19 @@ def set_heatmap_figure_style(fig, simple_chart: C.SimpleChart):
         uniformtext_mode="hide",
         autosize=True,
         hoverlabel={"font": {"size": 12}},
-        annotations={"font": {"size": 8}},
         hovermode="closest",
         margin=dict(t=title_height, l=1, r=1, b=1, pad=0),
     )
+    fig.update_annotations(font_size=8)
     return fig
 
 
-def pdf_to_heatmap(pdf: pd.DataFrame) -> Dict[str, List]:
+def pdf_to_heatmap(pdf: pd.DataFrame) -> Dict[str, Any]:
+    # the tooltips are only prepared for the charts created as heatmaps
+    has_tooltips = C.TOOLTIP_COL in pdf.columns
     pdf = pd.pivot_table(
         pdf,
-        values=[C.TEXT_COL, C.Y_AXIS_COL, C.TOOLTIP_COL],
+        values=[C.TEXT_COL, C.Y_AXIS_COL] + ([C.TOOLTIP_COL] if has_tooltips else []),
         index=[C.X_AXIS_COL],
         columns=[C.COLOR_COL],
         aggfunc="first",
@@ -137,36 +150,56 @@ def pdf_to_heatmap(pdf: pd.DataFrame) -> Dict[str, List]:
         "x": x_vals,
         "y": color_vals,
         "z": pdf[C.Y_AXIS_COL].values.tolist(),
-        "hovertext": pdf[C.TOOLTIP_COL].values.tolist(),
+        "hovertext": pdf[C.TOOLTIP_COL].values.tolist() if has_tooltips else None,
         "annotation_text": pdf[C.TEXT_COL].values.tolist(),
     }
 
 
+def stack_values(pdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the cumulated values of the color groups for every x in the order plotly draws the groups.
+    WebGL traces can't be stacked by plotly, so the stacked areas are drawn as filled lines.
+    """
+    color_order = {color: i for i, color in enumerate(pdf[C.COLOR_COL].unique())}
+    pdf = pdf.assign(_color_order=pdf[C.COLOR_COL].map(color_order))
+    pdf = pdf.sort_values([C.X_AXIS_COL, "_color_order"], kind="stable")
+    pdf[STACKED_Y_COL] = pdf.groupby(C.X_AXIS_COL, sort=False)[C.Y_AXIS_COL].cumsum()
+    return pdf.sort_values(["_color_order", C.X_AXIS_COL], kind="stable").drop(
+        columns=["_color_order"]
+    )
+
+
 def plot_chart(
     simple_chart: C.SimpleChart,
     metric: M.Metric,
 ):
     size = simple_chart.dataframe.shape[0]
-    if size > 3000:
+    if size > MAX_DATA_POINTS:
         raise Exception(
             f"Too many data points to visualize ({size}), try reducing the scope."
         )
     pdf = simple_chart.dataframe.copy()
     if simple_chart.x_axis_labels_func is not None:
-        pdf[C.X_AXIS_COL] = pdf[C.X_AXIS_COL].apply(
-            lambda val: simple_chart.x_axis_labels_func(val, metric)
-        )
+        pdf[C.X_AXIS_COL] = simple_chart.x_axis_labels_func(pdf[C.X_AXIS_COL], metric)
     if simple_chart.y_axis_labels_func is not None:
-        pdf[C.Y_AXIS_COL] = pdf[C.Y_AXIS_COL].apply(
-            lambda val: simple_chart.y_axis_labels_func(val, metric)
-        )
+        pdf[C.Y_AXIS_COL] = simple_chart.y_axis_labels_func(pdf[C.Y_AXIS_COL], metric)
     if simple_chart.color_labels_func is not None:
-        pdf[C.COLOR_COL] = pdf[C.COLOR_COL].apply(
-            lambda val: simple_chart.color_labels_func(val, metric)
-        )
+        pdf[C.COLOR_COL] = simple_chart.color_labels_func(pdf[C.COLOR_COL], metric)
 
     ct = simple_chart.chart_type
+    webgl = size > WEBGL_DATA_POINTS and ct in (
+        M.SimpleChartType.LINE,
+        M.SimpleChartType.STACKED_AREA,
+    )
+    text_col = None if size > WEBGL_DATA_POINTS else C.TEXT_COL
     px.defaults.color_discrete_sequence = PRISM2
+    hover_template, custom_data = T.get_hover_template(simple_chart, metric)
+    if webgl and ct == M.SimpleChartType.STACKED_AREA:
+        # the stacked traces are drawn at the cumulated values, the values of the groups are sent along
+        hover_template, _ = T.get_hover_template(
+            simple_chart, metric, value_ref=f"customdata[{len(custom_data)}]"
+        )
+        custom_data = custom_data + [C.Y_AXIS_COL]
     if ct in [
         M.SimpleChartType.BAR,
         M.SimpleChartType.STACKED_BAR,
@@ -179,11 +212,11 @@ def plot_chart(
             pdf,
             x=C.X_AXIS_COL,
             y=C.Y_AXIS_COL,
-            text=C.TEXT_COL,
+            text=text_col,
             color=C.COLOR_COL,
             barmode=barmode,
             orientation=orientation,
-            custom_data=[C.TOOLTIP_COL],
+            custom_data=custom_data,
             labels={
                 C.X_AXIS_COL: simple_chart.x_axis_label,
                 C.Y_AXIS_COL: simple_chart.y_axis_label,
@@ -195,23 +228,41 @@ def plot_chart(
             pdf,
             x=C.X_AXIS_COL,
             y=C.Y_AXIS_COL,
-            text=C.TEXT_COL,
+            text=text_col,
             color=C.COLOR_COL,
-            custom_data=[C.TOOLTIP_COL],
+            custom_data=custom_data,
+            render_mode="webgl" if webgl else "auto",
             labels={
                 C.X_AXIS_COL: simple_chart.x_axis_label,
                 C.Y_AXIS_COL: simple_chart.y_axis_label,
                 C.COLOR_COL: simple_chart.color_label,
             },
         )
+    elif ct == M.SimpleChartType.STACKED_AREA and webgl:
+        fig = px.line(
+            stack_values(pdf),
+            x=C.X_AXIS_COL,
+            y=STACKED_Y_COL,
+            color=C.COLOR_COL,
+            custom_data=custom_data,
+            render_mode="webgl",
+            labels={
+                C.X_AXIS_COL: simple_chart.x_axis_label,
+                STACKED_Y_COL: simple_chart.y_axis_label,
+                C.COLOR_COL: simple_chart.color_label,
+            },
+        )
+        fig.update_traces(fill="tonexty")
+        if len(fig.data) > 0:
+            fig.data[0].fill = "tozeroy"
     elif ct == M.SimpleChartType.STACKED_AREA:
         fig = px.area(
             pdf,
             x=C.X_AXIS_COL,
             y=C.Y_AXIS_COL,
-            text=C.TEXT_COL,
+            text=text_col,
             color=C.COLOR_COL,
-            custom_data=[C.TOOLTIP_COL],
+            custom_data=custom_data,
             labels={
                 C.X_AXIS_COL: simple_chart.x_axis_label,
                 C.Y_AXIS_COL: simple_chart.y_axis_label,
@@ -220,22 +271,47 @@ def plot_chart(
         )
     elif ct == M.SimpleChartType.HEATMAP:
         args = pdf_to_heatmap(pdf)
-        fig = ff.create_annotated_heatmap(
-            colorscale="BuPu",
-            **args,
-        )
+        if any(
+            isinstance(text, str) and text != ""
+            for row in args["annotation_text"]
+            for text in row
+        ):
+            fig = ff.create_annotated_heatmap(
+                colorscale="BuPu",
+                **args,
+            )
+        else:
+            # the texts of dense heatmaps are left empty, the same heatmap without the annotations
+            fig = go.Figure(
+                data=[
+                    go.Heatmap(
+                        z=args["z"],
+                        x=args["x"],
+                        y=args["y"],
+                        hovertext=args["hovertext"],
+                        colorscale="BuPu",
+                        showscale=False,
+                    )
+                ],
+                layout=dict(
+                    xaxis=dict(ticks="", dtick=1, side="top", gridcolor="rgb(0, 0, 0)"),
+                    yaxis=dict(ticks="", dtick=1, ticksuffix="  "),
+                ),
+            )
         fig = set_heatmap_figure_style(fig, simple_chart)
         return fig
 
-    fig.update_traces(hovertemplate="%{customdata[0]} <extra></extra>")
+    fig.update_traces(hovertemplate=hover_template)
     fig.update_layout(yaxis_ticksuffix=simple_chart.yaxis_ticksuffix)
     fig = set_figure_style(fig, simple_chart, metric)
+    if webgl:
+        fig.update_traces(mode="lines")
 
     return fig
 
 
 def figure_to_base64_image(
-    figure, scale: float = 1.0, kaleid_configs: Tuple = None
+    figure, scale: float = 1.0, kaleid_configs: Optional[Tuple[str, ...]] = None
 ) -> str:
     try:
         if kaleid_configs is not None:
@@ -250,4 +326,4 @@ def figure_to_base64_image(
     except BaseException:
         traceback.print_exc()
 
-        return "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mO8XQ8AAjsBXM7pODsAAAAASUVORK5CYII="
+        return EMPTY_IMAGE_BASE64
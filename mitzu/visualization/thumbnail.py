@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from base64 import b64encode
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+import mitzu.model as M
+import mitzu.visualization.common as C
+import mitzu.visualization.plot as PLT
+
+WIDTH = 350
+HEIGHT = 250
+TITLE_HEIGHT = 24
+PADDING = 8
+# light and dark end of the heatmap color scale
+HEATMAP_COLORS = ((247, 252, 253), (77, 0, 75))
+
+
+def _sorted_values(series: pd.Series) -> List[Any]:
+    values = series.dropna().unique().tolist()
+    try:
+        return sorted(values)
+    except TypeError:
+        return values
+
+
+def _series_by_color(
+    pdf: pd.DataFrame, x_values: List[Any]
+) -> List[Tuple[Any, List[float]]]:
+    """Returns the y values of every color group in the order of the x values, missing values are 0"""
+    if C.COLOR_COL in pdf.columns:
+        groups = list(pdf.groupby(C.COLOR_COL, sort=False, dropna=False))
+    else:
+        groups = [(None, pdf)]
+
+    result = []
+    for color, group in groups:
+        y_by_x = dict(zip(group[C.X_AXIS_COL], group[C.Y_AXIS_COL].fillna(0)))
+        result.append((color, [float(y_by_x.get(x, 0)) for x in x_values]))
+    return result
+
+
+def _color(index: int) -> str:
+    return PLT.PRISM2[index % len(PLT.PRISM2)]
+
+
+def _points(xs: List[float], ys: List[float]) -> str:
+    return " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys))
+
+
+class _Canvas:
+    def __init__(self, title: Optional[str]):
+        self.elements: List[str] = []
+        top = PADDING
+        if title:
+            # the titles of the charts can contain html line breaks
+            text = escape(title.split("<br />")[0])
+            self.elements.append(
+                f'<text x="{WIDTH / 2}" y="{PADDING + 12}" text-anchor="middle" '
+                f'font-family="sans-serif" font-size="12">{text}</text>'
+            )
+            top += TITLE_HEIGHT
+        self.left = float(PADDING)
+        self.top = float(top)
+        self.width = float(WIDTH - 2 * PADDING)
+        self.height = float(HEIGHT - PADDING - top)
+
+    def x(self, position: float, count: int) -> float:
+        if count <= 1:
+            return self.left + self.width / 2
+        return self.left + self.width * position / (count - 1)
+
+    def y(self, value: float, min_value: float, max_value: float) -> float:
+        if max_value == min_value:
+            return self.top + self.height
+        return self.top + self.height * (max_value - value) / (max_value - min_value)
+
+    def to_svg(self) -> str:
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+            f'viewBox="0 0 {WIDTH} {HEIGHT}">' + "".join(self.elements) + "</svg>"
+        )
+
+
+def _draw_lines(canvas: _Canvas, pdf: pd.DataFrame, stacked: bool):
+    x_values = _sorted_values(pdf[C.X_AXIS_COL])
+    series = _series_by_color(pdf, x_values)
+    if stacked:
+        totals = [0.0] * len(x_values)
+        stacked_series = []
+        for color, ys in series:
+            bottoms = totals
+            totals = [b + y for b, y in zip(bottoms, ys)]
+            stacked_series.append((bottoms, totals))
+        values = [v for _, tops in stacked_series for v in tops]
+    else:
+        values = [v for _, ys in series for v in ys]
+    min_value = min(values + [0.0])
+    max_value = max(values + [0.0])
+
+    xs = [canvas.x(i, len(x_values)) for i in range(len(x_values))]
+    for index, (_, ys) in enumerate(series):
+        color = _color(index)
+        if stacked:
+            bottoms, tops = stacked_series[index]
+            outline = [canvas.y(v, min_value, max_value) for v in tops]
+            base = [canvas.y(v, min_value, max_value) for v in bottoms]
+            canvas.elements.append(
+                f'<polygon points="{_points(xs + xs[::-1], outline + base[::-1])}" '
+                f'fill="{color}" fill-opacity="0.6" stroke="{color}" stroke-width="1"/>'
+            )
+        else:
+            points = _points(xs, [canvas.y(v, min_value, max_value) for v in ys])
+            canvas.elements.append(
+                f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="1.5"/>'
+            )
+
+
+def _draw_bars(canvas: _Canvas, pdf: pd.DataFrame, stacked: bool):
+    x_values = _sorted_values(pdf[C.X_AXIS_COL])
+    series = _series_by_color(pdf, x_values)
+    if stacked:
+        positives = [
+            sum(max(ys[i], 0) for _, ys in series) for i in range(len(x_values))
+        ]
+        negatives = [
+            sum(min(ys[i], 0) for _, ys in series) for i in range(len(x_values))
+        ]
+        values = positives + negatives
+    else:
+        values = [v for _, ys in series for v in ys]
+    min_value = min(values + [0.0])
+    max_value = max(values + [0.0])
+
+    slot = canvas.width / max(len(x_values), 1)
+    bar_area = slot * 0.7
+    bar_width = bar_area if stacked else bar_area / max(len(series), 1)
+    tops = [0.0] * len(x_values)
+    bottoms = [0.0] * len(x_values)
+    for index, (_, ys) in enumerate(series):
+        color = _color(index)
+        for i, value in enumerate(ys):
+            if stacked:
+                start = tops[i] if value >= 0 else bottoms[i]
+                end = start + value
+                if value >= 0:
+                    tops[i] = end
+                else:
+                    bottoms[i] = end
+                x = canvas.left + slot * i + (slot - bar_area) / 2
+            else:
+                start, end = 0.0, value
+                x = canvas.left + slot * i + (slot - bar_area) / 2 + bar_width * index
+            y1 = canvas.y(max(start, end), min_value, max_value)
+            y2 = canvas.y(min(start, end), min_value, max_value)
+            canvas.elements.append(
+                f'<rect x="{x:.1f}" y="{y1:.1f}" width="{bar_width:.1f}" '
+                f'height="{y2 - y1:.1f}" fill="{color}"/>'
+            )
+
+
+def _heatmap_color(ratio: float) -> str:
+    light, dark = HEATMAP_COLORS
+    r, g, b = (int(lc + (dc - lc) * ratio) for lc, dc in zip(light, dark))
+    return f"rgb({r},{g},{b})"
+
+
+def _draw_heatmap(canvas: _Canvas, pdf: pd.DataFrame):
+    args: Dict[str, List] = PLT.pdf_to_heatmap(pdf)
+    rows = args["z"]
+    values = [v for row in rows for v in row if v is not None and not pd.isna(v)]
+    if len(rows) == 0 or len(values) == 0:
+        return
+    min_value, max_value = min(values), max(values)
+    cell_width = canvas.width / max(len(args["x"]), 1)
+    cell_height = canvas.height / len(rows)
+    for row_index, row in enumerate(rows):
+        for col_index, value in enumerate(row):
+            if value is None or pd.isna(value):
+                continue
+            ratio = (
+                (value - min_value) / (max_value - min_value)
+                if max_value > min_value
+                else 1.0
+            )
+            canvas.elements.append(
+                f'<rect x="{canvas.left + cell_width * col_index:.1f}" '
+                f'y="{canvas.top + cell_height * row_index:.1f}" '
+                f'width="{cell_width - 1:.1f}" height="{cell_height - 1:.1f}" '
+                f'fill="{_heatmap_color(ratio)}"/>'
+            )
+
+
+def chart_to_svg(simple_chart: C.SimpleChart) -> str:
+    """
+    Draws a small sketch of the chart without axes and labels, for the thumbnails of the saved metrics.
+    It doesn't need a browser unlike the rendering of the plotly figures.
+    """
+    canvas = _Canvas(simple_chart.title)
+    pdf = simple_chart.dataframe
+    if pdf.shape[0] > 0:
+        chart_type = simple_chart.chart_type
+        if chart_type == M.SimpleChartType.LINE:
+            _draw_lines(canvas, pdf, stacked=False)
+        elif chart_type == M.SimpleChartType.STACKED_AREA:
+            _draw_lines(canvas, pdf, stacked=True)
+        elif chart_type == M.SimpleChartType.BAR:
+            _draw_bars(canvas, pdf, stacked=False)
+        elif chart_type == M.SimpleChartType.STACKED_BAR:
+            _draw_bars(canvas, pdf, stacked=True)
+        elif chart_type == M.SimpleChartType.HEATMAP:
+            _draw_heatmap(canvas, pdf)
+    return canvas.to_svg()
+
+
+def chart_to_base64_image(simple_chart: C.SimpleChart) -> str:
+    return (
+        "data:image/svg+xml;base64,"
+        + b64encode(chart_to_svg(simple_chart).encode()).decode()
+    )
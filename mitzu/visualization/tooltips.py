@@ -5,6 +5,7 @@ import pandas as pd
 import mitzu.visualization.common as C
 import mitzu.adapters.generic_adapter as GA
 import mitzu.visualization.labels as L
+from typing import List, Tuple
 
 
 def add_conversion_tooltip(
@@ -76,11 +77,7 @@ def get_retention_tooltip(pdf: pd.DataFrame, metric: M.RetentionMetric) -> pd.Da
     value_suffix = "%"
     pdf[C.TOOLTIP_COL] = (
         "<b>Retention period: </b>"
-        + (
-            pdf[C.X_AXIS_COL]
-            .apply(lambda val: C.retention_period_label(val, metric))
-            .astype(str)
-        )
+        + C.retention_period_label(pdf[C.X_AXIS_COL], metric)
         + "<br /><b>Cohort: </b>"
         + pdf[C.COLOR_COL].astype(str)
         + f"<br /><br /><b>{agg_type_str}: </b>"
@@ -92,3 +89,57 @@ def get_retention_tooltip(pdf: pd.DataFrame, metric: M.RetentionMetric) -> pd.Da
         + pdf[GA.USER_COUNT_COL + "_2"].astype(str)
     )
     return pdf
+
+
+def get_hover_template(
+    simple_chart: C.SimpleChart, metric: M.Metric, value_ref: str = "y"
+) -> Tuple[str, List[str]]:
+    """
+    Returns a hovertemplate shared by the points of a trace and the columns it needs as customdata.
+    Only the numbers are sent with the points, the tooltips are formatted in the browser.
+    """
+    agg_type_str = L.agg_type_label(metric._agg_type, metric._agg_param)
+    suffix = simple_chart.yaxis_ticksuffix
+    value = f"%{{{value_ref}:.2~f}}" + (f" {suffix}" if suffix else "")
+    group = "<br /><b>Group: </b>%{fullData.name}"
+    custom_data: List[str] = []
+
+    if isinstance(metric, M.ConversionMetric):
+        if metric._time_group == M.TimeGroup.TOTAL:
+            custom_data = [GA.USER_COUNT_COL]
+            template = (
+                "<b>Step: </b>%{x}"
+                + group
+                + f"<br /><br /><b>{agg_type_str}: </b>{value}"
+                + "<br /><b>User count: </b>%{customdata[0]}"
+            )
+        else:
+            template = "<b>Datetime: </b>%{x}" + group
+            for step in range(1, len(metric._conversion._segments) + 1):
+                custom_data.extend(
+                    [f"{GA.AGG_VALUE_COL}_{step}", f"{GA.USER_COUNT_COL}_{step}"]
+                )
+                template += (
+                    f"<br /><br /><b>Step: {step}.</b>"
+                    + f"<br /><b>{agg_type_str}: </b>"
+                    + f"%{{customdata[{len(custom_data) - 2}]:.2~f}} {suffix}"
+                    + f"<br /><b>User count: </b>%{{customdata[{len(custom_data) - 1}]}}"
+                )
+    elif isinstance(metric, M.RetentionMetric):
+        custom_data = [GA.USER_COUNT_COL + "_1", GA.USER_COUNT_COL + "_2"]
+        template = (
+            "<b>Retention period: </b>%{x}"
+            + "<br /><b>Cohort: </b>%{fullData.name}"
+            + f"<br /><br /><b>{agg_type_str}: </b>{value}"
+            + "<br /><b>Initial user count: </b>%{customdata[0]}"
+            + "<br /><b>Retaining user count: </b>%{customdata[1]}"
+        )
+    elif metric._time_group == M.TimeGroup.TOTAL:
+        template = group + f"<br /><br /><b>{agg_type_str}: </b>{value}"
+    else:
+        template = (
+            "<b>Datetime: </b>%{x}"
+            + group
+            + f"<br /><br /><b>{agg_type_str}: </b>{value}"
+        )
+    return template + " <extra></extra>", custom_data
@@ -1,12 +1,27 @@
 import mitzu.webapp.configs as configs
 import redis
 import diskcache
-from typing import Any, Optional, List, Dict
+from typing import Any, Callable, Iterator, Optional, List, Dict, Tuple, Union
 from abc import ABC
+from collections import OrderedDict
 from dataclasses import dataclass
+import math
 import pickle
+import re
+import threading
+import time
+import uuid
 import mitzu.helper as H
+import mitzu.webapp.cache_codec as CC
 import flask
+import pandas as pd
+
+
+def get_default_codec() -> CC.CacheCodec:
+    compression = configs.CACHE_COMPRESSION
+    return CC.create_codec(
+        configs.CACHE_CODEC, None if compression == "none" else compression
+    )
 
 
 class MitzuCache(ABC):
@@ -29,13 +44,65 @@ class MitzuCache(ABC):
     def clear(self, key: str) -> None:
         raise NotImplementedError()
 
-    def clear_all(self, prefix: Optional[str] = None) -> None:
-        for key in self.list_keys(prefix):
+    def add(self, key: str, val: Any, expire: Optional[float] = None) -> bool:
+        """Puts the value only if the key is not in the cache yet, returns True if it was put.
+        The shared caches do it atomically, so only one of the workers can add the key.
+        """
+        if self.get(key) is not None:
+            return False
+        self.put(key, val, expire)
+        return True
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Returns the values of the keys that are in the cache"""
+        res: Dict[str, Any] = {}
+        for key in keys:
+            val = self.get(key)
+            if val is not None:
+                res[key] = val
+        return res
+
+    def get_many_with_expire(
+        self, keys: List[str]
+    ) -> Dict[str, Tuple[Any, Optional[float]]]:
+        """Returns the values of the keys that are in the cache with the seconds left until their expiration.
+        The seconds are None if the cache doesn't track them, and infinite if the value doesn't expire.
+        """
+        return {key: (val, None) for key, val in self.get_many(keys).items()}
+
+    def put_many(self, values: Dict[str, Any], expire: Optional[float] = None) -> None:
+        for key, val in values.items():
+            self.put(key, val, expire)
+
+    def clear_many(self, keys: List[str]) -> None:
+        for key in keys:
             self.clear(key)
 
+    def clear_all(self, prefix: Optional[str] = None) -> None:
+        self.clear_many(
+            [key if prefix is None else prefix + key for key in self.list_keys(prefix)]
+        )
+
+    def incr(self, key: str) -> int:
+        """Increments the counter stored under the key and returns its new value, missing counters start from 0"""
+        res = (self.get(key) or 0) + 1
+        self.put(key, res)
+        return res
+
+    def get_counters(self, keys: List[str]) -> Dict[str, int]:
+        """Returns the current values of the counters, missing counters are 0"""
+        values = self.get_many(keys)
+        return {key: int(values.get(key, 0)) for key in keys}
+
     def list_keys(
         self, prefix: Optional[str] = None, strip_prefix: bool = True
     ) -> List[str]:
+        """Lists the keys as they were put to the cache (without the global prefix)
+
+        Args:
+            prefix (Optional[str], optional): lists only the keys starting with the prefix
+            strip_prefix (bool, optional): removes the prefix from the returned keys
+        """
         raise NotImplementedError()
 
     def health_check(self):
@@ -47,9 +114,18 @@ class DiskMitzuCache(MitzuCache):
 
     _disk_cache: diskcache.Cache
     _global_prefix: Optional[str] = None
+    _codec: CC.CacheCodec = CC.PickleCodec()
 
-    def __init__(self, name: str, global_prefix: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        name: str,
+        global_prefix: Optional[str] = None,
+        codec: Optional[CC.CacheCodec] = None,
+    ) -> None:
         super().__init__()
+        object.__setattr__(
+            self, "_codec", codec if codec is not None else get_default_codec()
+        )
         object.__setattr__(
             self,
             "_disk_cache",
@@ -70,18 +146,33 @@ class DiskMitzuCache(MitzuCache):
             return f"{self._global_prefix}.{key}"
         return key
 
-    def put(self, key: str, val: Any, expire: Optional[float] = None):
+    def _set(self, key: str, val: Any, expire: Optional[float]):
         key = self._get_key(key)
-        self.clear(key)
         if val is not None:
             H.LOGGER.debug(f"PUT: {key}: {type(val)}")
-            self._disk_cache.add(key, value=val, expire=expire)
+            self._disk_cache.set(key, value=self._codec.encode(val), expire=expire)
         else:
             H.LOGGER.debug(f"PUT: {key}: None")
+            self._disk_cache.delete(key)
+
+    def put(self, key: str, val: Any, expire: Optional[float] = None):
+        self._set(key, val, expire)
+
+    def add(self, key: str, val: Any, expire: Optional[float] = None) -> bool:
+        key = self._get_key(key)
+        H.LOGGER.debug(f"ADD: {key}: {type(val)}")
+        return self._disk_cache.add(key, value=self._codec.encode(val), expire=expire)
+
+    def put_many(self, values: Dict[str, Any], expire: Optional[float] = None) -> None:
+        with self._disk_cache.transact():
+            for key, val in values.items():
+                self._set(key, val, expire)
 
     def get(self, key: str, default: Optional[Any] = None) -> Any:
         key = self._get_key(key)
         res = self._disk_cache.get(key)
+        if isinstance(res, bytes):
+            res = self._codec.decode(res)
         if res is not None:
             H.LOGGER.debug(f"GET: {key}: {type(res)}")
             return res
@@ -92,23 +183,53 @@ class DiskMitzuCache(MitzuCache):
     def clear(self, key: str) -> None:
         key = self._get_key(key)
         H.LOGGER.debug(f"Clear {key}")
-        self._disk_cache.pop(key)
+        self._disk_cache.delete(key)
+
+    def clear_many(self, keys: List[str]) -> None:
+        batch_size = configs.CACHE_CLEAR_BATCH_SIZE
+        for start in range(0, len(keys), batch_size):
+            end = start + batch_size
+            with self._disk_cache.transact():
+                for key in keys[start:end]:
+                    self._disk_cache.delete(self._get_key(key))
+
+    def _iter_keys(self, prefix: str) -> Iterator[str]:
+        # Range query on the indexed key column instead of iterating the whole cache
+        full_prefix = self._get_key(prefix)
+        query = (
+            "SELECT key FROM Cache WHERE raw = 1 AND key >= ?"
+            " AND (expire_time IS NULL OR expire_time > ?)"
+        )
+        params: List[Any] = [full_prefix, time.time()]
+        if full_prefix:
+            query += " AND key < ?"
+            params.append(full_prefix[:-1] + chr(ord(full_prefix[-1]) + 1))
+
+        global_prefix_length = len(self._get_key(""))
+        for (key,) in self._disk_cache._sql(query, params).fetchall():
+            if isinstance(key, str):
+                yield key[global_prefix_length:]
+
+    def clear_all(self, prefix: Optional[str] = None) -> None:
+        keys = list(self._iter_keys(prefix or ""))
+        H.LOGGER.debug(f"CLEAR ALL {prefix}: {len(keys)}")
+        self.clear_many(keys)
 
     def list_keys(
         self, prefix: Optional[str] = None, strip_prefix: bool = True
     ) -> List[str]:
-        if prefix is None:
-            prefix = self._global_prefix
-        else:
-            prefix = self._get_key(prefix)
-
-        keys = self._disk_cache.iterkeys()
         start_pos = len(prefix) if strip_prefix and prefix is not None else 0
-        res = [k[start_pos:] for k in keys if prefix is None or k.startswith(prefix)]
+        res = [k[start_pos:] for k in self._iter_keys(prefix or "")]
         if H.LOGGER.getEffectiveLevel() == H.logging.DEBUG:
             H.LOGGER.debug(f"LIST {prefix}: {res}")
         return res
 
+    def incr(self, key: str) -> int:
+        return self._disk_cache.incr(self._get_key(key), default=0)
+
+    def get_counters(self, keys: List[str]) -> Dict[str, int]:
+        return {key: self._disk_cache.get(self._get_key(key), 0) for key in keys}
+
     def get_disk_cache(self) -> diskcache.Cache:
         return self._disk_cache
 
@@ -133,13 +254,26 @@ class RequestCache(MitzuCache):
 
     def put(self, key: str, val: Any, expire: Optional[float] = None):
         self.delegate.put(key, val, expire)
+        if val is not None:
+            self._get_request_cache()[key] = val
+
+    def add(self, key: str, val: Any, expire: Optional[float] = None) -> bool:
+        cache = self._get_request_cache()
+        cache.pop(key, None)
+        res = self.delegate.add(key, val, expire)
+        if res and val is not None:
+            cache[key] = val
+        return res
 
     def get(self, key: str, default: Optional[Any] = None) -> Any:
-        res = self._get_request_cache().get(key)
+        cache = self._get_request_cache()
+        res = cache.get(key)
         if res is None:
-            res = self.delegate.get(key, default)
+            res = self.delegate.get(key)
+            if res is not None:
+                cache[key] = res
 
-        return res
+        return res if res is not None else default
 
     def clear(self, key: str) -> None:
         cache = self._get_request_cache()
@@ -147,6 +281,208 @@ class RequestCache(MitzuCache):
             cache.pop(key)
         self.delegate.clear(key)
 
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        cache = self._get_request_cache()
+        res = {key: cache[key] for key in keys if cache.get(key) is not None}
+        missing = [key for key in keys if key not in res]
+        if missing:
+            found = self.delegate.get_many(missing)
+            cache.update(found)
+            res.update(found)
+        return res
+
+    def put_many(self, values: Dict[str, Any], expire: Optional[float] = None) -> None:
+        self.delegate.put_many(values, expire)
+        cache = self._get_request_cache()
+        cache.update({key: val for key, val in values.items() if val is not None})
+
+    def clear_many(self, keys: List[str]) -> None:
+        cache = self._get_request_cache()
+        for key in keys:
+            cache.pop(key, None)
+        self.delegate.clear_many(keys)
+
+    def clear_all(self, prefix: Optional[str] = None) -> None:
+        cache = self._get_request_cache()
+        for key in [k for k in cache.keys() if k.startswith(prefix or "")]:
+            cache.pop(key)
+        self.delegate.clear_all(prefix)
+
+    def incr(self, key: str) -> int:
+        return self.delegate.incr(key)
+
+    def get_counters(self, keys: List[str]) -> Dict[str, int]:
+        return self.delegate.get_counters(keys)
+
+    def list_keys(
+        self, prefix: Optional[str] = None, strip_prefix: bool = True
+    ) -> List[str]:
+        return self.delegate.list_keys(prefix, strip_prefix)
+
+    def health_check(self):
+        return self.delegate.health_check()
+
+
+def estimate_size(val: Any) -> int:
+    if isinstance(val, pd.DataFrame):
+        return int(val.memory_usage(index=True, deep=True).sum())
+    try:
+        return len(pickle.dumps(val))
+    except Exception:
+        return 0
+
+
+# Prefix of the cache generation counters of the projects
+GENERATION_PREFIX = "__GENERATION__."
+# Suffix of the markers of the metric results being refreshed in the background
+REVALIDATING_SUFFIX = ".revalidating"
+# Keys of the state shared by the workers (cache generations, revalidation flags),
+# these are always read from the delegate of the in-process tier
+LOCAL_CACHE_EXCLUDED_PREFIXES = (GENERATION_PREFIX,)
+LOCAL_CACHE_EXCLUDED_SUFFIXES = (REVALIDATING_SUFFIX,)
+
+
+class LRUMitzuCache(MitzuCache):
+    """In-process cache tier in front of a shared cache.
+    Values are kept unpickled in memory in least recently used order until their total estimated size
+    reaches max_bytes. Writes go through to the delegate. The entries removed or overwritten by other
+    workers are evicted with the invalidation messages of the delegate, so it should be used only
+    in front of a cache supporting them (Redis). The values read from the delegate are kept only until
+    they expire there, as the expiration of a key doesn't send an invalidation message.
+    """
+
+    def __init__(
+        self,
+        delegate: MitzuCache,
+        max_bytes: int = configs.LOCAL_CACHE_MAX_BYTES,
+        max_expire: float = configs.CACHE_EXPIRATION,
+    ) -> None:
+        super().__init__()
+        self.delegate = delegate
+        self.max_bytes = max_bytes
+        self.max_expire = max_expire
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        if isinstance(delegate, RedisMitzuCache):
+            delegate.subscribe_invalidations(self.evict, self.evict_all)
+
+    def _is_local(self, key: str) -> bool:
+        return not key.startswith(LOCAL_CACHE_EXCLUDED_PREFIXES) and not key.endswith(
+            LOCAL_CACHE_EXCLUDED_SUFFIXES
+        )
+
+    def _put_local(self, key: str, val: Any, expire: Optional[float]):
+        self.evict(key)
+        if val is None or self.max_bytes <= 0 or not self._is_local(key):
+            return
+        size = estimate_size(val)
+        if size > self.max_bytes:
+            return
+        expire = self.max_expire if expire is None else min(expire, self.max_expire)
+        with self._lock:
+            self._entries[key] = (val, size, time.monotonic() + expire)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def _get_local(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            val, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._entries.pop(key)
+                self._size -= size
+                return None
+            self._entries.move_to_end(key)
+        if isinstance(val, pd.DataFrame):
+            # the callers may modify the columns or the index of the returned dataframe
+            return val.copy(deep=False)
+        return val
+
+    def evict(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[1]
+
+    def evict_all(self, prefix: Optional[str] = None):
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            for key in [k for k in self._entries.keys() if k.startswith(prefix)]:
+                self._size -= self._entries.pop(key)[1]
+
+    def put(self, key: str, val: Any, expire: Optional[float] = None):
+        self.delegate.put(key, val, expire)
+        self._put_local(key, val, expire)
+
+    def add(self, key: str, val: Any, expire: Optional[float] = None) -> bool:
+        self.evict(key)
+        res = self.delegate.add(key, val, expire)
+        if res:
+            self._put_local(key, val, expire)
+        return res
+
+    def _load(self, keys: List[str]) -> Dict[str, Any]:
+        res: Dict[str, Any] = {}
+        for key, (val, expire) in self.delegate.get_many_with_expire(keys).items():
+            # the values expiring in the delegate are not invalidated, they are kept only until then
+            if expire is not None:
+                self._put_local(key, val, expire)
+            res[key] = val
+        return res
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        res = self._get_local(key)
+        if res is None:
+            if self._is_local(key):
+                res = self._load([key]).get(key)
+            else:
+                res = self.delegate.get(key)
+
+        return res if res is not None else default
+
+    def clear(self, key: str) -> None:
+        self.evict(key)
+        self.delegate.clear(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        res: Dict[str, Any] = {}
+        for key in keys:
+            val = self._get_local(key)
+            if val is not None:
+                res[key] = val
+        missing = [key for key in keys if key not in res]
+        if missing:
+            res.update(self._load(missing))
+        return res
+
+    def put_many(self, values: Dict[str, Any], expire: Optional[float] = None) -> None:
+        self.delegate.put_many(values, expire)
+        for key, val in values.items():
+            self._put_local(key, val, expire)
+
+    def clear_many(self, keys: List[str]) -> None:
+        for key in keys:
+            self.evict(key)
+        self.delegate.clear_many(keys)
+
+    def clear_all(self, prefix: Optional[str] = None) -> None:
+        self.evict_all(prefix)
+        self.delegate.clear_all(prefix)
+
+    def incr(self, key: str) -> int:
+        return self.delegate.incr(key)
+
+    def get_counters(self, keys: List[str]) -> Dict[str, int]:
+        return self.delegate.get_counters(keys)
+
     def list_keys(
         self, prefix: Optional[str] = None, strip_prefix: bool = True
     ) -> List[str]:
@@ -160,18 +496,31 @@ class RedisException(Exception):
     pass
 
 
+INVALIDATE_KEY = "K"
+INVALIDATE_PREFIX = "P"
+# Number of UNLINK commands sent in one round trip
+REDIS_PIPELINE_SIZE = 10
+
+
 @dataclass(init=False, frozen=True)
 class RedisMitzuCache(MitzuCache):
 
     _redis: redis.Redis
     _global_prefix: Optional[str] = None
+    _instance_id: str = ""
+    _codec: CC.CacheCodec = CC.PickleCodec()
 
     def __init__(
         self,
         redis_cache: Optional[redis.Redis] = None,
         global_prefix: Optional[str] = None,
+        codec: Optional[CC.CacheCodec] = None,
     ) -> None:
         super().__init__()
+        object.__setattr__(
+            self, "_codec", codec if codec is not None else get_default_codec()
+        )
+        object.__setattr__(self, "_instance_id", uuid.uuid4().hex)
 
         if redis_cache is not None:
             object.__setattr__(self, "_redis", redis_cache)
@@ -191,14 +540,78 @@ class RedisMitzuCache(MitzuCache):
             return f"{self._global_prefix}.{key}"
         return key
 
+    def _get_invalidation_channel(self) -> str:
+        return self._get_key(configs.CACHE_INVALIDATION_CHANNEL)
+
+    def _publish_invalidation(self, key: str, is_prefix: bool = False):
+        kind = INVALIDATE_PREFIX if is_prefix else INVALIDATE_KEY
+        try:
+            self._redis.publish(
+                self._get_invalidation_channel(),
+                f"{self._instance_id}:{kind}:{key}",
+            )
+        except redis.RedisError as exc:
+            H.LOGGER.warn(f"Failed to publish cache invalidation of {key}: {exc}")
+
+    def subscribe_invalidations(
+        self,
+        on_key: Callable[[str], None],
+        on_prefix: Callable[[str], None],
+    ):
+        """Calls the callbacks with the keys or key prefixes that were put or cleared by other cache instances"""
+
+        def handler(message: Dict[str, Any]):
+            data = message["data"]
+            sender, kind, key = (
+                data.decode() if isinstance(data, bytes) else data
+            ).split(":", 2)
+            if sender == self._instance_id:
+                return
+            if kind == INVALIDATE_PREFIX:
+                on_prefix(key)
+            else:
+                on_key(key)
+
+        try:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self._get_invalidation_channel(): handler})
+            pubsub.run_in_thread(sleep_time=1, daemon=True)
+        except redis.RedisError as exc:
+            H.LOGGER.warn(f"Failed to subscribe to cache invalidations: {exc}")
+
+    def _get_expire(self, expire: Optional[float]) -> Optional[int]:
+        # Redis expects the expiration in whole seconds
+        return None if expire is None else int(expire)
+
+    def _decode(self, data: Union[bytes, str]) -> Any:
+        # the client is created without decode_responses, the values are always returned as bytes
+        if isinstance(data, str):
+            data = data.encode()
+        return self._codec.decode(data)
+
     def put(self, key: str, val: Any, expire: Optional[float] = None):
-        key = self._get_key(key)
-        pickled_value = pickle.dumps(val)
+        encoded_value = self._codec.encode(val)
         if H.LOGGER.getEffectiveLevel() == H.logging.DEBUG:
-            H.LOGGER.debug(f"PUT: {key}: {len(pickled_value)}")
-        res = self._redis.set(name=key, value=pickled_value, ex=expire)
+            H.LOGGER.debug(f"PUT: {self._get_key(key)}: {len(encoded_value)}")
+        res = self._redis.set(
+            name=self._get_key(key), value=encoded_value, ex=self._get_expire(expire)
+        )
         if not res:
-            raise RedisException(f"Couldn't set {key}")
+            raise RedisException(f"Couldn't set {self._get_key(key)}")
+        self._publish_invalidation(key)
+
+    def add(self, key: str, val: Any, expire: Optional[float] = None) -> bool:
+        H.LOGGER.debug(f"ADD: {self._get_key(key)}")
+        res = self._redis.set(
+            name=self._get_key(key),
+            value=self._codec.encode(val),
+            ex=self._get_expire(expire),
+            nx=True,
+        )
+        if not res:
+            return False
+        self._publish_invalidation(key)
+        return True
 
     def get(self, key: str, default: Optional[Any] = None) -> Any:
         key = self._get_key(key)
@@ -210,25 +623,107 @@ class RedisMitzuCache(MitzuCache):
             return None
         if H.LOGGER.getEffectiveLevel() == H.logging.DEBUG:
             H.LOGGER.debug(f"GET: {key}: {len(res)}")
-        return pickle.loads(res)
+        return self._decode(res)
 
     def clear(self, key: str) -> None:
-        key = self._get_key(key)
-        H.LOGGER.debug(f"CLEAR: {key}")
-        self._redis.delete(key)
+        H.LOGGER.debug(f"CLEAR: {self._get_key(key)}")
+        self._redis.delete(self._get_key(key))
+        self._publish_invalidation(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        values = self._redis.mget([self._get_key(key) for key in keys])
+        H.LOGGER.debug(f"MGET: {len(keys)}")
+        return {
+            key: self._decode(val) for key, val in zip(keys, values) if val is not None
+        }
+
+    def get_many_with_expire(
+        self, keys: List[str]
+    ) -> Dict[str, Tuple[Any, Optional[float]]]:
+        if not keys:
+            return {}
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.mget([self._get_key(key) for key in keys])
+        for key in keys:
+            pipeline.pttl(self._get_key(key))
+        values, *pttls = pipeline.execute()
+        H.LOGGER.debug(f"MGET PTTL: {len(keys)}")
+        res: Dict[str, Tuple[Any, Optional[float]]] = {}
+        for key, val, pttl in zip(keys, values, pttls):
+            # PTTL is -2 for the missing and -1 for the not expiring keys
+            if val is None or pttl == -2:
+                continue
+            res[key] = (self._decode(val), math.inf if pttl == -1 else pttl / 1000)
+        return res
+
+    def put_many(self, values: Dict[str, Any], expire: Optional[float] = None) -> None:
+        pipeline = self._redis.pipeline(transaction=False)
+        channel = self._get_invalidation_channel()
+        for key, val in values.items():
+            pipeline.set(
+                name=self._get_key(key),
+                value=self._codec.encode(val),
+                ex=self._get_expire(expire),
+            )
+            pipeline.publish(channel, f"{self._instance_id}:{INVALIDATE_KEY}:{key}")
+        H.LOGGER.debug(f"PUT MANY: {len(values)}")
+        res = pipeline.execute()
+        if not all(res[::2]):
+            raise RedisException(f"Couldn't set all of {list(values.keys())}")
+
+    def clear_many(self, keys: List[str]) -> None:
+        if not keys:
+            return
+        pipeline = self._redis.pipeline(transaction=False)
+        channel = self._get_invalidation_channel()
+        pipeline.unlink(*[self._get_key(key) for key in keys])
+        for key in keys:
+            pipeline.publish(channel, f"{self._instance_id}:{INVALIDATE_KEY}:{key}")
+        H.LOGGER.debug(f"CLEAR MANY: {len(keys)}")
+        pipeline.execute()
+
+    def incr(self, key: str) -> int:
+        return self._redis.incr(self._get_key(key))
+
+    def get_counters(self, keys: List[str]) -> Dict[str, int]:
+        if not keys:
+            return {}
+        values = self._redis.mget([self._get_key(key) for key in keys])
+        return {key: int(val or 0) for key, val in zip(keys, values)}
+
+    def _scan_keys(self, prefix: str) -> Iterator[str]:
+        # SCAN doesn't block the server like KEYS does
+        pattern = re.sub(r"([*?\[\]\\])", r"\\\1", self._get_key(prefix)) + "*"
+        global_prefix_length = len(self._get_key(""))
+        for key in self._redis.scan_iter(
+            match=pattern, count=configs.CACHE_CLEAR_BATCH_SIZE
+        ):
+            yield key.decode()[global_prefix_length:]
+
+    def clear_all(self, prefix: Optional[str] = None) -> None:
+        batch_size = configs.CACHE_CLEAR_BATCH_SIZE
+        pipeline = self._redis.pipeline(transaction=False)
+        batch: List[str] = []
+        for key in self._scan_keys(prefix or ""):
+            batch.append(self._get_key(key))
+            if len(batch) == batch_size:
+                pipeline.unlink(*batch)
+                batch = []
+            if len(pipeline) >= REDIS_PIPELINE_SIZE:
+                pipeline.execute()
+        if batch:
+            pipeline.unlink(*batch)
+        pipeline.execute()
+        H.LOGGER.debug(f"CLEAR ALL: {self._get_key(prefix or '')}")
+        self._publish_invalidation(prefix or "", is_prefix=True)
 
     def list_keys(
         self, prefix: Optional[str] = None, strip_prefix: bool = True
     ) -> List[str]:
-        if prefix:
-            prefix = self._get_key(prefix)
-        elif self._global_prefix is not None:
-            prefix = self._global_prefix
-        else:
-            prefix = ""
-        keys = self._redis.keys(f"{prefix}*")
-        start_pos = len(prefix) if strip_prefix else 0
-        res = [k.decode()[start_pos:] for k in keys]
+        start_pos = len(prefix) if strip_prefix and prefix is not None else 0
+        res = [k[start_pos:] for k in self._scan_keys(prefix or "")]
         if H.LOGGER.getEffectiveLevel() == H.logging.DEBUG:
             H.LOGGER.debug(f"LIST prefix={prefix}: {res}")
         return res
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import pickle
+from abc import ABC
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import pandas as pd
+
+import mitzu.helper as H
+
+PICKLE_HEADER = b"MZP1"
+ARROW_HEADER = b"MZA1"
+HEADER_LENGTH = 4
+
+
+class CacheCodec(ABC):
+    """Converts the cached values to bytes and back"""
+
+    def encode(self, val: Any) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, data: bytes) -> Any:
+        if data[:HEADER_LENGTH] == PICKLE_HEADER:
+            return pickle.loads(data[HEADER_LENGTH:])
+        if data[:HEADER_LENGTH] == ARROW_HEADER:
+            import pyarrow as pa
+
+            reader = pa.ipc.open_stream(pa.py_buffer(data[HEADER_LENGTH:]))
+            return reader.read_all().to_pandas()
+
+        # values written before the codecs were introduced are plain pickles
+        return pickle.loads(data)
+
+
+@dataclass(frozen=True)
+class PickleCodec(CacheCodec):
+    def encode(self, val: Any) -> bytes:
+        return PICKLE_HEADER + pickle.dumps(val, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+@dataclass(frozen=True)
+class ArrowCodec(CacheCodec):
+    """
+    Stores DataFrames in the compressed Arrow IPC stream format, any other value is pickled.
+    DataFrames that can't be converted to Arrow (e.g. columns with mixed types) are pickled as well.
+    """
+
+    compression: Optional[str] = "zstd"
+
+    def _encode_df(self, df: pd.DataFrame) -> bytes:
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return ARROW_HEADER + sink.getvalue().to_pybytes()
+
+    def encode(self, val: Any) -> bytes:
+        if isinstance(val, pd.DataFrame):
+            try:
+                import pyarrow as pa
+            except ImportError as exc:
+                H.LOGGER.warn(
+                    f"Falling back to pickle, pyarrow can't be imported: {exc}"
+                )
+                return PickleCodec().encode(val)
+            try:
+                return self._encode_df(val)
+            except (
+                ValueError,
+                TypeError,
+                NotImplementedError,
+                pa.ArrowException,
+            ) as exc:
+                H.LOGGER.debug(f"Falling back to pickle: {exc}")
+        return PickleCodec().encode(val)
+
+
+def is_arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+
+        return True
+    except ImportError as exc:
+        H.LOGGER.warn(f"Can't import pyarrow: {exc}")
+        return False
+
+
+def create_codec(name: str, compression: Optional[str] = None) -> CacheCodec:
+    if name == "pickle":
+        return PickleCodec()
+    if name == "arrow":
+        if not is_arrow_available():
+            H.LOGGER.warn("Using the pickle cache codec instead of arrow")
+            return PickleCodec()
+        return ArrowCodec(compression=compression)
+    raise ValueError(f"Unknown cache codec: {name}")
@@ -1,79 +1,279 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
 import mitzu.adapters.generic_adapter as GA
+import mitzu.helper as H
 import mitzu.model as M
-from typing import Any, List, Dict
-import pandas as pd
 import mitzu.webapp.cache as CA
-import hashlib
+import mitzu.webapp.configs as configs
+import mitzu.webapp.service.cache_generation_service as CGS
+
+QUERY_PREFIX = "__QUERY__."
+METRIC_PREFIX = "__METRIC__."
+DISCOVERY_PREFIX = "__DISCOVERY__."
+
+METRIC = "metric"
+QUERY = "query"
+DISCOVERY = "discovery"
+
+
+class CachedAdapterError(Exception):
+    """Raised in place of an error that was cached for a previous execution"""
+
+
+@dataclass(frozen=True)
+class _CachedError:
+    error_type: str
+    message: str
+
+
+@dataclass(frozen=True)
+class CacheExpirations:
+    """Seconds until the cached results of the adapter methods expire, 0 disables caching"""
+
+    metric: float = configs.CACHE_EXPIRATION
+    query: float = configs.CACHE_EXPIRATION
+    discovery: float = configs.DISCOVERY_CACHE_EXPIRATION
+    error: float = configs.ERROR_CACHE_EXPIRATION
+
+    def get(self, kind: str) -> float:
+        return getattr(self, kind)
+
+
+@dataclass
+class CacheStats:
+    hits: Dict[str, int] = field(default_factory=dict)
+    misses: Dict[str, int] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, kind: str, hit: bool):
+        with self._lock:
+            counters = self.hits if hit else self.misses
+            counters[kind] = counters.get(kind, 0) + 1
+
+    def hit_ratio(self, kind: str) -> Optional[float]:
+        hits = self.hits.get(kind, 0)
+        total = hits + self.misses.get(kind, 0)
+        return hits / total if total > 0 else None
+
+    def reset(self):
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+# Process wide counters of all caching adapters
+STATS = CacheStats()
 
-QUERY_PREFIX = "__QUERY__"
-METRIC_PREFIX = "__METRIC__"
+
+def fingerprint(*parts: str) -> str:
+    return hashlib.md5("\n".join(parts).encode()).hexdigest()
+
+
+def clear_cached_metric(metric: M.Metric):
+    """Removes the cached result of the metric, so the next execution hits the data warehouse"""
+    clear_cached_metrics([metric])
+
+
+def clear_cached_metrics(metrics: List[M.Metric]):
+    adapters: Dict[int, CachingDatasetAdapter] = {}
+    metrics_by_adapter: Dict[int, List[M.Metric]] = {}
+    for metric in metrics:
+        adapter = metric.get_project().get_adapter()
+        if isinstance(adapter, CachingDatasetAdapter):
+            adapters[id(adapter)] = adapter
+            metrics_by_adapter.setdefault(id(adapter), []).append(metric)
+
+    for adapter_id, adapter in adapters.items():
+        adapter.clear_metrics(metrics_by_adapter[adapter_id])
 
 
 class CachingDatasetAdapter(GA.GenericDatasetAdapter):
+    """
+    Caches the results of the wrapped adapter.
+    The keys are the fingerprints of the compiled SQL and the connection id, so the same query
+    of different metrics or projects on the same connection is executed only once.
+    Errors are cached as well for a short period to avoid rerunning failing queries.
+    """
+
     def __init__(
         self,
         adapter: GA.GenericDatasetAdapter,
         cache: CA.MitzuCache,
-        expire: float = 600,
+        expirations: Optional[CacheExpirations] = None,
+        generations: Optional[CGS.CacheGenerationService] = None,
     ):
+        super().__init__(adapter.project)
         self._adapter = adapter
         self._cache = cache
-        self._expire = expire
+        self._expirations = (
+            expirations if expirations is not None else CacheExpirations()
+        )
+        self._generations = generations
+
+    def _get_key(self, prefix: str, hash_key: str) -> str:
+        if self._generations is not None:
+            return f"{prefix}{self._generations.get_namespace(self.project)}.{hash_key}"
+        return f"{prefix}{self.project.connection.id}.{hash_key}"
+
+    def _cached(self, kind: str, key: str, func: Callable[[], Any]) -> Any:
+        if self._expirations.get(kind) <= 0:
+            return func()
+
+        res = self._cache.get(key)
+        STATS.record(kind, hit=res is not None)
+        if res is not None:
+            if isinstance(res, _CachedError):
+                raise CachedAdapterError(f"{res.error_type}: {res.message}")
+            return res
+
+        try:
+            res = func()
+        except Exception as exc:
+            if self._expirations.error > 0:
+                self._cache.put(
+                    key,
+                    _CachedError(type(exc).__name__, str(exc)),
+                    expire=self._expirations.error,
+                )
+            raise exc
+
+        self._cache.put(key, res, expire=self._expirations.get(kind))
+        return res
+
+    def _get_metric_key(self, metric_sql: str) -> str:
+        return self._get_key(METRIC_PREFIX, fingerprint(metric_sql))
+
+    def _get_discovery_key(self, method: str, *parts: str) -> str:
+        return self._get_key(DISCOVERY_PREFIX, fingerprint(method, *parts))
+
+    def _get_edt_fingerprint(self, event_data_table: M.EventDataTable) -> str:
+        return json.dumps(
+            [
+                event_data_table.id,
+                event_data_table.schema,
+                event_data_table.table_name,
+                str(event_data_table.discovery_settings),
+            ]
+        )
+
+    def _get_metric_sql(self, metric: M.Metric) -> str:
+        if isinstance(metric, M.ConversionMetric):
+            return self._adapter.get_conversion_sql(metric)
+        elif isinstance(metric, M.SegmentationMetric):
+            return self._adapter.get_segmentation_sql(metric)
+        elif isinstance(metric, M.RetentionMetric):
+            return self._adapter.get_retention_sql(metric)
+        raise ValueError(f"Unsupported metric type: {type(metric)}")
+
+    def clear_metric(self, metric: M.Metric):
+        self._cache.clear(self._get_metric_key(self._get_metric_sql(metric)))
+
+    def clear_metrics(self, metrics: List[M.Metric]):
+        self._cache.clear_many(
+            [self._get_metric_key(self._get_metric_sql(metric)) for metric in metrics]
+        )
 
     def execute_query(self, query: Any) -> pd.DataFrame:
-        key = str(hashlib.md5(bytes(query)))
-        pdf = self._cache.get(QUERY_PREFIX + key)
-        if pdf is None:
-            pdf = self._adapter.execute_query(query)
-            self._cache.put(key, pdf, self._expire)
-        return pdf
+        if type(query) == str:
+            sql = query
+        else:
+            try:
+                sql = str(query.compile(compile_kwargs={"literal_binds": True}))
+            except Exception as exc:
+                H.LOGGER.debug(f"Query is not cacheable: {exc}")
+                return self._adapter.execute_query(query)
+
+        return self._cached(
+            QUERY,
+            self._get_key(QUERY_PREFIX, fingerprint(sql)),
+            lambda: self._adapter.execute_query(query),
+        )
 
     def list_fields(self, event_data_table: M.EventDataTable) -> List[M.Field]:
-        return self._adapter.list_fields(event_data_table)
+        return self._cached(
+            DISCOVERY,
+            self._get_discovery_key(
+                "list_fields", self._get_edt_fingerprint(event_data_table)
+            ),
+            lambda: self._adapter.list_fields(event_data_table),
+        )
 
-    def get_distinct_event_names(self, event_data_table: M.EventDataTable) -> List[str]:
+    def list_all_table_columns(self, schema: str, table_name: str) -> List[M.Field]:
+        return self._adapter.list_all_table_columns(schema, table_name)
+
+    def list_all_table_columns_bulk(
+        self, schema: str, table_names: List[str]
+    ) -> Dict[str, List[M.Field]]:
+        return self._adapter.list_all_table_columns_bulk(schema, table_names)
 
-        return self._adapter.get_distinct_event_names(event_data_table)
+    def get_distinct_event_names(self, event_data_table: M.EventDataTable) -> List[str]:
+        return self._cached(
+            DISCOVERY,
+            self._get_discovery_key(
+                "get_distinct_event_names",
+                self._get_edt_fingerprint(event_data_table),
+            ),
+            lambda: self._adapter.get_distinct_event_names(event_data_table),
+        )
 
     def get_field_enums(
         self,
         event_data_table: M.EventDataTable,
         fields: List[M.Field],
     ) -> Dict[str, M.EventDef]:
-        return self._adapter.get_field_enums(event_data_table, fields)
+        return self._cached(
+            DISCOVERY,
+            self._get_discovery_key(
+                "get_field_enums",
+                self._get_edt_fingerprint(event_data_table),
+                *[f._get_name() for f in fields],
+            ),
+            lambda: self._adapter.get_field_enums(event_data_table, fields),
+        )
+
+    def list_schemas(self) -> List[str]:
+        return self._adapter.list_schemas()
+
+    def list_tables(self, schema: str) -> List[str]:
+        return self._adapter.list_tables(schema)
 
     def get_conversion_sql(self, metric: M.ConversionMetric) -> str:
         return self._adapter.get_conversion_sql(metric)
 
     def get_conversion_df(self, metric: M.ConversionMetric) -> pd.DataFrame:
-        key = hashlib.md5(metric.get_sql().encode()).hexdigest()
-        pdf = self._cache.get(METRIC_PREFIX + key)
-        if pdf is None:
-            pdf = self._adapter.get_conversion_df(metric)
-            self._cache.put(key, pdf, self._expire)
-        return pdf
+        return self._cached(
+            METRIC,
+            self._get_metric_key(self._adapter.get_conversion_sql(metric)),
+            lambda: self._adapter.get_conversion_df(metric),
+        )
 
     def get_segmentation_sql(self, metric: M.SegmentationMetric) -> str:
         return self._adapter.get_segmentation_sql(metric)
 
     def get_segmentation_df(self, metric: M.SegmentationMetric) -> pd.DataFrame:
-        key = hashlib.md5(metric.get_sql().encode()).hexdigest()
-        pdf = self._cache.get(METRIC_PREFIX + key)
-        if pdf is None:
-            pdf = self._adapter.get_segmentation_df(metric)
-            self._cache.put(key, pdf, self._expire)
-        return pdf
+        return self._cached(
+            METRIC,
+            self._get_metric_key(self._adapter.get_segmentation_sql(metric)),
+            lambda: self._adapter.get_segmentation_df(metric),
+        )
 
     def get_retention_sql(self, metric: M.RetentionMetric) -> str:
         return self._adapter.get_retention_sql(metric)
 
     def get_retention_df(self, metric: M.RetentionMetric) -> pd.DataFrame:
-        key = hashlib.md5(metric.get_sql().encode()).hexdigest()
-        pdf = self._cache.get(METRIC_PREFIX + key)
-        if pdf is None:
-            pdf = self._adapter.get_retention_df(metric)
-            self._cache.put(key, pdf, self._expire)
-        return pdf
+        return self._cached(
+            METRIC,
+            self._get_metric_key(self._adapter.get_retention_sql(metric)),
+            lambda: self._adapter.get_retention_df(metric),
+        )
 
     def test_connection(self):
         self._adapter.test_connection()
@@ -20,8 +20,42 @@ AUTH_ROOT_USER_EMAIL = os.getenv("AUTH_ROOT_USER_EMAIL")
 
 # cache
 CACHE_EXPIRATION = int(os.getenv("CACHE_EXPIRATION", "600"))
+# Expired explore results are still served for this many seconds while they are refreshed in the background
+CACHE_STALE_EXPIRATION = int(os.getenv("CACHE_STALE_EXPIRATION", "86400"))
 CACHE_PREFIX = os.getenv("CACHE_PREFIX")
 CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "__INVALIDATE__")
+# Number of keys scanned and deleted at once when clearing the cache by prefix
+CACHE_CLEAR_BATCH_SIZE = int(os.getenv("CACHE_CLEAR_BATCH_SIZE", "1000"))
+# arrow or pickle, arrow stores the dataframes in the compressed Arrow IPC format
+CACHE_CODEC = os.getenv("CACHE_CODEC", "arrow")
+# zstd, lz4 or none
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "zstd")
+# Size of the in-process cache tier of each worker, 0 disables it.
+# It is used only with the Redis cache, the disk cache can't evict it in the other workers
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+SCHEMA_CATALOG_CACHE_EXPIRATION = int(
+    os.getenv("SCHEMA_CATALOG_CACHE_EXPIRATION", "3600")
+)
+# Discovery results are cached only when it is set, rediscovery should see the latest data
+DISCOVERY_CACHE_EXPIRATION = int(os.getenv("DISCOVERY_CACHE_EXPIRATION", "0"))
+ERROR_CACHE_EXPIRATION = int(os.getenv("ERROR_CACHE_EXPIRATION", "30"))
+ADAPTER_CACHE_ENABLED = bool(
+    os.getenv("ADAPTER_CACHE_ENABLED", "true").lower() != "false"
+)
+
+# dashboards
+# Number of metric queries executed at the same time on a connection when dashboards are refreshed
+DASHBOARD_REFRESH_CONCURRENCY = int(os.getenv("DASHBOARD_REFRESH_CONCURRENCY", "4"))
+# Seconds between two checks of the dashboard schedules in the pre-warming worker
+DASHBOARD_PREWARM_INTERVAL = int(os.getenv("DASHBOARD_PREWARM_INTERVAL", "60"))
+# svg draws the saved metric thumbnails in Python in a few milliseconds,
+# kaleido renders the plotly figures with a headless browser in the render workers
+THUMBNAIL_RENDERER = os.getenv("THUMBNAIL_RENDERER", "svg")
+# Number of render worker processes of the saved metric thumbnails, each keeps a Kaleido process running
+THUMBNAIL_RENDER_WORKERS = int(os.getenv("THUMBNAIL_RENDER_WORKERS", "2"))
+# Rendered thumbnails are reused for the same figures for this many seconds
+THUMBNAIL_CACHE_EXPIRATION = int(os.getenv("THUMBNAIL_CACHE_EXPIRATION", "86400"))
 
 # storage
 SETUP_SAMPLE_PROJECT = bool(
@@ -33,6 +67,18 @@ STORAGE_CONNECTION_STRING = os.getenv(
     "STORAGE_CONNECTION_STRING",
     "sqlite:///storage.db?cache=shared&check_same_thread=False",
 )
+# Read-only storage queries go to this database (e.g. a read replica) when it is set
+STORAGE_READ_CONNECTION_STRING = os.getenv("STORAGE_READ_CONNECTION_STRING")
+# Reads go to the primary database for this many seconds after a write of the worker,
+# so the worker sees its own writes despite the replication lag
+STORAGE_READ_AFTER_WRITE_SECONDS = float(
+    os.getenv("STORAGE_READ_AFTER_WRITE_SECONDS", "5")
+)
+# Connection pool of each storage database, ignored by SQLite
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "5"))
+STORAGE_MAX_OVERFLOW = int(os.getenv("STORAGE_MAX_OVERFLOW", "10"))
+# Connections older than this many seconds are replaced, -1 keeps them open
+STORAGE_POOL_RECYCLE = int(os.getenv("STORAGE_POOL_RECYCLE", "-1"))
 
 ENABLE_USAGE_TRACKING = os.getenv("ENABLE_USAGE_TRACKING", "true").lower() != "false"
 TRACKING_API_KEY = os.getenv("TRACKING_API_KEY", "")
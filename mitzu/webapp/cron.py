@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import FrozenSet, List, Optional, Set, Tuple
+
+# minute, hour, day of month, month, day of week (0 is Sunday, 7 is accepted as well)
+FIELD_RANGES: List[Tuple[int, int]] = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+MAX_LOOKBACK_MINUTES = 7 * 24 * 60
+
+
+class InvalidCronExpression(ValueError):
+    pass
+
+
+def _parse_field(value: str, min_value: int, max_value: int) -> FrozenSet[int]:
+    result: Set[int] = set()
+    for part in value.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            if not step_str.isdigit() or int(step_str) == 0:
+                raise InvalidCronExpression(f"Invalid step: {step_str}")
+            step = int(step_str)
+
+        if part == "*":
+            start, end = min_value, max_value
+        elif "-" in part:
+            start_str, end_str = part.split("-", 1)
+            if not start_str.isdigit() or not end_str.isdigit():
+                raise InvalidCronExpression(f"Invalid range: {part}")
+            start, end = int(start_str), int(end_str)
+        elif part.isdigit():
+            start = int(part)
+            end = max_value if step > 1 else start
+        else:
+            raise InvalidCronExpression(f"Invalid value: {part}")
+
+        if start < min_value or end > max_value or start > end:
+            raise InvalidCronExpression(
+                f"{part} is out of the range {min_value}-{max_value}"
+            )
+        result.update(range(start, end + 1, step))
+    return frozenset(result)
+
+
+@dataclass(frozen=True)
+class CronExpression:
+    """
+    Standard 5 field cron expression (minute hour day-of-month month day-of-week).
+    Supports *, lists, ranges and steps, e.g. "*/15 6-18 * * 1-5".
+    """
+
+    expression: str
+    minutes: FrozenSet[int]
+    hours: FrozenSet[int]
+    days: FrozenSet[int]
+    months: FrozenSet[int]
+    weekdays: FrozenSet[int]
+    any_day: bool
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> CronExpression:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise InvalidCronExpression(
+                f"Cron expression must have 5 fields: {expression}"
+            )
+        minutes, hours, days, months, weekdays = [
+            _parse_field(value, min_value, max_value)
+            for value, (min_value, max_value) in zip(fields, FIELD_RANGES)
+        ]
+        return CronExpression(
+            expression=expression,
+            minutes=minutes,
+            hours=hours,
+            days=days,
+            months=months,
+            weekdays=frozenset(day % 7 for day in weekdays),
+            any_day=fields[2] == "*",
+            any_weekday=fields[4] == "*",
+        )
+
+    def matches(self, dt: datetime) -> bool:
+        if (
+            dt.minute not in self.minutes
+            or dt.hour not in self.hours
+            or dt.month not in self.months
+        ):
+            return False
+
+        day_matches = dt.day in self.days
+        weekday_matches = (dt.weekday() + 1) % 7 in self.weekdays
+        # same as in cron: if both day fields are restricted, either of them has to match
+        if self.any_day:
+            return weekday_matches
+        if self.any_weekday:
+            return day_matches
+        return day_matches or weekday_matches
+
+    def is_due(self, last_run_at: Optional[datetime], now: datetime) -> bool:
+        """
+        Returns True if the expression matched any minute since the last run.
+        Never executed schedules are always due.
+        """
+        if last_run_at is None:
+            return True
+        start = last_run_at.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        end = now.replace(second=0, microsecond=0)
+        start = max(start, end - timedelta(minutes=MAX_LOOKBACK_MINUTES))
+        current = end
+        while current >= start:
+            if self.matches(current):
+                return True
+            current -= timedelta(minutes=1)
+        return False
@@ -15,6 +15,9 @@ import mitzu.webapp.service.events_service as E
 import mitzu.webapp.service.secret_service as SS
 import mitzu.webapp.service.notification_service as NS
 import mitzu.webapp.service.onboarding_service as OS
+import mitzu.webapp.service.schema_catalog_service as SC
+import mitzu.webapp.service.cache_generation_service as CGS
+import mitzu.webapp.service.thumbnail_render_service as TRS
 
 CONFIG_KEY = "dependencies"
 
@@ -33,6 +36,9 @@ class Dependencies:
     notification_service: NS.NotificationService
     tracking_service: TS.TrackingService
     onboarding_service: OS.OnboardingService
+    schema_catalog_service: SC.SchemaCatalogService
+    cache_generation_service: CGS.CacheGenerationService
+    thumbnail_render_service: TRS.ThumbnailRenderService
 
     @classmethod
     def from_configs(
@@ -49,9 +55,22 @@ class Dependencies:
             delegate_cache = C.DiskMitzuCache(
                 "cache", global_prefix=configs.CACHE_PREFIX
             )
+        # only Redis notifies the other workers about the changed keys
+        if configs.LOCAL_CACHE_MAX_BYTES > 0 and isinstance(
+            delegate_cache, C.RedisMitzuCache
+        ):
+            delegate_cache = C.LRUMitzuCache(delegate_cache)
         cache = C.RequestCache(delegate_cache)
+        cache_generation_service = CGS.CacheGenerationService(cache)
         storage = S.MitzuStorage(
             connection_string=configs.STORAGE_CONNECTION_STRING,
+            result_cache=cache if configs.ADAPTER_CACHE_ENABLED else None,
+            cache_generations=cache_generation_service,
+            read_connection_string=configs.STORAGE_READ_CONNECTION_STRING,
+            pool_size=configs.STORAGE_POOL_SIZE,
+            max_overflow=configs.STORAGE_MAX_OVERFLOW,
+            pool_recycle=configs.STORAGE_POOL_RECYCLE,
+            read_after_write_seconds=configs.STORAGE_READ_AFTER_WRITE_SECONDS,
         )
 
         oauth_config = None
@@ -88,6 +107,7 @@ class Dependencies:
         tracking_service = TS.AuthorizedTrackingService(authorizer)
 
         onboarding_service = OS.OnboardingService(storage)
+        schema_catalog_service = SC.SchemaCatalogService(cache)
 
         return Dependencies(
             authorizer=authorizer,
@@ -101,6 +121,9 @@ class Dependencies:
             notification_service=notification_service,
             tracking_service=tracking_service,
             onboarding_service=onboarding_service,
+            schema_catalog_service=schema_catalog_service,
+            cache_generation_service=cache_generation_service,
+            thumbnail_render_service=TRS.ThumbnailRenderService(storage, cache),
         )
 
     @classmethod
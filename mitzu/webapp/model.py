@@ -250,6 +250,21 @@ class Dashboard:
         )
 
 
+@dataclass(frozen=True)
+class DashboardSchedule:
+    """
+    Cron schedule of pre-computing the metrics of a dashboard in the background.
+
+    param dashboard_id: the id of the dashboard
+    param cron: 5 field cron expression, e.g. "0 6 * * 1-5"
+    param last_run_at: the time of the last pre-computation
+    """
+
+    dashboard_id: str
+    cron: str
+    last_run_at: Optional[datetime] = None
+
+
 class Role(Enum):
     ADMIN = "admin"
     MEMBER = "member"
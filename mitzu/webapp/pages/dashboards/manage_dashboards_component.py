@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta
 from typing import Dict, List
 
 import dash.development.base_component as bc
@@ -6,9 +7,11 @@ import dash_draggable as dd
 from dash import ALL, Input, Output, callback, ctx, html, State, no_update, dcc
 import mitzu.webapp.model as WM
 import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.service.dashboard_refresh_service as DRS
+import mitzu.webapp.pages.explore.graph_handler as GH
+import mitzu.webapp.configs as configs
 import dash_mantine_components as dmc
 import mitzu.visualization.plot as PLT
-import mitzu.visualization.charts as CHRT
 from dash_iconify import DashIconify
 import mitzu.serialization as SE
 import mitzu.webapp.pages.paths as P
@@ -31,6 +34,8 @@ DASHBOARD_NAME_INPUT = "dashboard_name_input"
 DASHBOARD_ID = "dashboard_id"
 DASHBOARD_REFRESH_BUTTON = "dashboard_refresh"
 DASHBOARD_METRIC_GRAPH_TYPE = "dashboard_metric_graph_type"
+DASHBOARD_METRIC_AS_OF_TYPE = "dashboard_metric_as_of_type"
+DASHBOARD_REVALIDATE_INTERVAL = "dashboard_revalidate_interval"
 
 DASHBOARD_SPINNER = "dashboard_spinner"
 
@@ -130,6 +135,24 @@ def create_saved_metrics_off_canvas() -> bc.Component:
     )
 
 
+def is_saved_metric_stale(saved_metric: WM.SavedMetric) -> bool:
+    return (
+        saved_metric.last_updated_at + timedelta(seconds=configs.CACHE_EXPIRATION)
+        < datetime.now()
+    )
+
+
+def is_dashboard_stale(dashboard: WM.Dashboard) -> bool:
+    return any(
+        dm.saved_metric is not None and is_saved_metric_stale(dm.saved_metric)
+        for dm in dashboard.dashboard_metrics
+    )
+
+
+def create_as_of_label(saved_metric: WM.SavedMetric) -> str:
+    return f"As of {saved_metric.last_updated_at:%Y-%m-%d %H:%M}"
+
+
 def create_dashboard_metric_card(dm: WM.DashboardMetric) -> bc.Component:
     index = f"{DASHBOARD_ITEM_PREFIX}_{dm.get_saved_metric_id()}"
     if (
@@ -146,6 +169,7 @@ def create_dashboard_metric_card(dm: WM.DashboardMetric) -> bc.Component:
         edit_href = None
         missing_project = True
         border_class = "border border-2 border-warning"
+        as_of = None
     else:
         component = dcc.Graph(
             id={"type": DASHBOARD_METRIC_GRAPH_TYPE, "index": dm.get_saved_metric_id()},
@@ -154,6 +178,11 @@ def create_dashboard_metric_card(dm: WM.DashboardMetric) -> bc.Component:
             config={"displayModeBar": False},
             responsive=True,
         )
+        as_of = html.Small(
+            create_as_of_label(dm.saved_metric),
+            id={"type": DASHBOARD_METRIC_AS_OF_TYPE, "index": dm.get_saved_metric_id()},
+            className="position-absolute start-0 bottom-0 ms-2 text-muted",
+        )
 
         metric = dm.saved_metric.metric
         name = dm.saved_metric.name
@@ -229,6 +258,7 @@ def create_dashboard_metric_card(dm: WM.DashboardMetric) -> bc.Component:
                     className="position-absolute end-0 d-flex",
                     style={"top": "5px"},
                 ),
+                as_of,
             ],
             className="w-100 h-100",
         ),
@@ -321,6 +351,13 @@ def create_manage_dashboard_container(
                         value=0,
                         class_name="my-2",
                     ),
+                    # Refreshes the dashboard in the background if its charts are older than the cache expiration
+                    dcc.Interval(
+                        id=DASHBOARD_REVALIDATE_INTERVAL,
+                        interval=500,
+                        max_intervals=1,
+                        disabled=not is_dashboard_stale(dashboard),
+                    ),
                     dd.ResponsiveGridLayout(
                         id=RESPONSIVE_GRID_LAYOUT,
                         nrows=1,
@@ -352,7 +389,7 @@ def create_manage_dashboard_container(
 def manage_saved_metrics_off_canvas(button: int, search_value: str):
     storage = DEPS.Dependencies.get().storage
     sm_ids = storage.list_saved_metrics()
-    saved_metrics = [storage.get_saved_metric(sm_id) for sm_id in sm_ids]
+    saved_metrics = storage.get_saved_metrics(sm_ids, with_images=False)
     if search_value:
         saved_metrics = [
             sm
@@ -398,7 +435,7 @@ def manage_dashboard_content(
             or delete_clicks is None
         ):
             return no_update, no_update, no_update
-        dashboard = storage.get_dashboard(dashboard_id)
+        dashboard = storage.get_dashboard(dashboard_id, with_images=False)
         dashboard = dashboard.update(
             [
                 dm
@@ -423,7 +460,7 @@ def manage_dashboard_content(
             return no_update, no_update, no_update
 
         saved_metric = storage.get_saved_metric(new_metric_id)
-        dashboard = storage.get_dashboard(dashboard_id)
+        dashboard = storage.get_dashboard(dashboard_id, with_images=False)
         max_y = 0
         if len(dashboard.dashboard_metrics) > 0:
             max_y = max(dashboard.dashboard_metrics, key=lambda dm: dm.y).y + DEF_HEIGHT
@@ -461,7 +498,7 @@ def dashboard_name_changed(name: str, dashboard_id: str) -> str:
         return no_update
     storage = DEPS.Dependencies.get().storage
 
-    dashboard = storage.get_dashboard(dashboard_id)
+    dashboard = storage.get_dashboard(dashboard_id, with_images=False)
     if dashboard is not None:
         d_name = name if name else "Unnamed dashboard"
         dashboard = dashboard.rename(d_name)
@@ -482,7 +519,7 @@ def manage_layout_change(layouts: Dict[str, Dict], dashboard_id: str) -> str:
 
     storage = DEPS.Dependencies.get().storage
 
-    dashboard = storage.get_dashboard(dashboard_id)
+    dashboard = storage.get_dashboard(dashboard_id, with_images=False)
     if dashboard is None:
         return no_update
 
@@ -502,8 +539,10 @@ def manage_layout_change(layouts: Dict[str, Dict], dashboard_id: str) -> str:
 
 @callback(
     Output({"type": DASHBOARD_METRIC_GRAPH_TYPE, "index": ALL}, "figure"),
+    Output({"type": DASHBOARD_METRIC_AS_OF_TYPE, "index": ALL}, "children"),
     Output(DASHBOARD_SPINNER, "value"),
     Input(DASHBOARD_REFRESH_BUTTON, "n_clicks"),
+    Input(DASHBOARD_REVALIDATE_INTERVAL, "n_intervals"),
     State(DASHBOARD_ID, "children"),
     prevent_initial_call=True,
     running=[
@@ -515,37 +554,83 @@ def manage_layout_change(layouts: Dict[str, Dict], dashboard_id: str) -> str:
     background=True,
 )
 @restricted
-def refresh_dashboards(set_progress, refresh_button_click: int, dashboard_id: str):
-    if dashboard_id is None or refresh_button_click is None:
-        return no_update, 0
+def refresh_dashboards(
+    set_progress,
+    refresh_button_click: int,
+    revalidate_intervals: int,
+    dashboard_id: str,
+):
+    if dashboard_id is None or (
+        refresh_button_click is None and revalidate_intervals is None
+    ):
+        return no_update, no_update, 0
 
-    storage = DEPS.Dependencies.get().storage
+    # The stale charts are refreshed in the background, while the explicit refresh runs every query again
+    return handle_dashboard_refresh(
+        set_progress, dashboard_id, ctx.triggered_id == DASHBOARD_REFRESH_BUTTON
+    )
 
-    dashboard = storage.get_dashboard(dashboard_id)
-    figures = []
-    total = len(dashboard.dashboard_metrics)
-    for index, dm in enumerate(dashboard.dashboard_metrics):
-        if dm.saved_metric is not None:
-            metric = dm.saved_metric.metric
-            project = dm.saved_metric.project
-            if metric is None or project is None:
-                continue
-            simple_chart = CHRT.get_simple_chart(metric)
-            fig = PLT.plot_chart(simple_chart, metric)
-            sm = WM.SavedMetric(
-                metric=metric,
-                name=dm.saved_metric.name,
-                chart=simple_chart,
-                project=project,
-                image_base64=dm.saved_metric.small_base64,
-                small_base64=dm.saved_metric.small_base64,
-                id=dm.saved_metric.id,
+
+def handle_dashboard_refresh(set_progress, dashboard_id: str, force_refresh: bool):
+    deps = DEPS.Dependencies.get()
+    dashboard = deps.storage.get_dashboard(dashboard_id, with_images=False)
+    refresh_service = DRS.DashboardRefreshService(
+        storage=deps.storage,
+        cache=deps.cache,
+        cache_generation_service=deps.cache_generation_service,
+    )
+    to_refresh = set()
+    revalidating_hash_keys = []
+    for dm in dashboard.dashboard_metrics:
+        saved_metric = dm.saved_metric
+        if saved_metric is None:
+            continue
+        if force_refresh:
+            to_refresh.add(saved_metric.id)
+            continue
+        if (
+            saved_metric.metric is None
+            or saved_metric.project is None
+            or not is_saved_metric_stale(saved_metric)
+        ):
+            continue
+        hash_key = GH.create_metric_hash_key(
+            saved_metric.metric,
+            deps.cache_generation_service.get_namespace(saved_metric.project),
+        )
+        # the other viewers of the dashboard or the explore page may refresh the same result already
+        if GH.start_revalidation(hash_key, deps.cache):
+            to_refresh.add(saved_metric.id)
+            revalidating_hash_keys.append(hash_key)
+    finished = []
+
+    def on_refreshed(saved_metric: WM.SavedMetric):
+        finished.append(saved_metric.id)
+        set_progress(int(len(finished) * 100.0 / len(to_refresh)))
+
+    try:
+        if len(to_refresh) > 0:
+            refresh_service.refresh_dashboards(
+                [dashboard],
+                force=force_refresh,
+                on_refreshed=on_refreshed,
+                saved_metric_filter=lambda sm: sm.id in to_refresh,
             )
-            storage.set_saved_metric(sm.id, sm)
-            dm.set_saved_metric(sm)
-            figures.append(fig)
-        progress = int((index + 1) * 100.0 / total)
-        set_progress(progress)
-
-    storage.set_dashboard(dashboard_id, dashboard)
-    return figures, 0
+    finally:
+        deps.cache.clear_many(
+            [hash_key + GH.REVALIDATING_SUFFIX for hash_key in revalidating_hash_keys]
+        )
+
+    figures = []
+    as_of_labels = []
+    for dm in dashboard.dashboard_metrics:
+        saved_metric = dm.saved_metric
+        if saved_metric is None:
+            continue
+        metric = saved_metric.metric
+        if metric is None or saved_metric.project is None:
+            continue
+        figures.append(PLT.plot_chart(saved_metric.chart, metric))
+        as_of_labels.append(create_as_of_label(saved_metric))
+
+    return figures, as_of_labels, 0
@@ -35,7 +35,7 @@ DASHBOARDS_INFO = "dashboard_info"
 def layout(**query_params) -> bc.Component:
     storage = DEPS.Dependencies.get().storage
     d_ids = storage.list_dashboards()
-    dashboards = [storage.get_dashboard(d_id) for d_id in d_ids]
+    dashboards = storage.get_dashboards(d_ids, with_images=False)
 
     return html.Div(
         [
@@ -265,5 +265,5 @@ def confirm_button_clicked(accept_button: int, dashboard_id: str) -> List:
         storage.clear_dashboard(dashboard_id)
 
     d_ids = storage.list_dashboards()
-    dashboards = [storage.get_dashboard(d_id) for d_id in d_ids]
+    dashboards = storage.get_dashboards(d_ids, with_images=False)
     return list_dashboards(dashboards)
@@ -50,6 +50,7 @@ METRIC_SAVE_DIALOG_CLOSE_BUTTON = "metric_save_dialog_close_button"
 METRIC_SAVE_DIALOG_REPLACE_BUTTON = "metric_save_dialog_replace_button"
 METRIC_SAVE_DIALOG_INFO = "metric_save_dialog_info"
 METRIC_SAVE_DIALOG_SPINNER = "metric_save_dialog_spinner"
+METRIC_THUMBNAIL_RENDER = "metric_thumbnail_render"
 EXPLORE_PAGE = "explore_page"
 
 ALL_INPUT_COMPS = {
@@ -197,6 +198,8 @@ def create_saved_metric_dialog(saved_metric: Optional[WM.SavedMetric]) -> dbc.Mo
                     ),
                 ]
             ),
+            # the id of the saved metric whose thumbnail is rendered by the render workers
+            dcc.Store(id=METRIC_THUMBNAIL_RENDER),
         ],
         id=METRIC_SAVE_DIALOG,
         is_open=False,
@@ -501,6 +504,7 @@ def create_callbacks():
         METRIC_SAVE_DIALOG: Output(METRIC_SAVE_DIALOG, "is_open"),
         METRIC_NAME_INPUT: Output(METRIC_NAME_INPUT, "value"),
         METRIC_SAVE_DIALOG_INFO: Output(METRIC_SAVE_DIALOG_INFO, "children"),
+        METRIC_THUMBNAIL_RENDER: Output(METRIC_THUMBNAIL_RENDER, "data"),
     },
     prevent_initial_call=True,
     background=True,
@@ -541,6 +545,7 @@ def handle_save_metric_dialog(
             METRIC_SAVE_DIALOG: True,
             METRIC_NAME_INPUT: original_name,
             METRIC_SAVE_DIALOG_INFO: "",
+            METRIC_THUMBNAIL_RENDER: no_update,
         }
 
     if ctx.triggered_id == METRIC_SAVE_DIALOG_CLOSE_BUTTON:
@@ -548,6 +553,7 @@ def handle_save_metric_dialog(
             METRIC_SAVE_DIALOG: False,
             METRIC_NAME_INPUT: None,
             METRIC_SAVE_DIALOG_INFO: "",
+            METRIC_THUMBNAIL_RENDER: no_update,
         }
 
     if not metric_name:
@@ -555,18 +561,21 @@ def handle_save_metric_dialog(
             METRIC_SAVE_DIALOG: no_update,
             METRIC_NAME_INPUT: no_update,
             METRIC_SAVE_DIALOG_INFO: "Please name your metric.",
+            METRIC_THUMBNAIL_RENDER: no_update,
         }
     if len(metric_name) < 4:
         return {
             METRIC_SAVE_DIALOG: no_update,
             METRIC_NAME_INPUT: no_update,
             METRIC_SAVE_DIALOG_INFO: "Metric name must be at least 4 characters.",
+            METRIC_THUMBNAIL_RENDER: no_update,
         }
     if len(metric_name) > 30:
         return {
             METRIC_SAVE_DIALOG: no_update,
             METRIC_NAME_INPUT: no_update,
             METRIC_SAVE_DIALOG_INFO: "Metric name must be at most 30 characters.",
+            METRIC_THUMBNAIL_RENDER: no_update,
         }
 
     try:
@@ -587,6 +596,7 @@ def handle_save_metric_dialog(
                     METRIC_SAVE_DIALOG: True,
                     METRIC_NAME_INPUT: no_update,
                     METRIC_SAVE_DIALOG_INFO: "Couldn't save metric. Invalid state.",
+                    METRIC_THUMBNAIL_RENDER: no_update,
                 }
 
             if (
@@ -597,6 +607,7 @@ def handle_save_metric_dialog(
                     METRIC_SAVE_DIALOG: True,
                     METRIC_NAME_INPUT: no_update,
                     METRIC_SAVE_DIALOG_INFO: "Make sure you give a different name to your metric.",
+                    METRIC_THUMBNAIL_RENDER: no_update,
                 }
             metric = sm.metric
         else:
@@ -604,8 +615,11 @@ def handle_save_metric_dialog(
                 METRIC_SAVE_DIALOG: True,
                 METRIC_NAME_INPUT: no_update,
                 METRIC_SAVE_DIALOG_INFO: "Couldn't save metric. Invalid state.",
+                METRIC_THUMBNAIL_RENDER: no_update,
             }
-        hash_key = GH.create_metric_hash_key(metric)
+        hash_key = GH.create_metric_hash_key(
+            metric, deps.cache_generation_service.get_namespace(project)
+        )
         result_df = GH.get_metric_result_df(
             hash_key, metric, mitzu_cache, tracking_service
         )
@@ -614,18 +628,20 @@ def handle_save_metric_dialog(
         if ctx.triggered_id == METRIC_SAVE_DIALOG_SAVE_NEW_BUTTON:
             metric_id = H.create_unique_id()
 
-        GH.store_rendered_saved_metric(
+        thumbnail_metric_id = GH.store_rendered_saved_metric(
             metric_name=metric_name,
             metric=metric,
             simple_chart=simple_chart,
             project=project,
             storage=storage,
+            thumbnail_render_service=deps.thumbnail_render_service,
             metric_id=metric_id,
         )
         return {
             METRIC_SAVE_DIALOG: False,
             METRIC_NAME_INPUT: no_update,
             METRIC_SAVE_DIALOG_INFO: "",
+            METRIC_THUMBNAIL_RENDER: thumbnail_metric_id or no_update,
         }
     except Exception:
         traceback.print_exc()
@@ -633,4 +649,28 @@ def handle_save_metric_dialog(
             METRIC_SAVE_DIALOG: True,
             METRIC_NAME_INPUT: no_update,
             METRIC_SAVE_DIALOG_INFO: "Couldn't save metric. Something went wrong.",
+            METRIC_THUMBNAIL_RENDER: no_update,
         }
+
+
+@callback(
+    Output(METRIC_THUMBNAIL_RENDER, "clear_data"),
+    Input(METRIC_THUMBNAIL_RENDER, "data"),
+    prevent_initial_call=True,
+)
+@restricted
+def handle_thumbnail_render(saved_metric_id: Optional[str]) -> Any:
+    """
+    The background callbacks are executed by short lived job processes,
+    the thumbnails are submitted to the render workers of the web server process instead
+    """
+    if saved_metric_id is None:
+        return no_update
+    try:
+        deps = DEPS.Dependencies.get()
+        GH.render_saved_metric_thumbnail(
+            saved_metric_id, deps.storage, deps.thumbnail_render_service
+        )
+    except Exception:
+        traceback.print_exc()
+    return True
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
 import traceback
-from typing import Any, Dict, Optional
+from dataclasses import dataclass
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
 import dash.development.base_component as bc
 import dash_bootstrap_components as dbc
 import mitzu.model as M
 import mitzu.webapp.pages.explore.toolbar_handler as TH
+import mitzu.webapp.pages.explore.table_handler as TAB
 import mitzu.webapp.pages.explore.explore_page as EXP
 import mitzu.webapp.configs as configs
 import mitzu.webapp.dependencies as DEPS
 import mitzu.webapp.storage as S
 import mitzu.webapp.cache as C
+import mitzu.webapp.caching_dataset_adapter as CDA
 import mitzu.visualization.common as CO
 import mitzu.webapp.pages.paths as P
 import mitzu.webapp.model as WM
@@ -19,7 +23,7 @@ from mitzu.webapp.helper import MITZU_LOCATION
 import mitzu.webapp.onboarding_flow as OF
 
 import pandas as pd
-from dash import Input, Output, State, ctx, dcc, html, callback, no_update, dash_table
+from dash import Input, Output, State, ctx, dcc, html, callback, no_update
 from mitzu.webapp.helper import get_final_all_inputs
 from mitzu.webapp.auth.decorator import restricted
 import mitzu.visualization.plot as PLT
@@ -29,10 +33,10 @@ import hashlib
 from urllib.parse import urlparse
 from datetime import datetime
 import mitzu.webapp.service.tracking_service as TS
+import mitzu.webapp.service.thumbnail_render_service as TRS
 
 GRAPH = "graph"
 MESSAGE = "lead fw-normal text-center h-100 w-100"
-TABLE = "explore_results_table"
 SQL_AREA = "sql_area"
 
 
@@ -51,17 +55,39 @@ GRAPH_CONTAINER = (
     "graph_container d-flex justify-content-stretch align-items-center pt-3"
 )
 GRAPH_REFRESHER_INTERVAL = "graph_refresher_interval"
+GRAPH_REVALIDATE = "graph_revalidate"
+GRAPH_REVALIDATED = "graph_revalidated"
+GRAPH_AS_OF = "graph_as_of"
+
+AS_OF_SUFFIX = ".as_of"
+REVALIDATING_SUFFIX = C.REVALIDATING_SUFFIX
+# A failed background refresh can be retried after this many seconds
+REVALIDATION_TIMEOUT = 300
+
+
+@dataclass(frozen=True)
+class MetricResult:
+    df: pd.DataFrame
+    as_of: datetime
+    from_cache: bool
+    is_stale: bool
 
 
 def create_graph_container() -> bc.Component:
     return html.Div(
-        id=GRAPH_CONTAINER,
-        children=[],
-        className=GRAPH_CONTAINER,
+        [
+            html.Div(
+                id=GRAPH_CONTAINER,
+                children=[],
+                className=GRAPH_CONTAINER,
+            ),
+            dcc.Store(id=GRAPH_REVALIDATE),
+            dcc.Store(id=GRAPH_REVALIDATED),
+        ]
     )
 
 
-def create_metric_hash_key(metric: M.Metric) -> str:
+def create_metric_hash_key(metric: M.Metric, namespace: Optional[str] = None) -> str:
     metric_dict = SE.to_dict(metric)
 
     #  We need to remove these keys from the metric dict as changes in these shouldn't trigger reexecution
@@ -73,28 +99,103 @@ def create_metric_hash_key(metric: M.Metric) -> str:
     # The project_id is not part of the query param, but the path.
     # However we need to use the ID as well for caching, some project may contain the same events.
     metric_dict["prj"] = metric.get_project().get_id()
+    # Contains the cache generations of the project and the connection
+    metric_dict["ns"] = namespace
 
     return hashlib.md5(json.dumps(metric_dict).encode("ascii")).hexdigest()
 
 
-def get_metric_result_df(
+def put_metric_result(
+    hash_key: str, result_df: pd.DataFrame, mitzu_cache: C.MitzuCache
+):
+    """Stores the result, it is served as stale for CACHE_STALE_EXPIRATION seconds after it expires"""
+    mitzu_cache.put_many(
+        {hash_key: result_df, hash_key + AS_OF_SUFFIX: datetime.now().timestamp()},
+        expire=configs.CACHE_EXPIRATION + configs.CACHE_STALE_EXPIRATION,
+    )
+
+
+def get_metric_result(
     hash_key: str,
     metric: M.Metric,
     mitzu_cache: C.MitzuCache,
     tracking_service: TS.TrackingService,
-) -> pd.DataFrame:
+) -> MetricResult:
     start_time = datetime.now().timestamp()
-    result_df = mitzu_cache.get(hash_key)
-    from_cache = True
-    if result_df is None:
-        from_cache = False
+    as_of_key = hash_key + AS_OF_SUFFIX
+    cached = mitzu_cache.get_many([hash_key, as_of_key])
+    if hash_key in cached and as_of_key in cached:
+        as_of = cached[as_of_key]
+        res = MetricResult(
+            df=cached[hash_key],
+            as_of=datetime.fromtimestamp(as_of),
+            from_cache=True,
+            is_stale=as_of + configs.CACHE_EXPIRATION < start_time,
+        )
+    else:
         result_df = metric.get_df()
-        mitzu_cache.put(hash_key, result_df, expire=configs.CACHE_EXPIRATION)
+        put_metric_result(hash_key, result_df, mitzu_cache)
+        res = MetricResult(
+            df=result_df, as_of=datetime.now(), from_cache=False, is_stale=False
+        )
+
     duration = datetime.now().timestamp() - start_time
     tracking_service.track_explore_finished(
-        metric, duration_seconds=duration, from_cache=from_cache
+        metric, duration_seconds=duration, from_cache=res.from_cache
     )
-    return result_df
+    return res
+
+
+def get_metric_result_df(
+    hash_key: str,
+    metric: M.Metric,
+    mitzu_cache: C.MitzuCache,
+    tracking_service: TS.TrackingService,
+) -> pd.DataFrame:
+    return get_metric_result(hash_key, metric, mitzu_cache, tracking_service).df
+
+
+def start_revalidation(hash_key: str, mitzu_cache: C.MitzuCache) -> bool:
+    """Returns True if no other refresh is running for the result"""
+    return mitzu_cache.add(
+        hash_key + REVALIDATING_SUFFIX, True, expire=REVALIDATION_TIMEOUT
+    )
+
+
+def handle_revalidation(revalidate: Optional[Dict[str, Any]]) -> Any:
+    """Refreshes the stale result of the metric, the cache key is computed again from the metric,
+    the client can't overwrite other cache entries"""
+    if not revalidate:
+        return no_update
+
+    deps = DEPS.Dependencies.get()
+    try:
+        project = deps.storage.get_project(revalidate["project_id"])
+        metric = SE.from_compressed_string(revalidate["metric"], project)
+        hash_key = create_metric_hash_key(
+            metric, deps.cache_generation_service.get_namespace(project)
+        )
+    except Exception:
+        traceback.print_exc()
+        return no_update
+
+    try:
+        CDA.clear_cached_metric(metric)
+        put_metric_result(hash_key, metric.get_df(), deps.cache)
+    except Exception:
+        traceback.print_exc()
+        return no_update
+    finally:
+        deps.cache.clear(hash_key + REVALIDATING_SUFFIX)
+
+    return {"hash_key": hash_key, "at": datetime.now().timestamp()}
+
+
+def create_as_of_label(result: MetricResult) -> bc.Component:
+    label = f"As of {result.as_of:%Y-%m-%d %H:%M}"
+    if result.is_stale:
+        label += ", refreshing..."
+    return html.Small(label, id=GRAPH_AS_OF, className="text-muted d-block text-end")
 
 
 def create_graph(
@@ -120,43 +221,6 @@ def create_graph(
     )
 
 
-def create_table(
-    metric: Optional[M.Metric],
-    hash_key: str,
-    mitzu_cache: C.MitzuCache,
-    tracking_service: TS.TrackingService,
-) -> Optional[dbc.Table]:
-    if metric is None:
-        return None
-
-    result_df = get_metric_result_df(hash_key, metric, mitzu_cache, tracking_service)
-    result_df = result_df.sort_values(by=[result_df.columns[0], result_df.columns[1]])
-    result_df.columns = [col[1:].replace("_", " ").title() for col in result_df.columns]
-    table = dash_table.DataTable(
-        id=TABLE,
-        columns=[
-            {"name": i, "id": i, "deletable": False, "selectable": False}
-            for i in result_df.columns
-        ],
-        data=result_df.to_dict("records"),
-        editable=False,
-        sort_action="native",
-        sort_mode="single",
-        filter_action="native",
-        export_columns="all",
-        export_headers="names",
-        export_format="csv",
-        page_size=20,
-        style_cell={"padding": "10px", "fontFamily": "var(--mdb-font-sans-serif)"},
-        style_header={
-            "backgroundColor": "var(--mdb-gray-100)",
-            "fontWeight": "bold",
-        },
-    )
-
-    return table
-
-
 def create_sql_area(metric: Optional[M.Metric]) -> dbc.Table:
     if metric is not None:
         return dcc.Markdown(
@@ -173,29 +237,57 @@ def store_rendered_saved_metric(
     simple_chart: CO.SimpleChart,
     project: M.Project,
     storage: S.MitzuStorage,
+    thumbnail_render_service: TRS.ThumbnailRenderService,
     metric_id: Optional[str] = None,
-):
-    fig = PLT.plot_chart(simple_chart, metric)
-    small_image_b64 = PLT.figure_to_base64_image(
-        fig, 0.5, kaleid_configs=configs.get_kaleido_configs()
-    )
+) -> Optional[str]:
+    """
+    Stores the saved metric right away. Returns the id of the saved metric if its thumbnail
+    needs the render workers, see render_saved_metric_thumbnail.
+    """
+    image = thumbnail_render_service.render_inline(simple_chart, metric)
     saved_metric = WM.SavedMetric(
         metric=metric,
         chart=simple_chart,
         project=project,
-        image_base64=small_image_b64,
-        small_base64=small_image_b64,
+        image_base64=image or PLT.EMPTY_IMAGE_BASE64,
+        small_base64=image or PLT.EMPTY_IMAGE_BASE64,
         name=metric_name,
         id=metric_id,
     )
 
     storage.set_saved_metric(metric_id=saved_metric.id, saved_metric=saved_metric)
+    return saved_metric.id if image is None else None
+
+
+def render_saved_metric_thumbnail(
+    saved_metric_id: str,
+    storage: S.MitzuStorage,
+    thumbnail_render_service: TRS.ThumbnailRenderService,
+) -> Optional[Future]:
+    """
+    Submits the thumbnail of the stored saved metric to the render workers, it is stored when it is rendered.
+    Must be called by a long lived process (web server, prewarm worker) owning the render workers.
+    """
+    saved_metric = storage.get_saved_metric(saved_metric_id)
+    if saved_metric.metric is None:
+        return None
+    return thumbnail_render_service.render_saved_metric(
+        saved_metric.id, saved_metric.chart, saved_metric.metric
+    )
 
 
 def create_callbacks():
+    TAB.create_callbacks()
+
     @callback(
-        output=Output(GRAPH_CONTAINER, "children"),
-        inputs=EXP.ALL_INPUT_COMPS,
+        output=[
+            Output(GRAPH_CONTAINER, "children"),
+            Output(GRAPH_REVALIDATE, "data"),
+        ],
+        inputs={
+            **EXP.ALL_INPUT_COMPS,
+            "revalidated": Input(GRAPH_REVALIDATED, "data"),
+        },
         state=dict(
             graph_content_type=State(TH.GRAPH_CONTENT_TYPE, "value"),
             href=State(MITZU_LOCATION, "href"),
@@ -221,11 +313,12 @@ def create_callbacks():
     @restricted
     def handle_changes_for_graph(
         all_inputs: Dict[str, Any],
+        revalidated: Optional[Dict[str, Any]],
         graph_content_type: str,
         href: str,
         metric_name: Optional[str],
         metric_id: str,
-    ) -> bc.Component:
+    ) -> Tuple[bc.Component, Any]:
         try:
             parse_result = urlparse(href)
             project_id = P.get_path_value(
@@ -239,75 +332,108 @@ def create_callbacks():
 
             project = storage.get_project(project_id)
             if project is None:
-                return no_update
+                return no_update, no_update
             all_inputs = get_final_all_inputs(all_inputs, ctx.inputs_list)
             all_inputs[EXP.METRIC_ID_VALUE] = metric_id
             all_inputs[EXP.METRIC_NAME_INPUT] = metric_name
             all_inputs[EXP.MITZU_LOCATION] = parse_result.query
             dp = project._discovered_project.get_value()
             if dp is None:
-                return html.Div(
-                    [
-                        "Your project haven't been discovered yet. ",
-                        html.Br(),
-                        dcc.Link(
-                            f"Discover {project.project_name}",
-                            href=P.create_path(
-                                P.EVENTS_AND_PROPERTIES_PROJECT_PATH,
-                                project_id=project.id,
+                return (
+                    html.Div(
+                        [
+                            "Your project haven't been discovered yet. ",
+                            html.Br(),
+                            dcc.Link(
+                                f"Discover {project.project_name}",
+                                href=P.create_path(
+                                    P.EVENTS_AND_PROPERTIES_PROJECT_PATH,
+                                    project_id=project.id,
+                                ),
                             ),
-                        ),
-                    ],
-                    id=GRAPH,
-                    className=MESSAGE,
+                        ],
+                        id=GRAPH,
+                        className=MESSAGE,
+                    ),
+                    no_update,
                 )
 
             metric, _, _ = EXP.create_metric_from_all_inputs(all_inputs, dp)
 
             if metric is None:
-                return html.Div("Select an event", id=GRAPH, className=MESSAGE)
+                return (
+                    html.Div("Select an event", id=GRAPH, className=MESSAGE),
+                    no_update,
+                )
 
             simple_chart: CO.SimpleChart
 
-            hash_key = create_metric_hash_key(metric)
+            hash_key = create_metric_hash_key(
+                metric, deps.cache_generation_service.get_namespace(project)
+            )
             if ctx.triggered_id in (TH.GRAPH_REFRESH_BUTTON, TH.GRAPH_RUN_QUERY_BUTTON):
                 mitzu_cache.clear(hash_key)
+                CDA.clear_cached_metric(metric)
 
             if (
                 not project.webapp_settings.auto_refresh_enabled
                 and ctx.triggered_id != TH.GRAPH_RUN_QUERY_BUTTON
                 and mitzu_cache.get(hash_key) is None
             ):
-                return html.Div(
-                    "Click run to execute the query", id=GRAPH, className=MESSAGE
+                return (
+                    html.Div(
+                        "Click run to execute the query", id=GRAPH, className=MESSAGE
+                    ),
+                    no_update,
                 )
 
-            if graph_content_type == TH.CHART_VAL:
-                result_df = get_metric_result_df(
+            revalidate = no_update
+            if graph_content_type == TH.SQL_VAL:
+                res = create_sql_area(metric)
+            else:
+                result = get_metric_result(
                     hash_key, metric, mitzu_cache, tracking_service
                 )
-                simple_chart = CHRT.get_simple_chart(metric, result_df)
-
-            if graph_content_type == TH.CHART_VAL:
-                res = create_graph(metric, simple_chart)  # noqa
-            if graph_content_type == TH.TABLE_VAL:
-                res = create_table(metric, hash_key, mitzu_cache, tracking_service)
-            elif graph_content_type == TH.SQL_VAL:
-                res = create_sql_area(metric)
+                if graph_content_type == TH.CHART_VAL:
+                    simple_chart = CHRT.get_simple_chart(metric, result.df)
+                    res = create_graph(metric, simple_chart)
+                else:
+                    res = TAB.create_table(metric, result.df, hash_key)
+                if result.from_cache:
+                    res = html.Div([res, create_as_of_label(result)], className="w-100")
+                if result.is_stale and start_revalidation(hash_key, mitzu_cache):
+                    revalidate = {
+                        "project_id": project.id,
+                        "metric": SE.to_compressed_string(metric),
+                    }
 
             onboarding_service.mark_state_complete(
                 OF.ConfigureMitzuOnboardingFlow.flow_id(),
                 OF.EXPLORE_DATA,
             )
 
-            return res
+            return res, revalidate
         except Exception as exc:
             traceback.print_exc()
-            return html.Div(
-                [
-                    html.B("Something has gone wrong. Details:"),
-                    html.Pre(children=str(exc)),
-                ],
-                id=GRAPH,
-                className="text-danger small",
+            return (
+                html.Div(
+                    [
+                        html.B("Something has gone wrong. Details:"),
+                        html.Pre(children=str(exc)),
+                    ],
+                    id=GRAPH,
+                    className="text-danger small",
+                ),
+                no_update,
             )
+
+    @callback(
+        output=Output(GRAPH_REVALIDATED, "data"),
+        inputs=Input(GRAPH_REVALIDATE, "data"),
+        background=True,
+        prevent_initial_call=True,
+    )
+    @restricted
+    def revalidate_metric_result(revalidate: Optional[Dict[str, Any]]):
+        """Refreshes the stale result in the background, the graph is rendered again when it lands"""
+        return handle_revalidation(revalidate)
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import dash.development.base_component as bc
+import flask
+import pandas as pd
+from dash import Input, Output, State, callback, dash_table, dcc, html, no_update
+
+import mitzu.model as M
+import mitzu.webapp.configs as configs
+import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.pages.paths as P
+from mitzu.webapp.auth.decorator import restricted
+
+TABLE = "explore_results_table"
+TABLE_HASH_KEY = "explore_results_table_hash_key"
+TABLE_CSV_LINK = "explore_results_table_csv_link"
+PAGE_SIZE = 20
+# rows written to the csv response at once
+CSV_CHUNK_SIZE = 10000
+TABLE_KEY_SEPARATOR = "-"
+
+FILTER_OPERATORS = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "],
+]
+
+
+def get_column_name(column: str) -> str:
+    return column[1:].replace("_", " ").title()
+
+
+def prepare_result_df(result_df: pd.DataFrame) -> pd.DataFrame:
+    """The metric result in the order and with the column names of the table"""
+    result_df = result_df.sort_values(by=[result_df.columns[0], result_df.columns[1]])
+    return result_df.rename(
+        columns={col: get_column_name(col) for col in result_df.columns}
+    )
+
+
+def split_filter_part(filter_part: str) -> Tuple[Optional[str], Optional[str], Any]:
+    """Parses one condition of the filter query of the DataTable, e.g. {Group} contains abc"""
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator not in filter_part:
+                continue
+            name_part, value_part = filter_part.split(operator, 1)
+            name_start = name_part.find("{") + 1
+            name_end = name_part.rfind("}")
+            name = name_part[name_start:name_end]
+            value_part = value_part.strip()
+            if (
+                value_part
+                and value_part[0] == value_part[-1]
+                and value_part[0] in "'\"`"
+            ):
+                value: Any = re.sub(
+                    f"\\\\{value_part[0]}", value_part[0], value_part[1:-1]
+                )
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+            # word operators need spaces after them in the filter query, but we don't want these later
+            return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def filter_df(pdf: pd.DataFrame, filter_query: Optional[str]) -> pd.DataFrame:
+    if not filter_query:
+        return pdf
+    for filter_part in filter_query.split(" && "):
+        name, operator, value = split_filter_part(filter_part)
+        if name not in pdf.columns:
+            continue
+        column = pdf[name]
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            if pd.api.types.is_datetime64_any_dtype(column):
+                value = pd.to_datetime(str(value), errors="coerce")
+            elif not (
+                pd.api.types.is_numeric_dtype(column) and isinstance(value, float)
+            ):
+                column = column.astype(str)
+                value = str(value)
+            pdf = pdf.loc[getattr(column, operator)(value)]
+        elif operator == "contains":
+            pdf = pdf.loc[column.astype(str).str.contains(str(value), regex=False)]
+        elif operator == "datestartswith":
+            pdf = pdf.loc[column.astype(str).str.startswith(str(value))]
+    return pdf
+
+
+def sort_df(pdf: pd.DataFrame, sort_by: Optional[List[Dict[str, str]]]) -> pd.DataFrame:
+    sort_by = [col for col in sort_by or [] if col["column_id"] in pdf.columns]
+    if len(sort_by) == 0:
+        return pdf
+    return pdf.sort_values(
+        [col["column_id"] for col in sort_by],
+        ascending=[col["direction"] == "asc" for col in sort_by],
+        kind="stable",
+    )
+
+
+def get_page(
+    result_df: pd.DataFrame,
+    page_current: int,
+    page_size: int,
+    sort_by: Optional[List[Dict[str, str]]] = None,
+    filter_query: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Returns the records of the page and the number of pages after filtering"""
+    pdf = sort_df(filter_df(prepare_result_df(result_df), filter_query), sort_by)
+    page_count = max((pdf.shape[0] + page_size - 1) // page_size, 1)
+    start = page_current * page_size
+    end = start + page_size
+    return pdf.iloc[start:end].to_dict("records"), page_count
+
+
+def _sign_hash_key(hash_key: str) -> str:
+    return hmac.new(
+        configs.AUTH_JWT_SECRET.encode(), hash_key.encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def create_table_key(hash_key: str) -> str:
+    """The key of the table is the hash key of the metric result signed by the server"""
+    return f"{hash_key}{TABLE_KEY_SEPARATOR}{_sign_hash_key(hash_key)}"
+
+
+def get_result_hash_key(table_key: Optional[str]) -> Optional[str]:
+    """
+    Returns the hash key of the metric result if the table key was created by the server,
+    so the tables and the csv exports can't read other entries of the cache.
+    """
+    if not table_key or TABLE_KEY_SEPARATOR not in table_key:
+        return None
+    hash_key, signature = table_key.rsplit(TABLE_KEY_SEPARATOR, 1)
+    if not hmac.compare_digest(signature, _sign_hash_key(hash_key)):
+        return None
+    return hash_key
+
+
+def get_cached_result_df(table_key: Optional[str]) -> Optional[pd.DataFrame]:
+    hash_key = get_result_hash_key(table_key)
+    if hash_key is None:
+        return None
+    result_df = DEPS.Dependencies.get().cache.get(hash_key)
+    if not isinstance(result_df, pd.DataFrame):
+        # the result expired from the cache
+        return None
+    return result_df
+
+
+def create_table(
+    metric: Optional[M.Metric], result_df: pd.DataFrame, hash_key: str
+) -> Optional[bc.Component]:
+    """Only the first page is sent with the table, the rest is paged, sorted and filtered on the server"""
+    if metric is None:
+        return None
+
+    data, page_count = get_page(result_df, 0, PAGE_SIZE)
+    table_key = create_table_key(hash_key)
+    table = dash_table.DataTable(
+        id=TABLE,
+        columns=[
+            {"name": name, "id": name, "deletable": False, "selectable": False}
+            for name in map(get_column_name, result_df.columns)
+        ],
+        data=data,
+        editable=False,
+        page_action="custom",
+        page_current=0,
+        page_size=PAGE_SIZE,
+        page_count=page_count,
+        sort_action="custom",
+        sort_mode="single",
+        sort_by=[],
+        filter_action="custom",
+        filter_query="",
+        style_cell={"padding": "10px", "fontFamily": "var(--mdb-font-sans-serif)"},
+        style_header={
+            "backgroundColor": "var(--mdb-gray-100)",
+            "fontWeight": "bold",
+        },
+    )
+    csv_link = html.A(
+        [html.I(className="bi bi-download me-1"), "Export CSV"],
+        id=TABLE_CSV_LINK,
+        href=P.create_path(P.METRIC_RESULT_CSV_PATH, hash_key=table_key),
+        download="metric_result.csv",
+        className="small d-block text-end mb-2",
+    )
+    return html.Div(
+        [csv_link, table, dcc.Store(id=TABLE_HASH_KEY, data=table_key)],
+        className="w-100",
+    )
+
+
+def iterate_csv_chunks(
+    result_df: pd.DataFrame, chunk_size: int = CSV_CHUNK_SIZE
+) -> Iterator[str]:
+    pdf = prepare_result_df(result_df)
+    for start in range(0, max(pdf.shape[0], 1), chunk_size):
+        end = start + chunk_size
+        yield pdf.iloc[start:end].to_csv(index=False, header=start == 0)
+
+
+def create_csv_response(table_key: str) -> flask.Response:
+    """Streams the cached metric result, the browser doesn't need the whole result to export it"""
+    result_df = get_cached_result_df(table_key)
+    if result_df is None:
+        return flask.Response(status=404)
+
+    response = flask.Response(iterate_csv_chunks(result_df), mimetype="text/csv")
+    response.headers["Content-Disposition"] = "attachment; filename=metric_result.csv"
+    return response
+
+
+def handle_table_page_change(
+    page_current: Optional[int],
+    page_size: Optional[int],
+    sort_by: Optional[List[Dict[str, str]]],
+    filter_query: Optional[str],
+    table_key: Optional[str],
+) -> Tuple[Any, Any]:
+    result_df = get_cached_result_df(table_key)
+    if result_df is None:
+        return no_update, no_update
+    return get_page(
+        result_df,
+        page_current or 0,
+        page_size or PAGE_SIZE,
+        sort_by,
+        filter_query,
+    )
+
+
+def create_callbacks():
+    @callback(
+        output=[Output(TABLE, "data"), Output(TABLE, "page_count")],
+        inputs=[
+            Input(TABLE, "page_current"),
+            Input(TABLE, "page_size"),
+            Input(TABLE, "sort_by"),
+            Input(TABLE, "filter_query"),
+        ],
+        state=[State(TABLE_HASH_KEY, "data")],
+        prevent_initial_call=True,
+    )
+    @restricted
+    def table_page_changed(
+        page_current: Optional[int],
+        page_size: Optional[int],
+        sort_by: Optional[List[Dict[str, str]]],
+        filter_query: Optional[str],
+        table_key: Optional[str],
+    ) -> Tuple[Any, Any]:
+        return handle_table_page_change(
+            page_current, page_size, sort_by, filter_query, table_key
+        )
@@ -235,6 +235,7 @@ def save_button_clicked(
         )
         depenednecies = DEPS.Dependencies.get()
         depenednecies.storage.set_connection(connection.id, connection)
+        depenednecies.schema_catalog_service.invalidate(connection.id)
         depenednecies.tracking_service.track_connection_saved(connection)
 
         if ctx.triggered_id == CONNECTION_SAVE_BUTTON:
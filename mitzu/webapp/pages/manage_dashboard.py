@@ -20,7 +20,7 @@ def no_connection_layout():
 def layout(dashboard_id: Optional[str] = None, **query_params) -> bc.Component:
     depenednecies = DEPS.Dependencies.get()
     if dashboard_id is not None:
-        dashboard = depenednecies.storage.get_dashboard(dashboard_id)
+        dashboard = depenednecies.storage.get_dashboard(dashboard_id, with_images=False)
     else:
         dashboard = WM.Dashboard("New dashboard")
         depenednecies.storage.set_dashboard(dashboard.id, dashboard)
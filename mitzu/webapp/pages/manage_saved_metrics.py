@@ -170,7 +170,7 @@ def create_saved_metric_card(
 
 def list_saved_metrics(storage: S.MitzuStorage) -> List[bc.Component]:
     saved_metric_ids = storage.list_saved_metrics()
-    saved_metrics = [storage.get_saved_metric(s_id) for s_id in saved_metric_ids]
+    saved_metrics = storage.get_saved_metrics(saved_metric_ids, with_images=False)
     saved_metrics.sort(key=lambda m: -datetime.datetime.timestamp(m.created_at))
     if len(saved_metrics) == 0:
         return dbc.Col(
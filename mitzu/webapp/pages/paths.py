@@ -2,6 +2,8 @@ PROJECT_ID_PATH_PART = "project_id"
 CONNECTION_ID_PATH_PART = "connection_id"
 USER_PATH_PART = "user_id"
 DASHBOARD_ID = "dashboard_id"
+IMAGE_ID_PATH_PART = "image_id"
+HASH_KEY_PATH_PART = "hash_key"
 
 EVENTS_AND_PROPERTIES_PATH = "/events"
 EVENTS_AND_PROPERTIES_PROJECT_PATH = f"/events/<{PROJECT_ID_PATH_PART}>"
@@ -28,6 +30,8 @@ DASHBOARDS_VIEW_PATH = f"/dashboards/<{DASHBOARD_ID}>/view"
 HOME_PATH = "/"
 
 SAVED_METRICS = "/saved_metrics"
+SAVED_METRIC_IMAGES_PATH = f"/saved_metric_images/<{IMAGE_ID_PATH_PART}>"
+METRIC_RESULT_CSV_PATH = f"/metric_results/<{HASH_KEY_PATH_PART}>.csv"
 
 SIGN_OUT_URL = "/auth/logout"
 UNAUTHORIZED_URL = "/auth/unauthorized"
@@ -432,9 +432,57 @@ def get_checkbox_value_from_row(tr: html.Tr) -> bool:
     )
 
 
+def _list_table_columns(
+    set_progress,
+    connection: M.Connection,
+    full_table_names: List[str],
+    errors: Optional[Dict[str, Exception]] = None,
+) -> Dict[str, List[M.Field]]:
+    """Returns the columns of the given schema.table names keyed by the full table name.
+    Tables of the same schema are fetched with a single call to the schema catalog.
+    Tables that couldn't be reflected are left out of the result, the errors are collected by full table name.
+    """
+    schema_catalog_service = DEPS.Dependencies.get().schema_catalog_service
+    tables_by_schema: Dict[str, List[str]] = {}
+    for full_table_name in full_table_names:
+        table_parts = full_table_name.split(".")
+        tables_by_schema.setdefault(table_parts[0], []).append(table_parts[-1])
+
+    res: Dict[str, List[M.Field]] = {}
+    for schema, table_names in tables_by_schema.items():
+        set_progress(f"Loading table columns {len(res)*100/len(full_table_names):.0f}%")
+        try:
+            columns = schema_catalog_service.list_table_columns(
+                connection, schema, table_names
+            )
+        except Exception as exc:
+            traceback.print_exc()
+            if errors is not None:
+                for table_name in table_names:
+                    errors[f"{schema}.{table_name}"] = exc
+            continue
+        for table_name, fields in columns.items():
+            res[f"{schema}.{table_name}"] = fields
+    return res
+
+
+def _get_table_fields(
+    all_table_columns: Dict[str, List[M.Field]],
+    errors: Dict[str, Exception],
+    full_table_name: str,
+) -> List[M.Field]:
+    if full_table_name not in all_table_columns:
+        error = errors.get(full_table_name)
+        raise ValueError(
+            f"Couldn't list the columns of {full_table_name}"
+            + (f": {error}" if error is not None else "")
+        ) from error
+    return all_table_columns[full_table_name]
+
+
 def _get_unioned_table_fields(
     set_progress,
-    adapter,
+    connection: M.Connection,
     all_selected_tables_count: int,
     tbl_body_children: List[bc.Component],
 ) -> Tuple[Dict[str, int], List[Set]]:
@@ -443,40 +491,40 @@ def _get_unioned_table_fields(
     Also it returns the values that were already chosen based on the table cells (user_id, event_time, etc.).
     However it cross checks them with the state of the fields from the DWH.
     """
-    count = 0
     unioned_table_fields: Dict[
         str, int
     ] = {}  # for counting occurances of field in all tables
     collected_prop_values: List[Set[str]] = [set(), set(), set(), set(), set()]
-    for tr in tbl_body_children:
-        check_box = get_checkbox_value_from_row(tr)
-        if check_box:
-            table_name_children = get_value_from_row(tr, 1)
-            fields_from_table = [get_value_from_row(tr, i) for i in range(2, 7)]
-            if type(table_name_children) == str:
-                table_parts = table_name_children.split(".")
-                schema = table_parts[0]
-                table_name = table_parts[-1]
-                fields = adapter.list_all_table_columns(schema, table_name)
-                for field in fields:
-                    for f in field.get_all_subfields():
-                        tbl_field_name = f._get_name()
-                        val = unioned_table_fields.get(tbl_field_name)
-                        unioned_table_fields[tbl_field_name] = (
-                            1 if val is None else val + 1
-                        )
-                        for i, field in enumerate(fields_from_table):
-                            if field:
-                                if i < 5 and tbl_field_name == field:
-                                    collected_prop_values[i].add(tbl_field_name)
-                                elif tbl_field_name in field.split(","):
-                                    # Ignore fields is a list of fields separated by comma
-                                    collected_prop_values[i].add(tbl_field_name)
-
-            count += 1
-            set_progress(
-                f"Loading table columns {count*100/all_selected_tables_count:.0f}%"
-            )
+    selected_rows = [
+        tr
+        for tr in tbl_body_children
+        if get_checkbox_value_from_row(tr) and type(get_value_from_row(tr, 1)) == str
+    ]
+    errors: Dict[str, Exception] = {}
+    all_table_columns = _list_table_columns(
+        set_progress,
+        connection=connection,
+        full_table_names=[get_value_from_row(tr, 1) for tr in selected_rows],
+        errors=errors,
+    )
+    for tr in selected_rows:
+        fields_from_table = [get_value_from_row(tr, i) for i in range(2, 7)]
+        full_table_name = get_value_from_row(tr, 1)
+        fields = _get_table_fields(all_table_columns, errors, full_table_name)
+        for field in fields:
+            for f in field.get_all_subfields():
+                tbl_field_name = f._get_name()
+                val = unioned_table_fields.get(tbl_field_name)
+                unioned_table_fields[tbl_field_name] = 1 if val is None else val + 1
+                for i, prop_value in enumerate(fields_from_table):
+                    if prop_value:
+                        if i < 5 and tbl_field_name == prop_value:
+                            collected_prop_values[i].add(tbl_field_name)
+                        elif tbl_field_name in prop_value.split(","):
+                            # Ignore fields is a list of fields separated by comma
+                            collected_prop_values[i].add(tbl_field_name)
+
+    set_progress(f"Loaded table columns for {all_selected_tables_count} tables")
     return unioned_table_fields, collected_prop_values
 
 
@@ -585,13 +633,10 @@ def manage_choose_schema_dropdown(
         try:
             dependencies = DEPS.Dependencies.get()
             connection = dependencies.storage.get_connection(connection_id)
-            dummy_project = M.Project(
-                connection=connection,
-                event_data_tables=[],
-                project_name="dummy_project",
-            )
-            adapter = dummy_project.get_adapter()
-            schemas = [{"label": s, "value": s} for s in adapter.list_schemas()]
+            schemas = [
+                {"label": s, "value": s}
+                for s in dependencies.schema_catalog_service.list_schemas(connection)
+            ]
             return (schemas, no_update, "Select schema")
         except Exception:
             traceback.print_exc()
@@ -659,16 +704,13 @@ def manage_choose_tables_checklist(
         try:
             dependencies = DEPS.Dependencies.get()
             connection = dependencies.storage.get_connection(connection_id)
-            dummy_project = M.Project(
-                connection=connection,
-                event_data_tables=[],
-                project_name="dummy_project",
-            )
-            adapter = dummy_project.get_adapter()
-
             tables = [
                 {"label": s, "value": s}
-                for s in sorted(adapter.list_tables(schema=schema))
+                for s in sorted(
+                    dependencies.schema_catalog_service.list_tables(
+                        connection, schema=schema
+                    )
+                )
             ]
             return (tables, [], "Choose tables to add")
         except Exception as exc:
@@ -715,18 +757,13 @@ def manage_configure_property_inputs(
         try:
             dependencies = DEPS.Dependencies.get()
             connection = dependencies.storage.get_connection(connection_id)
-            dummy_project = M.Project(
-                connection=connection,
-                event_data_tables=[],
-                project_name="dummy_project",
-            )
             all_selected_count = 0
             for tr in tbl_body_children:
                 if get_checkbox_value_from_row(tr):
                     all_selected_count += 1
             all_table_fields, collected_values_list = _get_unioned_table_fields(
                 set_progress,
-                adapter=dummy_project.get_adapter(),
+                connection=connection,
                 all_selected_tables_count=all_selected_count,
                 tbl_body_children=tbl_body_children,
             )
@@ -769,30 +806,25 @@ def handle_configure_modal_confirm(
 ) -> List[bc.Component]:
     dependencies = DEPS.Dependencies.get()
     connection = dependencies.storage.get_connection(connection_id)
-    dummy_project = M.Project(
+    results_tbl_children = []
+    errors: Dict[str, Exception] = {}
+    all_table_columns = _list_table_columns(
+        set_progress,
         connection=connection,
-        event_data_tables=[],
-        project_name="dummy_project",
+        full_table_names=[
+            get_value_from_row(tr, 1)
+            for tr in tbl_body_children
+            if get_checkbox_value_from_row(tr)
+        ],
+        errors=errors,
     )
-    adapter = dummy_project.get_adapter()
-    results_tbl_children = []
-    count = 0
-    sel_count = 0
-
-    for tr in tbl_body_children:
-        if get_checkbox_value_from_row(tr):
-            sel_count += 1
 
     for tr in tbl_body_children:
         check_box = get_checkbox_value_from_row(tr)
         if check_box:
-            count += 1
-            set_progress(f"Validating {count}/{sel_count} tables")
             full_table_name = get_value_from_row(tr, 1)
             schema, table_name = tuple(full_table_name.split("."))
-            fields = adapter.list_all_table_columns(
-                table_name=table_name, schema=schema
-            )
+            fields = _get_table_fields(all_table_columns, errors, full_table_name)
             field_names: Dict[str, M.Field] = {}
 
             for field in fields:
@@ -837,28 +869,31 @@ def handle_validate_button_clicked(
 ) -> List[bc.Component]:
     dependencies = DEPS.Dependencies.get()
     connection = dependencies.storage.get_connection(connection_id)
-    dummy_project = M.Project(
+    full_table_names = [get_value_from_row(tr, 1) for tr in tbl_body_children]
+    # Validation has to reflect the current state of the DWH
+    for full_table_name in full_table_names:
+        schema, table_name = tuple(full_table_name.split("."))
+        dependencies.schema_catalog_service.invalidate(
+            connection_id, schema=schema, table_names=[table_name]
+        )
+    all_table_columns = _list_table_columns(
+        set_progress,
         connection=connection,
-        event_data_tables=[],
-        project_name="dummy_project",
+        full_table_names=full_table_names,
     )
-    adapter = dummy_project.get_adapter()
-    sel_count = len(tbl_body_children)
-    for i, tr in enumerate(tbl_body_children):
-        set_progress(f"Validating {i+1}/{sel_count} tables")
+    for tr in tbl_body_children:
         tr_children = tr["props"]["children"]
         full_table_name = get_value_from_row(tr, 1)
         user_id_col = get_value_from_row(tr, 2)
         event_time_col = get_value_from_row(tr, 3)
         date_partition_col = get_value_from_row(tr, 4)
         ignore_fields_str = get_value_from_row(tr, 5)
-        schema, table_name = tuple(full_table_name.split("."))
         ignore_fields = (
             ignore_fields_str.split(",") if ignore_fields_str is not None else []
         )
 
         try:
-            fields = adapter.list_all_table_columns(schema, table_name)
+            fields = all_table_columns[full_table_name]
             tr_children[1]["props"]["className"] = H.TBL_CLS
 
             col_names: List[str] = []
@@ -470,6 +470,7 @@ def modal_open_handler(close: int, save: int, new: int, inputs: Dict):
             )
             storage = deps.storage
             storage.set_connection(connection_id=con.id, connection=con)
+            deps.schema_catalog_service.invalidate(con.id)
             deps.tracking_service.track_connection_saved(con)
             data = get_connection_options(storage)
             return (False, con.id, data, "", no_update)
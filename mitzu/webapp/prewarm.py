@@ -0,0 +1,138 @@
+"""
+Pre-computes the metrics of the dashboards, so they open with fresh results.
+
+Usage:
+    python -m mitzu.webapp.prewarm run [--dashboard-id ID ...] [--render-images]
+    python -m mitzu.webapp.prewarm worker [--interval SECONDS] [--render-images]
+    python -m mitzu.webapp.prewarm schedule DASHBOARD_ID "0 6 * * 1-5"
+    python -m mitzu.webapp.prewarm unschedule DASHBOARD_ID
+    python -m mitzu.webapp.prewarm list
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List, Optional
+
+import mitzu.webapp.configs as configs
+import mitzu.webapp.cron as CRON
+import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.model as WM
+import mitzu.webapp.service.dashboard_refresh_service as DRS
+from mitzu.helper import LOGGER
+
+
+def create_refresh_service(deps: DEPS.Dependencies) -> DRS.DashboardRefreshService:
+    return DRS.DashboardRefreshService(
+        storage=deps.storage,
+        cache=deps.cache,
+        cache_generation_service=deps.cache_generation_service,
+        thumbnail_render_service=deps.thumbnail_render_service,
+    )
+
+
+def run(
+    deps: DEPS.Dependencies,
+    dashboard_ids: Optional[List[str]] = None,
+    render_images: bool = False,
+):
+    if not dashboard_ids:
+        dashboard_ids = deps.storage.list_dashboards()
+    dashboards = deps.storage.get_dashboards(dashboard_ids, with_images=False)
+    results = create_refresh_service(deps).refresh_dashboards(
+        dashboards, force=True, render_images=render_images
+    )
+    # the images are stored by the render workers
+    deps.thumbnail_render_service.shutdown(wait=True)
+    LOGGER.info(
+        f"Refreshed {len(results)} saved metrics of {len(dashboards)} dashboards"
+    )
+
+
+def run_worker(deps: DEPS.Dependencies, interval: int, render_images: bool = False):
+    service = create_refresh_service(deps)
+    LOGGER.info(f"Checking the dashboard schedules in every {interval} seconds")
+    while True:
+        started = time.time()
+        try:
+            refreshed = service.refresh_due_dashboards(render_images=render_images)
+            if refreshed:
+                LOGGER.info(f"Refreshed dashboards: {', '.join(refreshed)}")
+        except Exception as exc:
+            LOGGER.error(f"Failed to refresh the scheduled dashboards: {exc}")
+        time.sleep(max(interval - (time.time() - started), 0))
+
+
+def schedule(deps: DEPS.Dependencies, dashboard_id: str, cron: str):
+    CRON.CronExpression.parse(cron)
+    deps.storage.get_dashboard(dashboard_id, with_images=False)
+    existing = deps.storage.get_dashboard_schedule(dashboard_id)
+    deps.storage.set_dashboard_schedule(
+        WM.DashboardSchedule(
+            dashboard_id=dashboard_id,
+            cron=cron,
+            last_run_at=existing.last_run_at if existing is not None else None,
+        )
+    )
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m mitzu.webapp.prewarm",
+        description="Pre-computes the metrics of the dashboards",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Refresh the dashboards once")
+    run_parser.add_argument(
+        "--dashboard-id",
+        action="append",
+        dest="dashboard_ids",
+        help="Dashboard to refresh, all dashboards are refreshed if not set",
+    )
+    run_parser.add_argument("--render-images", action="store_true")
+
+    worker_parser = commands.add_parser(
+        "worker", help="Refresh the dashboards according to their schedules"
+    )
+    worker_parser.add_argument(
+        "--interval", type=int, default=configs.DASHBOARD_PREWARM_INTERVAL
+    )
+    worker_parser.add_argument("--render-images", action="store_true")
+
+    schedule_parser = commands.add_parser("schedule", help="Schedule a dashboard")
+    schedule_parser.add_argument("dashboard_id")
+    schedule_parser.add_argument("cron", help='e.g. "0 6 * * 1-5"')
+
+    unschedule_parser = commands.add_parser(
+        "unschedule", help="Remove the schedule of a dashboard"
+    )
+    unschedule_parser.add_argument("dashboard_id")
+
+    commands.add_parser("list", help="List the dashboard schedules")
+    return parser
+
+
+def main(args: Optional[List[str]] = None, deps: Optional[DEPS.Dependencies] = None):
+    parsed = create_parser().parse_args(args)
+    if deps is None:
+        deps = DEPS.Dependencies.from_configs()
+
+    if parsed.command == "run":
+        run(deps, parsed.dashboard_ids, parsed.render_images)
+    elif parsed.command == "worker":
+        run_worker(deps, parsed.interval, parsed.render_images)
+    elif parsed.command == "schedule":
+        schedule(deps, parsed.dashboard_id, parsed.cron)
+    elif parsed.command == "unschedule":
+        deps.storage.clear_dashboard_schedule(parsed.dashboard_id)
+    elif parsed.command == "list":
+        for dashboard_schedule in deps.storage.list_dashboard_schedules():
+            print(
+                f"{dashboard_schedule.dashboard_id}\t{dashboard_schedule.cron}\t"
+                f"{dashboard_schedule.last_run_at or '-'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import mitzu.model as M
+import mitzu.webapp.cache as C
+
+GENERATION_PREFIX = C.GENERATION_PREFIX
+
+
+@dataclass(frozen=True)
+class CacheGenerationService:
+    """
+    Keeps a generation number for every project and connection.
+    The cache keys of the query results contain the generations, so bumping a generation makes
+    every result cached for the project (or for the projects of the connection) unreachable.
+    Unreachable entries are removed by their expiration.
+    """
+
+    cache: C.MitzuCache
+
+    def _get_project_key(self, project_id: str) -> str:
+        return f"{GENERATION_PREFIX}project.{project_id}"
+
+    def _get_connection_key(self, connection_id: str) -> str:
+        return f"{GENERATION_PREFIX}connection.{connection_id}"
+
+    def get_namespace(self, project: M.Project) -> str:
+        project_key = self._get_project_key(project.id)
+        connection_key = self._get_connection_key(project.connection.id)
+        generations = self.cache.get_counters([project_key, connection_key])
+        return (
+            f"{project.id}.{generations[project_key]}."
+            f"{project.connection.id}.{generations[connection_key]}"
+        )
+
+    def bump_project(self, project_id: str):
+        self.cache.incr(self._get_project_key(project_id))
+
+    def bump_connection(self, connection_id: str):
+        self.cache.incr(self._get_connection_key(connection_id))
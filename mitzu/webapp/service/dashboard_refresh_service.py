@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+import mitzu.model as M
+import mitzu.visualization.charts as CHRT
+import mitzu.visualization.plot as PLT
+import mitzu.webapp.cache as C
+import mitzu.webapp.caching_dataset_adapter as CDA
+import mitzu.webapp.configs as configs
+import mitzu.webapp.cron as CRON
+import mitzu.webapp.model as WM
+import mitzu.webapp.pages.explore.graph_handler as GH
+import mitzu.webapp.service.cache_generation_service as CGS
+import mitzu.webapp.service.thumbnail_render_service as TRS
+import mitzu.webapp.storage as S
+from mitzu.helper import LOGGER
+
+
+@dataclass(frozen=True)
+class DashboardRefreshService:
+    """
+    Computes the saved metrics of dashboards and stores the results in the explore cache and the storage.
+    Queries run in parallel, but at most `concurrency` queries are executed at the same time on a connection.
+    Images are rendered by the thumbnail render service when it's set, the ones needing
+    the render workers are rendered after the results are stored.
+    """
+
+    storage: S.MitzuStorage
+    cache: C.MitzuCache
+    cache_generation_service: CGS.CacheGenerationService
+    concurrency: int = configs.DASHBOARD_REFRESH_CONCURRENCY
+    thumbnail_render_service: Optional[TRS.ThumbnailRenderService] = None
+
+    def _get_result_df(
+        self, metric: M.Metric, project: M.Project, force: bool
+    ) -> pd.DataFrame:
+        hash_key = GH.create_metric_hash_key(
+            metric, self.cache_generation_service.get_namespace(project)
+        )
+        if not force:
+            as_of_key = hash_key + GH.AS_OF_SUFFIX
+            cached = self.cache.get_many([hash_key, as_of_key])
+            if (
+                hash_key in cached
+                and as_of_key in cached
+                and cached[as_of_key] + configs.CACHE_EXPIRATION
+                >= datetime.now().timestamp()
+            ):
+                return cached[hash_key]
+
+        result_df = metric.get_df()
+        GH.put_metric_result(hash_key, result_df, self.cache)
+        return result_df
+
+    def refresh_saved_metric(
+        self, saved_metric: WM.SavedMetric, force: bool = False, render_image=False
+    ) -> WM.SavedMetric:
+        metric = saved_metric.metric
+        project = saved_metric.project
+        if metric is None or project is None:
+            raise ValueError(f"Saved metric {saved_metric.id} has no project")
+
+        result_df = self._get_result_df(metric, project, force)
+        simple_chart = CHRT.get_simple_chart(metric, result_df)
+        image_base64 = saved_metric.image_base64
+        small_base64 = saved_metric.small_base64
+        if render_image and self.thumbnail_render_service is None:
+            fig = PLT.plot_chart(simple_chart, metric)
+            small_base64 = PLT.figure_to_base64_image(
+                fig, 0.5, kaleid_configs=configs.get_kaleido_configs()
+            )
+            image_base64 = small_base64
+        elif render_image and self.thumbnail_render_service is not None:
+            image = self.thumbnail_render_service.render_inline(simple_chart, metric)
+            if image is not None:
+                image_base64 = small_base64 = image
+
+        return WM.SavedMetric(
+            metric=metric,
+            name=saved_metric.name,
+            description=saved_metric.description,
+            chart=simple_chart,
+            project=project,
+            image_base64=image_base64,
+            small_base64=small_base64,
+            owner=saved_metric.owner,
+            created_at=saved_metric.created_at,
+            id=saved_metric.id,
+        )
+
+    def refresh_saved_metrics(
+        self,
+        saved_metrics: List[WM.SavedMetric],
+        force: bool = False,
+        render_images: bool = False,
+        on_refreshed: Optional[Callable[[WM.SavedMetric], None]] = None,
+    ) -> Dict[str, WM.SavedMetric]:
+        """
+        Refreshes the saved metrics and returns them by their ids.
+        Metrics failing to compute are logged and left out of the result.
+        """
+        if force:
+            CDA.clear_cached_metrics(
+                [sm.metric for sm in saved_metrics if sm.metric is not None]
+            )
+
+        by_connection: Dict[str, List[WM.SavedMetric]] = {}
+        for saved_metric in saved_metrics:
+            if saved_metric.project is None or saved_metric.metric is None:
+                continue
+            by_connection.setdefault(saved_metric.project.connection.id, []).append(
+                saved_metric
+            )
+
+        results: Dict[str, WM.SavedMetric] = {}
+        executors = [
+            ThreadPoolExecutor(max_workers=max(self.concurrency, 1))
+            for _ in by_connection
+        ]
+        try:
+            futures: Dict[Future, WM.SavedMetric] = {}
+            for executor, metrics in zip(executors, by_connection.values()):
+                for saved_metric in metrics:
+                    future = executor.submit(
+                        self.refresh_saved_metric, saved_metric, force, render_images
+                    )
+                    futures[future] = saved_metric
+
+            for future in as_completed(futures):
+                saved_metric = futures[future]
+                try:
+                    refreshed = future.result()
+                except Exception as exc:
+                    LOGGER.warn(
+                        f"Failed to refresh saved metric {saved_metric.id}: {exc}"
+                    )
+                    continue
+                results[refreshed.id] = refreshed
+                if on_refreshed is not None:
+                    on_refreshed(refreshed)
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+        return results
+
+    def refresh_dashboards(
+        self,
+        dashboards: List[WM.Dashboard],
+        force: bool = False,
+        render_images: bool = False,
+        on_refreshed: Optional[Callable[[WM.SavedMetric], None]] = None,
+        saved_metric_filter: Optional[Callable[[WM.SavedMetric], bool]] = None,
+    ) -> Dict[str, WM.SavedMetric]:
+        """
+        Refreshes every saved metric of the dashboards once (or the ones accepted by the filter)
+        and stores them in a single transaction after all of them finished.
+        """
+        saved_metrics: Dict[str, WM.SavedMetric] = {}
+        for dashboard in dashboards:
+            for dm in dashboard.dashboard_metrics:
+                if dm.saved_metric is not None and (
+                    saved_metric_filter is None or saved_metric_filter(dm.saved_metric)
+                ):
+                    saved_metrics[dm.saved_metric.id] = dm.saved_metric
+
+        results = self.refresh_saved_metrics(
+            list(saved_metrics.values()),
+            force=force,
+            render_images=render_images,
+            on_refreshed=on_refreshed,
+        )
+        self.storage.set_saved_metrics(list(results.values()))
+        if (
+            render_images
+            and self.thumbnail_render_service is not None
+            and self.thumbnail_render_service.renderer == TRS.KALEIDO_RENDERER
+        ):
+            for saved_metric in results.values():
+                if saved_metric.metric is not None:
+                    self.thumbnail_render_service.render_saved_metric(
+                        saved_metric.id, saved_metric.chart, saved_metric.metric
+                    )
+
+        for dashboard in dashboards:
+            for dm in dashboard.dashboard_metrics:
+                if dm.saved_metric is not None and dm.saved_metric.id in results:
+                    dm.set_saved_metric(results[dm.saved_metric.id])
+        return results
+
+    def refresh_due_dashboards(
+        self, now: Optional[datetime] = None, render_images: bool = False
+    ) -> List[str]:
+        """
+        Refreshes the dashboards whose schedule is due and returns the ids of the ones refreshed successfully.
+        The last run of a schedule is updated only if every saved metric of its dashboard was refreshed,
+        the failing ones are retried at the next check.
+        """
+        if now is None:
+            now = datetime.now()
+
+        due_schedules = []
+        for schedule in self.storage.list_dashboard_schedules():
+            try:
+                cron = CRON.CronExpression.parse(schedule.cron)
+            except CRON.InvalidCronExpression as exc:
+                LOGGER.warn(
+                    f"Invalid schedule of dashboard {schedule.dashboard_id}: {exc}"
+                )
+                continue
+            if cron.is_due(schedule.last_run_at, now):
+                due_schedules.append(schedule)
+
+        if len(due_schedules) == 0:
+            return []
+
+        dashboards = self.storage.get_dashboards(
+            [schedule.dashboard_id for schedule in due_schedules], with_images=False
+        )
+        try:
+            results = self.refresh_dashboards(
+                dashboards, force=True, render_images=render_images
+            )
+        except Exception as exc:
+            LOGGER.warn(f"Failed to refresh the scheduled dashboards: {exc}")
+            return []
+
+        dashboards_by_id = {dashboard.id: dashboard for dashboard in dashboards}
+        refreshed = []
+        for schedule in due_schedules:
+            failed = [
+                dm.saved_metric.id
+                for dm in dashboards_by_id[schedule.dashboard_id].dashboard_metrics
+                if dm.saved_metric is not None
+                and dm.saved_metric.metric is not None
+                and dm.saved_metric.project is not None
+                and dm.saved_metric.id not in results
+            ]
+            if len(failed) > 0:
+                LOGGER.warn(
+                    f"Failed to refresh dashboard {schedule.dashboard_id}, saved metrics: {', '.join(failed)}"
+                )
+                continue
+            self.storage.set_dashboard_schedule(
+                WM.DashboardSchedule(
+                    dashboard_id=schedule.dashboard_id,
+                    cron=schedule.cron,
+                    last_run_at=now,
+                )
+            )
+            refreshed.append(schedule.dashboard_id)
+        return refreshed
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import mitzu.adapters.generic_adapter as GA
+import mitzu.model as M
+import mitzu.webapp.cache as C
+import mitzu.webapp.configs as configs
+
+SCHEMA_CATALOG_PREFIX = "__SCHEMA_CATALOG__."
+
+
+@dataclass(frozen=True)
+class SchemaCatalogService:
+    """
+    Lists schemas, tables and table columns of a connection.
+    Results are cached per connection until they expire or the connection's catalog gets invalidated.
+    """
+
+    cache: C.MitzuCache
+    expire: float = configs.SCHEMA_CATALOG_CACHE_EXPIRATION
+
+    def _get_adapter(self, connection: M.Connection) -> GA.GenericDatasetAdapter:
+        dummy_project = M.Project(
+            connection=connection,
+            event_data_tables=[],
+            project_name="dummy_project",
+        )
+        return dummy_project.get_adapter()
+
+    def _get_key(self, connection_id: str, *parts: str) -> str:
+        return SCHEMA_CATALOG_PREFIX + ".".join([connection_id, *parts])
+
+    def list_schemas(self, connection: M.Connection) -> List[str]:
+        key = self._get_key(connection.id, "schemas")
+        res = self.cache.get(key)
+        if res is None:
+            res = self._get_adapter(connection).list_schemas()
+            self.cache.put(key, res, expire=self.expire)
+        return res
+
+    def list_tables(self, connection: M.Connection, schema: str) -> List[str]:
+        key = self._get_key(connection.id, "tables", schema)
+        res = self.cache.get(key)
+        if res is None:
+            res = self._get_adapter(connection).list_tables(schema)
+            self.cache.put(key, res, expire=self.expire)
+        return res
+
+    def list_table_columns(
+        self, connection: M.Connection, schema: str, table_names: List[str]
+    ) -> Dict[str, List[M.Field]]:
+        """Returns the columns for each table, tables that couldn't be reflected are left out of the result"""
+        keys = {
+            table_name: self._get_key(connection.id, "columns", schema, table_name)
+            for table_name in table_names
+        }
+        cached = self.cache.get_many(list(keys.values()))
+        res: Dict[str, List[M.Field]] = {
+            table_name: cached[key] for table_name, key in keys.items() if key in cached
+        }
+        missing = [table_name for table_name in table_names if table_name not in res]
+
+        if len(missing) > 0:
+            adapter = self._get_adapter(connection)
+            reflected = adapter.list_all_table_columns_bulk(schema, missing)
+            self.cache.put_many(
+                {keys[table_name]: fields for table_name, fields in reflected.items()},
+                expire=self.expire,
+            )
+            res.update(reflected)
+        return res
+
+    def invalidate(
+        self,
+        connection_id: str,
+        schema: Optional[str] = None,
+        table_names: Optional[List[str]] = None,
+    ):
+        if schema is None:
+            self.cache.clear_all(prefix=self._get_key(connection_id, ""))
+            return
+
+        self.cache.clear(self._get_key(connection_id, "tables", schema))
+        if table_names is None:
+            self.cache.clear_all(
+                prefix=self._get_key(connection_id, "columns", schema, "")
+            )
+        else:
+            self.cache.clear_many(
+                [
+                    self._get_key(connection_id, "columns", schema, table_name)
+                    for table_name in table_names
+                ]
+            )
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import plotly.io as pio
+
+import mitzu.model as M
+import mitzu.visualization.common as CO
+import mitzu.visualization.plot as PLT
+import mitzu.visualization.thumbnail as TN
+import mitzu.webapp.cache as C
+import mitzu.webapp.configs as configs
+import mitzu.webapp.storage as S
+from mitzu.helper import LOGGER
+
+THUMBNAIL_PREFIX = "__THUMBNAIL__."
+THUMBNAIL_SCALE = 0.5
+SVG_RENDERER = "svg"
+KALEIDO_RENDERER = "kaleido"
+
+
+def render_figure(figure_json: str, scale: float, kaleido_configs) -> str:
+    """Executed by the render workers, the Kaleido process of a worker is reused between the renders"""
+    return PLT.figure_to_base64_image(
+        pio.from_json(figure_json), scale, kaleid_configs=kaleido_configs
+    )
+
+
+def create_figure_hash(figure_json: str, scale: float) -> str:
+    return hashlib.sha256(f"{scale}:{figure_json}".encode()).hexdigest()
+
+
+def create_process_pool(max_workers: int) -> Executor:
+    # spawned workers don't inherit the locks and threads of the web server process
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+class ThumbnailRenderService:
+    """
+    Creates the thumbnails of the saved metrics. The svg renderer draws them right away,
+    the kaleido renderer renders the plotly figures in a pool of render workers and stores them when they finish,
+    so saving a metric doesn't wait for Kaleido.
+    Figures with the same content are rendered only once by Kaleido, the pending renders are shared
+    and the finished ones are kept in the cache.
+    The render workers belong to the process submitting the renders, so only long lived processes
+    (the web server, the prewarm worker) should submit them, not the job processes of the background callbacks.
+    """
+
+    def __init__(
+        self,
+        storage: S.MitzuStorage,
+        cache: C.MitzuCache,
+        max_workers: int = configs.THUMBNAIL_RENDER_WORKERS,
+        executor_factory: Callable[[int], Executor] = create_process_pool,
+        renderer: str = configs.THUMBNAIL_RENDERER,
+    ):
+        if renderer not in (SVG_RENDERER, KALEIDO_RENDERER):
+            raise ValueError(f"Unknown thumbnail renderer: {renderer}")
+        self.storage = storage
+        self.cache = cache
+        self.renderer = renderer
+        self.max_workers = max_workers
+        self.__executor_factory = executor_factory
+        self.__executor: Optional[Executor] = None
+        self.__pid: Optional[int] = None
+        self.__lock = threading.Lock()
+        # figure hash -> (render, ids of the saved metrics waiting for it)
+        self.__pending: Dict[str, Tuple[Future, List[str]]] = {}
+
+    def __get_executor(self) -> Executor:
+        # the workers of the parent process can't be used after a fork
+        pid = multiprocessing.current_process().pid
+        if self.__executor is None or self.__pid != pid:
+            self.__executor = self.__executor_factory(self.max_workers)
+            self.__pending = {}
+            self.__pid = pid
+        return self.__executor
+
+    def render_inline(
+        self, simple_chart: CO.SimpleChart, metric: M.Metric
+    ) -> Optional[str]:
+        """Returns the thumbnail if it is rendered without the render workers"""
+        if self.renderer == SVG_RENDERER:
+            return TN.chart_to_base64_image(simple_chart)
+        return None
+
+    def render_saved_metric(
+        self, saved_metric_id: str, simple_chart: CO.SimpleChart, metric: M.Metric
+    ) -> Future:
+        """
+        Renders the thumbnail of the chart and stores it as the thumbnail of the saved metric.
+        Returns immediately when the render workers are used, the image is stored when it is ready.
+        """
+        image = self.render_inline(simple_chart, metric)
+        if image is not None:
+            return self._store_rendered_image(saved_metric_id, image)
+
+        figure_json = PLT.plot_chart(simple_chart, metric).to_json()
+        figure_hash = create_figure_hash(figure_json, THUMBNAIL_SCALE)
+        image = self.cache.get(THUMBNAIL_PREFIX + figure_hash)
+        if image is not None:
+            return self._store_rendered_image(saved_metric_id, image)
+
+        with self.__lock:
+            pending = self.__pending.get(figure_hash)
+            if pending is not None:
+                pending[1].append(saved_metric_id)
+                return pending[0]
+
+            future = self.__get_executor().submit(
+                render_figure,
+                figure_json,
+                THUMBNAIL_SCALE,
+                configs.get_kaleido_configs(),
+            )
+            self.__pending[figure_hash] = (future, [saved_metric_id])
+        future.add_done_callback(partial(self._on_rendered, figure_hash))
+        return future
+
+    def _on_rendered(self, figure_hash: str, future: Future):
+        try:
+            image = future.result()
+            self.cache.put(
+                THUMBNAIL_PREFIX + figure_hash,
+                image,
+                expire=configs.THUMBNAIL_CACHE_EXPIRATION,
+            )
+        except Exception as exc:
+            LOGGER.warn(f"Failed to render thumbnail: {exc}")
+            image = None
+
+        with self.__lock:
+            _, saved_metric_ids = self.__pending.pop(figure_hash, (None, []))
+        if image is not None:
+            for saved_metric_id in saved_metric_ids:
+                self._store_image(saved_metric_id, image)
+
+    def _store_rendered_image(self, saved_metric_id: str, image: str) -> Future:
+        self._store_image(saved_metric_id, image)
+        result: Future = Future()
+        result.set_result(image)
+        return result
+
+    def _store_image(self, saved_metric_id: str, image: str):
+        try:
+            self.storage.set_saved_metric_image(saved_metric_id, image, image)
+        except Exception as exc:
+            # e.g. the saved metric was deleted in the meantime
+            LOGGER.warn(f"Failed to store the thumbnail of {saved_metric_id}: {exc}")
+
+    def shutdown(self, wait: bool = True):
+        """Stops the render workers, waits for the queued renders by default"""
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=wait)
+            self.__executor = None
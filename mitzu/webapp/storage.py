@@ -1,15 +1,23 @@
 from __future__ import annotations
 
+import json
 import multiprocessing
-from typing import Dict, List, Optional
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TypeVar
 
 from mitzu.helper import LOGGER
 import mitzu.model as M
 import mitzu.webapp.model as WM
 import mitzu.webapp.storage_model as SM
 import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.cache as C
+import mitzu.webapp.caching_dataset_adapter as CDA
+import mitzu.webapp.service.cache_generation_service as CGS
+import mitzu.webapp.pages.paths as P
 from mitzu.samples.data_ingestion import create_and_ingest_sample_project
 import sqlalchemy as SA
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
 
@@ -20,11 +28,36 @@ SAMPLE_CONNECTION_ID = "sample_connection_id"
 
 DEFAULT_CONNECTION_STRING = "sqlite://?check_same_thread=False"
 
+# Maximum number of ids in the IN clauses of bulk statements, keeps them under the parameter limits
+BULK_WRITE_BATCH_SIZE = 500
+
+# How long a SQLite connection waits for the lock of another writer
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+T = TypeVar("T")
+
 
 class InvalidStorageReference(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class LoadedProjectRecords:
+    """The storage records of a project, every caller gets a new project instance created from them"""
+
+    record: SM.ProjectStorageRecord
+    connection: M.Connection
+    discovery_settings: M.DiscoverySettings
+    webapp_settings: M.WebappSettings
+    event_data_tables: List[
+        Tuple[SM.EventDataTableStorageRecord, Optional[M.DiscoverySettings]]
+    ]
+    # event data table id -> columns
+    table_columns: Dict[str, SM.TableColumnsStorageRecord]
+    # event data table id -> (event name, event definition id)
+    events: Dict[str, List[Tuple[str, str]]]
+
+
 class StorageEventDefReference(M.Reference[M.EventDef]):
     def __init__(
         self,
@@ -78,22 +111,99 @@ def setup_sample_project(storage: MitzuStorage):
         storage.set_event_data_table_definition(event_data_table=edt, definitions=defs)
 
 
+def chunks(items: List[T], size: int = BULK_WRITE_BATCH_SIZE) -> Iterator[List[T]]:
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any):
+    """Applied once on every new SQLite connection instead of on every session"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys = ON")
+    # WAL lets the readers run while a process writes, it's ignored by in-memory databases
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def to_row(record: Any) -> Dict[str, Any]:
+    """Returns the column values of a storage record for bulk statements"""
+    return {
+        column.name: getattr(record, column.key) for column in record.__table__.columns
+    }
+
+
+def create_image_url(image_id: str) -> str:
+    return P.create_path(P.SAVED_METRIC_IMAGES_PATH, image_id=image_id)
+
+
+def get_image_id_from_url(image: str) -> Optional[str]:
+    prefix = P.create_path(P.SAVED_METRIC_IMAGES_PATH, image_id="")
+    if image.startswith(prefix):
+        start = len(prefix)
+        return image[start:]
+    return None
+
+
 class MitzuStorage:
     def __init__(
         self,
         connection_string: str = "sqlite://?check_same_thread=False",
+        result_cache: Optional[C.MitzuCache] = None,
+        cache_generations: Optional[CGS.CacheGenerationService] = None,
+        read_connection_string: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        pool_recycle: Optional[int] = None,
+        read_after_write_seconds: float = 0,
     ) -> None:
+        """
+        Read-only methods use the read_connection_string (e.g. a replica) when it is set, except for
+        read_after_write_seconds after a write of this instance, so the writes are seen despite the replication lag.
+        The pool settings are ignored by SQLite.
+        """
         self.__pid = None
-        self.__is_sqlite = connection_string.startswith("sqlite")
         self.__connection_string = connection_string
-
-    def _new_db_session(self) -> Session:
+        self.__read_connection_string = read_connection_string
+        self.__pool_options = {
+            key: value
+            for key, value in {
+                "pool_size": pool_size,
+                "max_overflow": max_overflow,
+                "pool_recycle": pool_recycle,
+            }.items()
+            if value is not None
+        }
+        self.__read_after_write_seconds = read_after_write_seconds
+        self.__last_write_at: Optional[float] = None
+        self.__result_cache = result_cache
+        self.__cache_generations = cache_generations
+        # project id -> (version, records), the records are reused until the version of the project changes
+        self.__projects: Dict[str, Tuple[int, LoadedProjectRecords]] = {}
+
+    def _new_db_session(self, read_only: bool = False) -> Session:
         self.__create_engine_when_needed()
-        session = SA.orm.sessionmaker(bind=self._engine)()
-        if self.__is_sqlite:
-            session.execute("PRAGMA foreign_keys = ON;")
-            session.commit()
-        return session
+        if read_only and self.__read_session_factory is not None:
+            if (
+                self.__last_write_at is None
+                or time.monotonic() - self.__last_write_at
+                >= self.__read_after_write_seconds
+            ):
+                return self.__read_session_factory()
+        elif not read_only:
+            self.__last_write_at = time.monotonic()
+        return self.__session_factory()
+
+    def __create_engine(self, connection_string: str) -> SA.engine.Engine:
+        if connection_string.startswith("sqlite"):
+            engine = SA.create_engine(connection_string, pool_pre_ping=True)
+            SA.event.listen(engine, "connect", set_sqlite_pragmas)
+            return engine
+        return SA.create_engine(
+            connection_string, pool_pre_ping=True, **self.__pool_options
+        )
 
     def __create_engine_when_needed(self):
         # we need to make sure that the engine is created by the current process and not by the parent process
@@ -102,9 +212,15 @@ class MitzuStorage:
             LOGGER.debug(
                 f"Engine needs to be recreated, previous instance created by pid: {self.__pid}, current pid: {pid}"
             )
-            self._engine = SA.create_engine(
-                self.__connection_string, pool_pre_ping=True
-            )
+            self._engine = self.__create_engine(self.__connection_string)
+            self.__session_factory = SA.orm.sessionmaker(bind=self._engine)
+            self._read_engine: Optional[SA.engine.Engine] = None
+            self.__read_session_factory: Optional[SA.orm.sessionmaker] = None
+            if self.__read_connection_string is not None:
+                self._read_engine = self.__create_engine(self.__read_connection_string)
+                self.__read_session_factory = SA.orm.sessionmaker(
+                    bind=self._read_engine
+                )
             self.__pid = pid
 
     def init_db_schema(self):
@@ -117,16 +233,27 @@ class MitzuStorage:
             SM.WebappSettingsStorageRecord,
             SM.ConnectionStorageRecord,
             SM.ProjectStorageRecord,
+            SM.ProjectVersionStorageRecord,
             SM.EventDataTableStorageRecord,
             SM.EventDefStorageRecord,
+            SM.EventFieldStorageRecord,
+            SM.EventFieldEnumStorageRecord,
+            SM.TableColumnsStorageRecord,
             SM.SavedMetricStorageRecord,
+            SM.ImageStorageRecord,
+            SM.SavedMetricImageStorageRecord,
             SM.DashboardStorageRecord,
             SM.DashboardMetricStorageRecord,
+            SM.DashboardScheduleStorageRecord,
             SM.OnboardingFlowStateStorageRecord,
         ]:
             tables.append(SM.Base.metadata.tables[storage_record.__tablename__])
 
         SM.Base.metadata.create_all(self._engine, tables=tables)
+        # create_all skips the existing tables, the indexes added later are created here
+        for table in tables:
+            for index in table.indexes:
+                index.create(self._engine, checkfirst=True)
 
     def set_project(self, project_id: str, project: M.Project):
         with self._new_db_session() as session:
@@ -154,18 +281,34 @@ class MitzuStorage:
             else:
                 record.update(project)
 
+            self._set_event_data_tables(project.id, project.event_data_tables, session)
             for edt in project.event_data_tables:
-                self._set_event_data_table(project.id, edt, session)
+                columns = project.get_table_columns(edt)
+                if columns is not None:
+                    self._set_table_columns(edt, columns, session)
 
             discovered_project = project._discovered_project.get_value()
             if discovered_project:
-                self._populate_discovered_project(discovered_project, session)
-                for edt, vals in discovered_project.definitions.items():
+                # definitions loaded lazily from the storage and never accessed are unchanged
+                changed_definitions = {
+                    edt: defs
+                    for edt, defs in discovered_project.definitions.items()
+                    if any(
+                        not isinstance(ref, StorageEventDefReference)
+                        or ref._value_state.get_value() is not None
+                        for ref in defs.values()
+                    )
+                }
+                self._populate_definitions(changed_definitions, session)
+                for edt, vals in changed_definitions.items():
                     self._set_event_data_table_definition(edt, vals, session)
+            self._bump_project_versions([project_id], session)
             session.commit()
+        if self.__cache_generations is not None:
+            self.__cache_generations.bump_project(project_id)
 
     def project_exists(self, project_id: str) -> bool:
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             return (
                 session.query(SM.ProjectStorageRecord)
                 .filter(SM.ProjectStorageRecord.project_id == project_id)
@@ -173,50 +316,250 @@ class MitzuStorage:
             ) is not None
 
     def get_project(self, project_id: str) -> M.Project:
-        with self._new_db_session() as session:
-            record = (
-                session.query(SM.ProjectStorageRecord)
-                .filter(SM.ProjectStorageRecord.project_id == project_id)
-                .first()
-            )
-            if record is None:
+        with self._new_db_session(read_only=True) as session:
+            projects = self._get_projects([project_id], session)
+            if project_id not in projects:
                 raise ValueError(f"Project not found with project_id={project_id}")
+            return projects[project_id]
 
-            connection = self._get_connection(record.connection_id, session)
-            discovery_settings = self._get_discovery_settings(
-                record.discovery_settings_id, session
+    def _bump_project_versions(self, project_ids: List[str], session: SA.orm.Session):
+        if len(project_ids) == 0:
+            return
+        records = {
+            record.project_id: record
+            for record in session.query(SM.ProjectVersionStorageRecord).filter(
+                SM.ProjectVersionStorageRecord.project_id.in_(project_ids)
+            )
+        }
+        for project_id in project_ids:
+            if project_id in records:
+                records[project_id].version += 1
+            else:
+                session.add(
+                    SM.ProjectVersionStorageRecord(project_id=project_id, version=1)
+                )
+            self.__projects.pop(project_id, None)
+
+    def _get_projects(
+        self, project_ids: List[str], session: SA.orm.Session
+    ) -> Dict[str, M.Project]:
+        """
+        Creates the projects from the already loaded records if their versions haven't changed since,
+        and loads the rest. Every call returns new project instances, the callers may modify them.
+        """
+        versions = {
+            row.project_id: row.version or 0
+            for row in session.query(
+                SM.ProjectStorageRecord.project_id,
+                SM.ProjectVersionStorageRecord.version,
+            )
+            .outerjoin(
+                SM.ProjectVersionStorageRecord,
+                SM.ProjectVersionStorageRecord.project_id
+                == SM.ProjectStorageRecord.project_id,
             )
-            webapp_settings = self._get_webapp_settings(
-                record.webapp_settings_id, session
+            .filter(SM.ProjectStorageRecord.project_id.in_(set(project_ids)))
+        }
+        records: Dict[str, LoadedProjectRecords] = {}
+        to_load = []
+        for project_id, version in versions.items():
+            loaded = self.__projects.get(project_id)
+            if loaded is not None and loaded[0] == version:
+                records[project_id] = loaded[1]
+            else:
+                to_load.append(project_id)
+
+        for project_id, loaded_records in self._load_project_records(
+            to_load, session
+        ).items():
+            self.__projects[project_id] = (versions[project_id], loaded_records)
+            records[project_id] = loaded_records
+        return {
+            project_id: self._create_project(loaded_records)
+            for project_id, loaded_records in records.items()
+        }
+
+    def _load_project_records(
+        self, project_ids: List[str], session: SA.orm.Session
+    ) -> Dict[str, LoadedProjectRecords]:
+        """
+        Loads the records of the projects with a fixed number of queries independently of the number of projects and
+        event data tables.
+        """
+        if len(project_ids) == 0:
+            return {}
+        records = (
+            session.query(SM.ProjectStorageRecord)
+            .filter(SM.ProjectStorageRecord.project_id.in_(set(project_ids)))
+            .all()
+        )
+        if len(records) == 0:
+            return {}
+
+        connections = {
+            rec.connection_id: rec.as_model_instance()
+            for rec in session.query(SM.ConnectionStorageRecord).filter(
+                SM.ConnectionStorageRecord.connection_id.in_(
+                    {record.connection_id for record in records}
+                )
             )
-            edts = self._get_event_data_tables_for_project(record.project_id, session)
-            project = record.as_model_instance(
-                connection, edts, discovery_settings, webapp_settings
+        }
+        edt_records = (
+            session.query(SM.EventDataTableStorageRecord)
+            .filter(
+                SM.EventDataTableStorageRecord.project_id.in_(
+                    [record.project_id for record in records]
+                )
             )
+            .all()
+        )
+        discovery_settings = {
+            rec.discovery_settings_id: rec.as_model_instance()
+            for rec in session.query(SM.DiscoverySettingsStorageRecord).filter(
+                SM.DiscoverySettingsStorageRecord.discovery_settings_id.in_(
+                    {record.discovery_settings_id for record in records}
+                    | {edt_record.discovery_settings_id for edt_record in edt_records}
+                )
+            )
+        }
+        webapp_settings = {
+            rec.webapp_settings_id: rec.as_model_instance()
+            for rec in session.query(SM.WebappSettingsStorageRecord).filter(
+                SM.WebappSettingsStorageRecord.webapp_settings_id.in_(
+                    {record.webapp_settings_id for record in records}
+                )
+            )
+        }
+        edt_ids = [edt_record.event_data_table_id for edt_record in edt_records]
+        table_columns = session.query(SM.TableColumnsStorageRecord).filter(
+            SM.TableColumnsStorageRecord.event_data_table_id.in_(edt_ids)
+        )
+        discovered_events = (
+            session.query(
+                SM.EventDefStorageRecord.event_data_table_id,
+                SM.EventDefStorageRecord.event_name,
+                SM.EventDefStorageRecord.id,
+            )
+            .filter(SM.EventDefStorageRecord.event_data_table_id.in_(edt_ids))
+            .all()
+        )
 
-            discovered_definitions: Dict[
-                M.EventDataTable, Dict[str, M.Reference[M.EventDef]]
-            ] = {}
-            for edt in edts:
-                discovered_fields = (
-                    session.query(
-                        SM.EventDefStorageRecord.event_name, SM.EventDefStorageRecord.id
+        edt_records_by_project: Dict[str, List[SM.EventDataTableStorageRecord]] = {}
+        for edt_record in edt_records:
+            edt_records_by_project.setdefault(edt_record.project_id, []).append(
+                edt_record
+            )
+        columns_by_edt = {
+            record.event_data_table_id: record for record in table_columns.all()
+        }
+        events_by_edt: Dict[str, List[Tuple[str, str]]] = {}
+        for event in discovered_events:
+            events_by_edt.setdefault(event.event_data_table_id, []).append(
+                (event.event_name, event.id)
+            )
+
+        result: Dict[str, LoadedProjectRecords] = {}
+        for record in records:
+            project_edt_records = edt_records_by_project.get(record.project_id, [])
+            loaded_records = LoadedProjectRecords(
+                record=record,
+                connection=self._find_by_id(
+                    connections, record.connection_id, "Connection"
+                ),
+                discovery_settings=self._find_by_id(
+                    discovery_settings,
+                    record.discovery_settings_id,
+                    "Discovery settings",
+                ),
+                webapp_settings=self._find_by_id(
+                    webapp_settings, record.webapp_settings_id, "Webapp settings"
+                ),
+                event_data_tables=[
+                    (
+                        edt_record,
+                        self._find_by_id(
+                            discovery_settings,
+                            edt_record.discovery_settings_id,
+                            "Discovery settings",
+                        ),
                     )
-                    .filter(SM.EventDefStorageRecord.event_data_table_id == edt.id)
-                    .all()
+                    for edt_record in project_edt_records
+                ],
+                table_columns={
+                    edt_record.event_data_table_id: columns_by_edt[
+                        edt_record.event_data_table_id
+                    ]
+                    for edt_record in project_edt_records
+                    if edt_record.event_data_table_id in columns_by_edt
+                },
+                events={
+                    edt_record.event_data_table_id: events_by_edt[
+                        edt_record.event_data_table_id
+                    ]
+                    for edt_record in project_edt_records
+                    if edt_record.event_data_table_id in events_by_edt
+                },
+            )
+            result[record.project_id] = loaded_records
+        # the records are kept after the session is closed, they must not be expired by its commit
+        for kept_record in [*records, *edt_records, *columns_by_edt.values()]:
+            session.expunge(kept_record)
+        return result
+
+    def _create_project(self, loaded_records: LoadedProjectRecords) -> M.Project:
+        edts = [
+            edt_record.as_model_instance(edt_discovery_settings)
+            for edt_record, edt_discovery_settings in loaded_records.event_data_tables
+        ]
+        project = loaded_records.record.as_model_instance(
+            loaded_records.connection,
+            edts,
+            loaded_records.discovery_settings,
+            loaded_records.webapp_settings,
+        )
+        if self.__result_cache is not None:
+            project.set_adapter(
+                CDA.CachingDatasetAdapter(
+                    project.get_adapter(),
+                    self.__result_cache,
+                    generations=self.__cache_generations,
                 )
-                definitions: Dict[str, M.Reference[M.EventDef]] = {}
-                for field in discovered_fields:
-                    definitions[field.event_name] = StorageEventDefReference(
-                        id=field.id, value=None, event_data_table=edt
-                    )
-                if len(definitions) > 0:
-                    discovered_definitions[edt] = definitions
+            )
 
-            if len(discovered_definitions) > 0:
-                # it may seems a bit od but the constructor will put the reference of the discovered project into the project
-                M.DiscoveredProject(discovered_definitions, project)
-            return project
+        for edt in project.event_data_tables:
+            columns_record = loaded_records.table_columns.get(edt.id)
+            if (
+                columns_record is None
+                or columns_record.full_table_name
+                != SM.TableColumnsStorageRecord.get_full_table_name(edt)
+            ):
+                continue
+            try:
+                project.restore_table_columns(edt, columns_record.as_model_instance())
+            except Exception as exc:
+                LOGGER.warn(f"Failed to restore the columns of {edt.table_name}: {exc}")
+
+        discovered_definitions: Dict[
+            M.EventDataTable, Dict[str, M.Reference[M.EventDef]]
+        ] = {
+            edt: {
+                event_name: StorageEventDefReference(
+                    id=event_def_id, value=None, event_data_table=edt
+                )
+                for event_name, event_def_id in loaded_records.events[edt.id]
+            }
+            for edt in project.event_data_tables
+            if edt.id in loaded_records.events
+        }
+        if len(discovered_definitions) > 0:
+            # it may seems a bit od but the constructor will put the reference of the discovered project into the project
+            M.DiscoveredProject(discovered_definitions, project)
+        return project
+
+    def _find_by_id(self, values: Dict[str, Any], id: str, name: str) -> Any:
+        if id not in values:
+            raise ValueError(f"{name} not found with id={id}")
+        return values[id]
 
     def delete_project(self, project_id: str):
         with self._new_db_session() as session:
@@ -228,29 +571,90 @@ class MitzuStorage:
             if record is not None:
                 session.delete(record)
                 session.commit()
+        self.__projects.pop(project_id, None)
 
-    def _set_event_data_table(
-        self, project_id: str, edt: M.EventDataTable, session: SA.orm.Session
+    def _set_event_data_tables(
+        self,
+        project_id: str,
+        edts: List[M.EventDataTable],
+        session: SA.orm.Session,
     ):
-        if edt.discovery_settings:
-            self._set_discovery_settings(
-                edt.discovery_settings.id, edt.discovery_settings, session
+        discovery_settings = {
+            edt.discovery_settings.id: edt.discovery_settings
+            for edt in edts
+            if edt.discovery_settings
+        }
+        for discovery_settings_id, settings in discovery_settings.items():
+            self._set_discovery_settings(discovery_settings_id, settings, session)
+
+        # the project and the discovery settings need to exist before the tables referencing them
+        session.flush()
+        # existing tables are updated in place, so their event definitions are kept
+        self._upsert(
+            SM.EventDataTableStorageRecord,
+            [
+                SM.EventDataTableStorageRecord.from_model_instance(
+                    project_id=project_id, edt=edt
+                )
+                for edt in edts
+            ],
+            session,
+        )
+
+    def _upsert(self, record_type: Any, records: List[Any], session: SA.orm.Session):
+        """
+        Inserts the records or updates the existing ones with the same primary key
+        with a single executemany, the records are not added to the session.
+        """
+        if len(records) == 0:
+            return
+        table = record_type.__table__
+        primary_key = [column.name for column in table.primary_key.columns]
+        rows = [to_row(record) for record in records]
+        dialect = session.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+            statement = insert.on_conflict_do_update(
+                index_elements=primary_key,
+                set_={
+                    column.name: insert.excluded[column.name]
+                    for column in table.columns
+                    if column.name not in primary_key
+                },
             )
+        else:
+            for batch in chunks(rows):
+                session.execute(
+                    table.delete().where(
+                        SA.tuple_(*table.primary_key.columns).in_(
+                            [tuple(row[key] for key in primary_key) for row in batch]
+                        )
+                    )
+                )
+            statement = table.insert()
+
+        session.execute(statement, rows)
+
+    def _set_table_columns(
+        self,
+        edt: M.EventDataTable,
+        columns: List[Tuple[str, Any]],
+        session: SA.orm.Session,
+    ):
         record = (
-            session.query(SM.EventDataTableStorageRecord)
-            .filter(
-                (SM.EventDataTableStorageRecord.project_id == project_id)
-                & (SM.EventDataTableStorageRecord.table_name == edt.table_name)
-            )
+            session.query(SM.TableColumnsStorageRecord)
+            .filter(SM.TableColumnsStorageRecord.event_data_table_id == edt.id)
             .first()
         )
-        if record is not None:
-            session.delete(record)
-
-        rec = SM.EventDataTableStorageRecord.from_model_instance(
-            project_id=project_id, edt=edt
-        )
-        session.add(rec)
+        try:
+            if record is None:
+                session.add(
+                    SM.TableColumnsStorageRecord.from_model_instance(edt, columns)
+                )
+            else:
+                record.update(edt, columns)
+        except Exception as exc:
+            LOGGER.warn(f"Failed to store the columns of {edt.table_name}: {exc}")
 
     def _get_event_data_tables_for_project(
         self, project_id: str, session: SA.orm.Session
@@ -269,19 +673,10 @@ class MitzuStorage:
     def _remove_unreferenced_event_data_tables(
         self, project_id: str, referenced_edts: List[str], session: SA.orm.Session
     ):
-        records = (
-            session.query(SM.EventDataTableStorageRecord)
-            .filter(
-                (SM.EventDataTableStorageRecord.project_id == project_id)
-                & (
-                    SM.EventDataTableStorageRecord.event_data_table_id
-                    not in referenced_edts
-                )
-            )
-            .all()
-        )
-        for record in records:
-            session.delete(record)
+        session.query(SM.EventDataTableStorageRecord).filter(
+            (SM.EventDataTableStorageRecord.project_id == project_id)
+            & ~SM.EventDataTableStorageRecord.event_data_table_id.in_(referenced_edts)
+        ).delete(synchronize_session=False)
 
     def _set_discovery_settings(
         self,
@@ -348,27 +743,9 @@ class MitzuStorage:
 
         record.update(webapp_settings)
 
-    def _get_webapp_settings(
-        self, webapp_settings_id: str, session: SA.orm.Session
-    ) -> M.WebappSettings:
-        record = (
-            session.query(SM.WebappSettingsStorageRecord)
-            .filter(
-                SM.WebappSettingsStorageRecord.webapp_settings_id == webapp_settings_id
-            )
-            .first()
-        )
-
-        if record is None:
-            raise ValueError(
-                f"Webapp settings not found with project_id={webapp_settings_id}"
-            )
-
-        return record.as_model_instance()
-
     def list_projects(self) -> List[WM.ProjectInfo]:
         result = []
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             for record in session.query(SM.ProjectStorageRecord):
                 result.append(WM.ProjectInfo(record.project_id, record.name))
             return result
@@ -376,7 +753,18 @@ class MitzuStorage:
     def set_connection(self, connection_id: str, connection: M.Connection):
         with self._new_db_session() as session:
             self._set_connection(connection_id, connection, session)
+            self._bump_project_versions(
+                [
+                    row.project_id
+                    for row in session.query(SM.ProjectStorageRecord.project_id).filter(
+                        SM.ProjectStorageRecord.connection_id == connection_id
+                    )
+                ],
+                session,
+            )
             session.commit()
+        if self.__cache_generations is not None:
+            self.__cache_generations.bump_connection(connection_id)
 
     def _set_connection(
         self, connection_id: str, connection: M.Connection, session: SA.orm.Session
@@ -392,7 +780,7 @@ class MitzuStorage:
             record.update(connection)
 
     def get_connection(self, connection_id: str) -> M.Connection:
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             return self._get_connection(connection_id, session)
 
     def _get_connection(
@@ -423,7 +811,7 @@ class MitzuStorage:
     def list_connections(
         self,
     ) -> List[str]:
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             result = []
             for record in session.query(SM.ConnectionStorageRecord):
                 result.append(record.connection_id)
@@ -438,6 +826,18 @@ class MitzuStorage:
             self._set_event_data_table_definition(
                 event_data_table, definitions, session
             )
+            self._bump_project_versions(
+                [
+                    row.project_id
+                    for row in session.query(
+                        SM.EventDataTableStorageRecord.project_id
+                    ).filter(
+                        SM.EventDataTableStorageRecord.event_data_table_id
+                        == event_data_table.id
+                    )
+                ],
+                session,
+            )
             session.commit()
 
     def _set_event_data_table_definition(
@@ -446,84 +846,339 @@ class MitzuStorage:
         definitions: Dict[str, M.Reference[M.EventDef]],
         session: SA.orm.Session,
     ):
+        """
+        Replaces the definitions of the table with the discovered ones using a few bulk statements,
+        the number of statements doesn't depend on the number of events.
+        """
         edt_id = event_data_table.id
-        for event_name, event_def in definitions.items():
-            rec = (
-                session.query(SM.EventDefStorageRecord)
-                .filter(
-                    (SM.EventDefStorageRecord.event_data_table_id == edt_id)
-                    & (SM.EventDefStorageRecord.event_name == event_name)
-                )
-                .first()
+        def_records: List[SM.EventDefStorageRecord] = []
+        field_mappings: List[Dict[str, Any]] = []
+        enum_mappings: List[Dict[str, Any]] = []
+        for event_name, event_def_ref in definitions.items():
+            event_def = event_def_ref.get_value_if_exists()
+            def_records.append(
+                SM.EventDefStorageRecord.from_model_instance(edt_id, event_def)
             )
-            if rec is not None:
-                session.delete(rec)
+            for field_pos, field_def in enumerate(event_def._fields):
+                field_mappings.append(
+                    to_row(
+                        SM.EventFieldStorageRecord.from_model_instance(
+                            event_def.get_id(), field_pos, field_def
+                        )
+                    )
+                )
+                enum_mappings.extend(
+                    SM.EventFieldEnumStorageRecord.create_mappings(
+                        event_def.get_id(), field_pos, field_def
+                    )
+                )
 
-            rec = SM.EventDefStorageRecord.from_model_instance(
-                edt_id, event_def.get_value_if_exists()
+        new_ids = {record.id for record in def_records}
+        replaced_ids = [
+            row.id
+            for row in session.query(SM.EventDefStorageRecord.id).filter(
+                SM.EventDefStorageRecord.event_data_table_id == edt_id
+            )
+            if row.id not in new_ids
+        ]
+        self._delete_event_def_fields(list(new_ids) + replaced_ids, session)
+        for batch in chunks(replaced_ids):
+            session.query(SM.EventDefStorageRecord).filter(
+                SM.EventDefStorageRecord.id.in_(batch)
+            ).delete(synchronize_session=False)
+
+        self._upsert(SM.EventDefStorageRecord, def_records, session)
+        if len(field_mappings) > 0:
+            session.execute(
+                SM.EventFieldStorageRecord.__table__.insert(), field_mappings
+            )
+        if len(enum_mappings) > 0:
+            session.execute(
+                SM.EventFieldEnumStorageRecord.__table__.insert(), enum_mappings
             )
-            session.add(rec)
-
-    def populate_discovered_project(self, discovered_project: M.DiscoveredProject):
-        with self._new_db_session() as session:
-            self._populate_discovered_project(discovered_project, session)
 
-    def _populate_discovered_project(
-        self, discovered_project: M.DiscoveredProject, session: SA.orm.Session
+    def _delete_event_def_fields(
+        self, event_def_ids: List[str], session: SA.orm.Session
     ):
-        defs = discovered_project.definitions
+        for batch in chunks(event_def_ids):
+            session.query(SM.EventFieldEnumStorageRecord).filter(
+                SM.EventFieldEnumStorageRecord.event_def_id.in_(batch)
+            ).delete(synchronize_session=False)
+            session.query(SM.EventFieldStorageRecord).filter(
+                SM.EventFieldStorageRecord.event_def_id.in_(batch)
+            ).delete(synchronize_session=False)
+
+    def _get_event_defs(
+        self,
+        event_data_tables: List[M.EventDataTable],
+        session: SA.orm.Session,
+        event_def_ids: Optional[List[str]] = None,
+    ) -> List[M.EventDef]:
+        """Loads the event definitions with all their fields and enums in two queries"""
+        edts = {edt.id: edt for edt in event_data_tables}
+        query = session.query(
+            SM.EventDefStorageRecord, SM.EventFieldStorageRecord
+        ).outerjoin(
+            SM.EventFieldStorageRecord,
+            SM.EventFieldStorageRecord.event_def_id == SM.EventDefStorageRecord.id,
+        )
+        enum_query = session.query(
+            SM.EventFieldEnumStorageRecord.event_def_id,
+            SM.EventFieldEnumStorageRecord.field_position,
+            SM.EventFieldEnumStorageRecord.value,
+        )
+        if event_def_ids is None:
+            query = query.filter(
+                SM.EventDefStorageRecord.event_data_table_id.in_(list(edts.keys()))
+            )
+            enum_query = enum_query.filter(
+                SM.EventFieldEnumStorageRecord.event_data_table_id.in_(
+                    list(edts.keys())
+                )
+            )
+        else:
+            query = query.filter(SM.EventDefStorageRecord.id.in_(event_def_ids))
+            enum_query = enum_query.filter(
+                SM.EventFieldEnumStorageRecord.event_def_id.in_(event_def_ids)
+            )
 
-        for edt in defs.keys():
-            records: List[SM.EventDefStorageRecord] = (
-                session.query(SM.EventDefStorageRecord)
-                .filter(SM.EventDefStorageRecord.event_data_table_id == edt.id)
-                .all()
+        enums: Dict[Tuple[str, int], List[Any]] = {}
+        for event_def_id, field_position, value in enum_query.order_by(
+            SM.EventFieldEnumStorageRecord.event_def_id,
+            SM.EventFieldEnumStorageRecord.field_position,
+            SM.EventFieldEnumStorageRecord.position,
+        ):
+            enums.setdefault((event_def_id, field_position), []).append(
+                json.loads(value)
             )
 
-            for rec in records:
-                defs[edt][rec.event_name].restore_value(rec.as_model_instance(edt))
+        def_records: Dict[str, SM.EventDefStorageRecord] = {}
+        field_defs: Dict[str, List[M.EventFieldDef]] = {}
+        for def_rec, field_rec in query.order_by(
+            SM.EventDefStorageRecord.id, SM.EventFieldStorageRecord.position
+        ):
+            edt = edts[def_rec.event_data_table_id]
+            def_records[def_rec.id] = def_rec
+            fields = field_defs.setdefault(def_rec.id, [])
+            if field_rec is not None:
+                fields.append(
+                    field_rec.as_model_instance(
+                        edt,
+                        def_rec.event_name,
+                        enums.get((def_rec.id, field_rec.position), []),
+                    )
+                )
+
+        return [
+            rec.as_model_instance(edts[rec.event_data_table_id], field_defs[id])
+            for id, rec in def_records.items()
+        ]
+
+    def populate_discovered_project(self, discovered_project: M.DiscoveredProject):
+        with self._new_db_session(read_only=True) as session:
+            self._populate_definitions(discovered_project.definitions, session)
+
+    def _populate_definitions(
+        self,
+        defs: Dict[M.EventDataTable, Dict[str, M.Reference[M.EventDef]]],
+        session: SA.orm.Session,
+    ):
+        edts = {edt.id: edt for edt in defs.keys()}
+        for event_def in self._get_event_defs(list(edts.values()), session):
+            edt_defs = defs[edts[event_def._event_data_table.id]]
+            reference = edt_defs.get(event_def._event_name)
+            if reference is not None:
+                reference.restore_value(event_def)
 
     def get_event_definition(
         self, event_data_table: M.EventDataTable, event_definition_id: str
     ) -> M.EventDef:
-        with self._new_db_session() as session:
-            record: SM.EventDefStorageRecord = (
-                session.query(SM.EventDefStorageRecord)
-                .filter(SM.EventDefStorageRecord.id == event_definition_id)
-                .first()
+        with self._new_db_session(read_only=True) as session:
+            event_defs = self._get_event_defs(
+                [event_data_table], session, event_def_ids=[event_definition_id]
             )
-            return record.as_model_instance(edt=event_data_table)
+            if len(event_defs) == 0:
+                raise ValueError(
+                    f"Event definition not found with id={event_definition_id}"
+                )
+            return event_defs[0]
 
     def set_saved_metric(self, metric_id: str, saved_metric: WM.SavedMetric):
+        self.set_saved_metrics([saved_metric])
+
+    def set_saved_metrics(self, saved_metrics: List[WM.SavedMetric]):
+        """Stores the saved metrics in a single transaction"""
+        if len(saved_metrics) == 0:
+            return
         with self._new_db_session() as session:
-            record = (
-                session.query(SM.SavedMetricStorageRecord)
-                .filter(SM.SavedMetricStorageRecord.saved_metric_id == metric_id)
-                .first()
+            records = {
+                record.saved_metric_id: record
+                for record in session.query(SM.SavedMetricStorageRecord).filter(
+                    SM.SavedMetricStorageRecord.saved_metric_id.in_(
+                        [sm.id for sm in saved_metrics]
+                    )
+                )
+            }
+            for saved_metric in saved_metrics:
+                record = records.get(saved_metric.id)
+                if record is None:
+                    session.add(
+                        SM.SavedMetricStorageRecord.from_model_instance(saved_metric)
+                    )
+                else:
+                    record.update(saved_metric)
+            self._set_saved_metric_images(
+                {sm.id: (sm.image_base64, sm.small_base64) for sm in saved_metrics},
+                session,
+            )
+            session.commit()
+
+    def set_saved_metric_image(
+        self, metric_id: str, image_base64: str, small_base64: str
+    ):
+        """Replaces only the images of an existing saved metric"""
+        with self._new_db_session() as session:
+            self._set_saved_metric_images(
+                {metric_id: (image_base64, small_base64)}, session
             )
+            session.commit()
+
+    def _set_saved_metric_images(
+        self, images: Dict[str, Tuple[str, str]], session: SA.orm.Session
+    ):
+        image_ids: Dict[str, Tuple[str, str]] = {}
+        new_images: Dict[str, str] = {}
+        for saved_metric_id, saved_metric_images in images.items():
+            ids = []
+            for image in saved_metric_images:
+                image_id = get_image_id_from_url(image)
+                if image_id is None:
+                    image_id = SM.ImageStorageRecord.create_image_id(image)
+                    new_images[image_id] = image
+                ids.append(image_id)
+            image_ids[saved_metric_id] = (ids[0], ids[1])
+
+        existing_image_ids = {
+            row.image_id
+            for row in session.query(SM.ImageStorageRecord.image_id).filter(
+                SM.ImageStorageRecord.image_id.in_(list(new_images.keys()))
+            )
+        }
+        for image_id, content in new_images.items():
+            if image_id not in existing_image_ids:
+                session.add(SM.ImageStorageRecord(image_id=image_id, content=content))
+
+        records = {
+            record.saved_metric_id: record
+            for record in session.query(SM.SavedMetricImageStorageRecord).filter(
+                SM.SavedMetricImageStorageRecord.saved_metric_id.in_(
+                    list(image_ids.keys())
+                )
+            )
+        }
+        for saved_metric_id, (image_id, small_image_id) in image_ids.items():
+            record = records.get(saved_metric_id)
             if record is None:
                 session.add(
-                    SM.SavedMetricStorageRecord.from_model_instance(saved_metric)
+                    SM.SavedMetricImageStorageRecord(
+                        saved_metric_id=saved_metric_id,
+                        image_id=image_id,
+                        small_image_id=small_image_id,
+                    )
                 )
-                session.commit()
-                return
-
-            record.update(saved_metric)
+            else:
+                record.image_id = image_id
+                record.small_image_id = small_image_id
+        session.flush()
+        self._remove_unreferenced_images(session)
+
+    def _remove_unreferenced_images(self, session: SA.orm.Session):
+        session.query(SM.ImageStorageRecord).filter(
+            ~SM.ImageStorageRecord.image_id.in_(
+                session.query(SM.SavedMetricImageStorageRecord.image_id)
+            )
+            & ~SM.ImageStorageRecord.image_id.in_(
+                session.query(SM.SavedMetricImageStorageRecord.small_image_id)
+            )
+        ).delete(synchronize_session=False)
 
-            session.commit()
+    def get_image(self, image_id: str) -> Optional[str]:
+        with self._new_db_session(read_only=True) as session:
+            record = session.query(SM.ImageStorageRecord).get(image_id)
+            return record.content if record is not None else None
 
     def get_saved_metric(self, metric_id: str) -> WM.SavedMetric:
-        with self._new_db_session() as session:
-            record = (
-                session.query(SM.SavedMetricStorageRecord)
-                .filter(SM.SavedMetricStorageRecord.saved_metric_id == metric_id)
-                .first()
+        saved_metrics = self.get_saved_metrics([metric_id])
+        if len(saved_metrics) == 0:
+            raise ValueError(f"Saved metric is not found with id {metric_id}")
+        return saved_metrics[0]
+
+    def get_saved_metrics(
+        self, metric_ids: List[str], with_images: bool = True
+    ) -> List[WM.SavedMetric]:
+        """
+        Returns the existing saved metrics in the order of the ids, the metrics of the same project
+        share the same Project instance.
+        Without images the image fields contain the URLs of the images instead of their content.
+        """
+        with self._new_db_session(read_only=True) as session:
+            saved_metrics = self._get_saved_metrics(metric_ids, session, with_images)
+            return [
+                saved_metrics[metric_id]
+                for metric_id in metric_ids
+                if metric_id in saved_metrics
+            ]
+
+    def _get_saved_metrics(
+        self, metric_ids: List[str], session: SA.orm.Session, with_images: bool
+    ) -> Dict[str, WM.SavedMetric]:
+        if len(metric_ids) == 0:
+            return {}
+        rows = (
+            session.query(SM.SavedMetricStorageRecord, SM.SavedMetricImageStorageRecord)
+            .outerjoin(
+                SM.SavedMetricImageStorageRecord,
+                SM.SavedMetricImageStorageRecord.saved_metric_id
+                == SM.SavedMetricStorageRecord.saved_metric_id,
             )
-            if record is None:
-                raise ValueError(f"Saved metric is not found with id {metric_id}")
-
-        project = self.get_project(record.project_id)
-        return record.as_model_instance(project)
+            .options(
+                SA.orm.defer(SM.SavedMetricStorageRecord.image_base64),
+                SA.orm.defer(SM.SavedMetricStorageRecord.small_image_base64),
+            )
+            .filter(SM.SavedMetricStorageRecord.saved_metric_id.in_(set(metric_ids)))
+            .all()
+        )
+        projects = self._get_projects([rec.project_id for rec, _ in rows], session)
+
+        contents: Dict[str, str] = {}
+        if with_images:
+            contents = {
+                image.image_id: image.content
+                for image in session.query(SM.ImageStorageRecord).filter(
+                    SM.ImageStorageRecord.image_id.in_(
+                        {img.image_id for _, img in rows if img is not None}
+                        | {img.small_image_id for _, img in rows if img is not None}
+                    )
+                )
+            }
+
+        result = {}
+        for record, images in rows:
+            image_pair: Optional[Tuple[str, str]] = None
+            if images is not None:
+                # records stored before the images table keep their images inline
+                image_pair = (
+                    (contents[images.image_id], contents[images.small_image_id])
+                    if with_images
+                    else (
+                        create_image_url(images.image_id),
+                        create_image_url(images.small_image_id),
+                    )
+                )
+            result[record.saved_metric_id] = record.as_model_instance(
+                self._find_by_id(projects, record.project_id, "Project"), image_pair
+            )
+        return result
 
     def clear_saved_metric(self, metric_id: str):
         with self._new_db_session() as session:
@@ -534,10 +1189,12 @@ class MitzuStorage:
             )
             if record is not None:
                 session.delete(record)
+                session.flush()
+                self._remove_unreferenced_images(session)
                 session.commit()
 
     def list_saved_metrics(self) -> List[str]:
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             result = []
             for record in session.query(SM.SavedMetricStorageRecord):
                 result.append(record.saved_metric_id)
@@ -545,32 +1202,67 @@ class MitzuStorage:
 
     def list_dashboards(self) -> List[str]:
         result = []
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             for record in session.query(SM.DashboardStorageRecord):
                 result.append(record.dashboard_id)
             return result
 
-    def get_dashboard(self, dashboard_id: str) -> WM.Dashboard:
-        with self._new_db_session() as session:
-            record = (
+    def get_dashboard(
+        self, dashboard_id: str, with_images: bool = True
+    ) -> WM.Dashboard:
+        dashboards = self.get_dashboards([dashboard_id], with_images)
+        if len(dashboards) == 0:
+            raise ValueError(f"Dashboard is not found with id {dashboard_id}")
+        return dashboards[0]
+
+    def get_dashboards(
+        self, dashboard_ids: List[str], with_images: bool = True
+    ) -> List[WM.Dashboard]:
+        """
+        Returns the existing dashboards in the order of the ids with their saved metrics and projects.
+        The number of queries doesn't depend on the number of dashboards or dashboard metrics.
+        """
+        if len(dashboard_ids) == 0:
+            return []
+        with self._new_db_session(read_only=True) as session:
+            records = (
                 session.query(SM.DashboardStorageRecord)
-                .filter(SM.DashboardStorageRecord.dashboard_id == dashboard_id)
-                .first()
+                .filter(SM.DashboardStorageRecord.dashboard_id.in_(set(dashboard_ids)))
+                .all()
             )
-            if record is None:
-                raise ValueError(f"Dashboard is not found with id {dashboard_id}")
-
             dashboard_metric_records = (
                 session.query(SM.DashboardMetricStorageRecord)
-                .filter(SM.DashboardMetricStorageRecord.dashboard_id == dashboard_id)
+                .filter(
+                    SM.DashboardMetricStorageRecord.dashboard_id.in_(
+                        [record.dashboard_id for record in records]
+                    )
+                )
                 .all()
             )
-            dashboard_metrics = []
+            saved_metrics = self._get_saved_metrics(
+                list({dm.saved_metric_id for dm in dashboard_metric_records}),
+                session,
+                with_images,
+            )
+
+            dashboard_metrics: Dict[str, List[WM.DashboardMetric]] = {}
             for dm in dashboard_metric_records:
-                sm = self.get_saved_metric(dm.saved_metric_id)
-                dashboard_metrics.append(dm.as_model_instance(sm))
+                sm = self._find_by_id(saved_metrics, dm.saved_metric_id, "Saved metric")
+                dashboard_metrics.setdefault(dm.dashboard_id, []).append(
+                    dm.as_model_instance(sm)
+                )
 
-            return record.as_model_instance(dashboard_metrics)
+            dashboards = {
+                record.dashboard_id: record.as_model_instance(
+                    dashboard_metrics.get(record.dashboard_id, [])
+                )
+                for record in records
+            }
+            return [
+                dashboards[dashboard_id]
+                for dashboard_id in dashboard_ids
+                if dashboard_id in dashboards
+            ]
 
     def set_dashboard(self, dashboard_id: str, dashboard: WM.Dashboard):
         with self._new_db_session() as session:
@@ -621,6 +1313,53 @@ class MitzuStorage:
                 session.delete(record)
                 session.commit()
 
+    def set_dashboard_schedule(self, schedule: WM.DashboardSchedule):
+        with self._new_db_session() as session:
+            record = (
+                session.query(SM.DashboardScheduleStorageRecord)
+                .filter(
+                    SM.DashboardScheduleStorageRecord.dashboard_id
+                    == schedule.dashboard_id
+                )
+                .first()
+            )
+            if record is None:
+                session.add(
+                    SM.DashboardScheduleStorageRecord.from_model_instance(schedule)
+                )
+            else:
+                record.update(schedule)
+            session.commit()
+
+    def get_dashboard_schedule(
+        self, dashboard_id: str
+    ) -> Optional[WM.DashboardSchedule]:
+        with self._new_db_session(read_only=True) as session:
+            record = (
+                session.query(SM.DashboardScheduleStorageRecord)
+                .filter(SM.DashboardScheduleStorageRecord.dashboard_id == dashboard_id)
+                .first()
+            )
+            return record.as_model_instance() if record is not None else None
+
+    def list_dashboard_schedules(self) -> List[WM.DashboardSchedule]:
+        with self._new_db_session(read_only=True) as session:
+            return [
+                record.as_model_instance()
+                for record in session.query(SM.DashboardScheduleStorageRecord)
+            ]
+
+    def clear_dashboard_schedule(self, dashboard_id: str):
+        with self._new_db_session() as session:
+            record = (
+                session.query(SM.DashboardScheduleStorageRecord)
+                .filter(SM.DashboardScheduleStorageRecord.dashboard_id == dashboard_id)
+                .first()
+            )
+            if record is not None:
+                session.delete(record)
+                session.commit()
+
     def set_user(self, user: WM.User):
         with self._new_db_session() as session:
             record = (
@@ -637,7 +1376,7 @@ class MitzuStorage:
             session.commit()
 
     def get_user_by_id(self, user_id: str) -> Optional[WM.User]:
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             record = (
                 session.query(SM.UserStorageRecord)
                 .filter(SM.UserStorageRecord.user_id == user_id)
@@ -650,7 +1389,7 @@ class MitzuStorage:
 
     def list_users(self) -> List[WM.User]:
         result = []
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             for record in session.query(SM.UserStorageRecord):
                 result.append(record.as_model_instance())
             return result
@@ -667,12 +1406,15 @@ class MitzuStorage:
                 session.commit()
 
     def health_check(self):
-        with self._new_db_session() as session:
-            session.execute("select 1")
+        self.__create_engine_when_needed()
+        for engine in [self._engine, self._read_engine]:
+            if engine is not None:
+                with engine.connect() as connection:
+                    connection.execute(SA.text("select 1"))
 
     def get_onboarding_flows(self) -> List[SM.OnboardingFlowStateStorageRecord]:
         result = []
-        with self._new_db_session() as session:
+        with self._new_db_session(read_only=True) as session:
             for record in session.query(SM.OnboardingFlowStateStorageRecord).all():
                 result.append(record.as_model_instance())
 
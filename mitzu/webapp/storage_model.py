@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import json
 import base64
+import hashlib
 import pickle
 import io
 
@@ -261,16 +262,20 @@ class ProjectStorageRecord(Base):
 
     project_id = SA.Column(SA.String, primary_key=True)
     connection_id = SA.Column(
-        SA.String, SA.ForeignKey(ConnectionStorageRecord.connection_id)
+        SA.String, SA.ForeignKey(ConnectionStorageRecord.connection_id), index=True
     )
     name = SA.Column(SA.String)
 
     event_data_tables: List[EventDataTableStorageRecord] = []
     discovery_settings_id = SA.Column(
-        SA.String, SA.ForeignKey(DiscoverySettingsStorageRecord.discovery_settings_id)
+        SA.String,
+        SA.ForeignKey(DiscoverySettingsStorageRecord.discovery_settings_id),
+        index=True,
     )
     webapp_settings_id = SA.Column(
-        SA.String, SA.ForeignKey(WebappSettingsStorageRecord.webapp_settings_id)
+        SA.String,
+        SA.ForeignKey(WebappSettingsStorageRecord.webapp_settings_id),
+        index=True,
     )
     description = SA.Column(SA.String, nullable=True, default=None)
 
@@ -320,12 +325,30 @@ class ProjectStorageRecord(Base):
         )
 
 
+class ProjectVersionStorageRecord(Base):
+    """
+    Incremented on every change of a project, its connection or its event definitions.
+    Kept in a separate table so existing storages get it without altering the projects table.
+    """
+
+    __tablename__ = "project_versions"
+
+    project_id = SA.Column(
+        SA.String,
+        SA.ForeignKey(ProjectStorageRecord.project_id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    version = SA.Column(SA.Integer, nullable=False, default=0)
+
+
 class EventDataTableStorageRecord(Base):
     __tablename__ = "event_data_tables"
 
     event_data_table_id = SA.Column(SA.String, primary_key=True)
     project_id = SA.Column(
-        SA.String, SA.ForeignKey(ProjectStorageRecord.project_id, ondelete="CASCADE")
+        SA.String,
+        SA.ForeignKey(ProjectStorageRecord.project_id, ondelete="CASCADE"),
+        index=True,
     )
 
     table_name = SA.Column(SA.String)
@@ -345,6 +368,7 @@ class EventDataTableStorageRecord(Base):
         SA.String,
         SA.ForeignKey(DiscoverySettingsStorageRecord.discovery_settings_id),
         nullable=True,
+        index=True,
     )
 
     def update(self, edt: M.EventDataTable):
@@ -439,17 +463,32 @@ class EventDefStorageRecord(Base):
         SA.ForeignKey(
             EventDataTableStorageRecord.event_data_table_id, ondelete="CASCADE"
         ),
+        index=True,
     )
     event_name = SA.Column(SA.String)
-    fields = SA.Column(SA.String)
+    # Legacy JSON serialized fields, new records store them in EventFieldStorageRecords
+    fields = SA.Column(SA.String, nullable=True)
 
     def as_model_instance(
         self,
         edt: M.EventDataTable,
+        field_defs: Optional[List[M.EventFieldDef]] = None,
     ) -> M.EventDef:
-        fields_dict = json.loads(self.fields)
+        if self.fields is not None:
+            field_defs = self.__deserialize_legacy_fields(edt)
+
+        return M.EventDef(
+            _id=self.id,
+            _event_name=self.event_name,
+            _fields=field_defs if field_defs is not None else [],
+            _event_data_table=edt,
+        )
+
+    def __deserialize_legacy_fields(
+        self, edt: M.EventDataTable
+    ) -> List[M.EventFieldDef]:
         fields: List[M.EventFieldDef] = []
-        for field_def in fields_dict:
+        for field_def in json.loads(self.fields):
             fields.append(
                 M.EventFieldDef(
                     _event_name=field_def["_event_name"],
@@ -458,38 +497,124 @@ class EventDefStorageRecord(Base):
                     _enums=field_def["_enums"],
                 )
             )
-
-        return M.EventDef(
-            _id=self.id,
-            _event_name=self.event_name,
-            _fields=fields,
-            _event_data_table=edt,
-        )
+        return fields
 
     @classmethod
     def from_model_instance(
         self, event_data_table_id: str, event_def: M.EventDef
     ) -> EventDefStorageRecord:
-        fields = []
-        for field_def in event_def._fields:
-            if field_def._field._sub_fields:
-                raise ValueError("Only leaf nodes can be serialized")
-            fields.append(
-                {
-                    "_event_name": field_def._event_name,
-                    "_field": serialize_field(field_def._field),
-                    "_event_data_table_id": field_def._event_data_table.id,
-                    "_enums": field_def._enums,
-                }
-            )
         return EventDefStorageRecord(
             id=event_def.get_id(),
             event_data_table_id=event_data_table_id,
             event_name=event_def._event_name,
-            fields=json.dumps(fields),
+            fields=None,
         )
 
 
+class EventFieldStorageRecord(Base):
+    __tablename__ = "discovered_event_fields"
+
+    event_def_id = SA.Column(
+        SA.String,
+        SA.ForeignKey(EventDefStorageRecord.id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    position = SA.Column(SA.Integer, primary_key=True)
+    event_data_table_id = SA.Column(SA.String, index=True)
+    # Serialized field with its parents
+    field = SA.Column(SA.String)
+    has_enums = SA.Column(SA.Boolean)
+
+    def as_model_instance(
+        self, edt: M.EventDataTable, event_name: str, enums: List[Any]
+    ) -> M.EventFieldDef:
+        return M.EventFieldDef(
+            _event_name=event_name,
+            _field=deserialize_field(json.loads(self.field)),
+            _event_data_table=edt,
+            _enums=enums if self.has_enums else None,
+        )
+
+    @classmethod
+    def from_model_instance(
+        self, event_def_id: str, position: int, field_def: M.EventFieldDef
+    ) -> EventFieldStorageRecord:
+        if field_def._field._sub_fields:
+            raise ValueError("Only leaf nodes can be serialized")
+        return EventFieldStorageRecord(
+            event_def_id=event_def_id,
+            position=position,
+            event_data_table_id=field_def._event_data_table.id,
+            field=json.dumps(serialize_field(field_def._field)),
+            has_enums=field_def._enums is not None,
+        )
+
+
+class EventFieldEnumStorageRecord(Base):
+    __tablename__ = "discovered_event_field_enums"
+
+    event_def_id = SA.Column(
+        SA.String,
+        SA.ForeignKey(EventDefStorageRecord.id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    field_position = SA.Column(SA.Integer, primary_key=True)
+    position = SA.Column(SA.Integer, primary_key=True)
+    event_data_table_id = SA.Column(SA.String, index=True)
+    # JSON serialized value to keep its type
+    value = SA.Column(SA.String)
+
+    @classmethod
+    def create_mappings(
+        self, event_def_id: str, field_position: int, field_def: M.EventFieldDef
+    ) -> List[Dict[str, Any]]:
+        """Returns the rows of the enum values of an event field for bulk inserts"""
+        return [
+            {
+                "event_def_id": event_def_id,
+                "field_position": field_position,
+                "position": position,
+                "event_data_table_id": field_def._event_data_table.id,
+                "value": json.dumps(value),
+            }
+            for position, value in enumerate(field_def._enums or [])
+        ]
+
+
+class TableColumnsStorageRecord(Base):
+    __tablename__ = "event_data_table_columns"
+
+    event_data_table_id = SA.Column(
+        SA.String,
+        SA.ForeignKey(
+            EventDataTableStorageRecord.event_data_table_id, ondelete="CASCADE"
+        ),
+        primary_key=True,
+    )
+    # The columns are only valid for the table they were reflected from
+    full_table_name = SA.Column(SA.String)
+    columns = SA.Column(SA.String)
+
+    def update(self, edt: M.EventDataTable, columns: List[Tuple[str, Any]]):
+        self.full_table_name = TableColumnsStorageRecord.get_full_table_name(edt)
+        self.columns = base64.urlsafe_b64encode(pickle.dumps(columns)).decode()
+
+    def as_model_instance(self) -> List[Tuple[str, Any]]:
+        return pickle.loads(base64.urlsafe_b64decode(self.columns))
+
+    @classmethod
+    def get_full_table_name(self, edt: M.EventDataTable) -> str:
+        return f"{edt.catalog}.{edt.schema}.{edt.table_name}"
+
+    @classmethod
+    def from_model_instance(
+        self, edt: M.EventDataTable, columns: List[Tuple[str, Any]]
+    ) -> TableColumnsStorageRecord:
+        rec = TableColumnsStorageRecord(event_data_table_id=edt.id)
+        rec.update(edt, columns)
+        return rec
+
+
 class SavedMetricStorageRecord(Base):
     __tablename__ = "saved_metrics"
 
@@ -497,6 +622,7 @@ class SavedMetricStorageRecord(Base):
     project_id = SA.Column(
         SA.String,
         SA.ForeignKey(ProjectStorageRecord.project_id, ondelete="CASCADE"),
+        index=True,
     )
     name = SA.Column(SA.String)
     description = SA.Column(SA.String)
@@ -517,20 +643,28 @@ class SavedMetricStorageRecord(Base):
         self.name = saved_metric.name
         self.description = saved_metric.description
         self.chart = json.dumps(chart_dict)
-        self.image_base64 = saved_metric.image_base64
-        self.small_image_base64 = saved_metric.small_base64
+        # the images are stored in the images table, the columns are kept for the already stored records
+        self.image_base64 = None
+        self.small_image_base64 = None
         self.created_at = saved_metric.created_at
         self.last_updated_at = saved_metric.last_updated_at
         self.owner = saved_metric.owner
         self.metric_json = saved_metric.metric_json
 
-    def as_model_instance(self, project: M.Project) -> WM.SavedMetric:
+    def as_model_instance(
+        self, project: M.Project, images: Optional[Tuple[str, str]] = None
+    ) -> WM.SavedMetric:
+        image_base64, small_base64 = (
+            images
+            if images is not None
+            else (self.image_base64, self.small_image_base64)
+        )
         return WM.SavedMetric(
             name=self.name,
             id=self.saved_metric_id,
             chart=self.__simple_chart_from_dict(json.loads(self.chart)),
-            image_base64=self.image_base64,
-            small_base64=self.small_image_base64,
+            image_base64=image_base64,
+            small_base64=small_base64,
             project=project,
             metric_json=self.metric_json,
             owner=self.owner,
@@ -583,8 +717,6 @@ class SavedMetricStorageRecord(Base):
             name=saved_metric.name,
             description=saved_metric.description,
             chart=json.dumps(chart_dict),
-            image_base64=saved_metric.image_base64,
-            small_image_base64=saved_metric.small_base64,
             created_at=saved_metric.created_at,
             last_updated_at=saved_metric.last_updated_at,
             owner=saved_metric.owner,
@@ -592,6 +724,37 @@ class SavedMetricStorageRecord(Base):
         )
 
 
+class ImageStorageRecord(Base):
+    """
+    Content addressed image store, the same image is stored only once
+    """
+
+    __tablename__ = "images"
+
+    image_id = SA.Column(SA.String, primary_key=True)
+    content = SA.Column(SA.String)
+
+    @classmethod
+    def create_image_id(self, content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+
+class SavedMetricImageStorageRecord(Base):
+    __tablename__ = "saved_metric_images"
+
+    saved_metric_id = SA.Column(
+        SA.String,
+        SA.ForeignKey(SavedMetricStorageRecord.saved_metric_id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    image_id = SA.Column(
+        SA.String, SA.ForeignKey(ImageStorageRecord.image_id), index=True
+    )
+    small_image_id = SA.Column(
+        SA.String, SA.ForeignKey(ImageStorageRecord.image_id), index=True
+    )
+
+
 class DashboardStorageRecord(Base):
     __tablename__ = "dashboards"
 
@@ -637,10 +800,12 @@ class DashboardMetricStorageRecord(Base):
     dashboard_id = SA.Column(
         SA.String,
         SA.ForeignKey(DashboardStorageRecord.dashboard_id, ondelete="CASCADE"),
+        index=True,
     )
     saved_metric_id = SA.Column(
         SA.String,
         SA.ForeignKey(SavedMetricStorageRecord.saved_metric_id, ondelete="CASCADE"),
+        index=True,
     )
 
     x = SA.Column(SA.Integer)
@@ -673,6 +838,39 @@ class DashboardMetricStorageRecord(Base):
         )
 
 
+class DashboardScheduleStorageRecord(Base):
+    __tablename__ = "dashboard_schedules"
+
+    dashboard_id = SA.Column(
+        SA.String,
+        SA.ForeignKey(DashboardStorageRecord.dashboard_id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    cron = SA.Column(SA.String)
+    last_run_at = SA.Column(SA.DateTime, nullable=True)
+
+    def update(self, schedule: WM.DashboardSchedule):
+        self.cron = schedule.cron
+        self.last_run_at = schedule.last_run_at
+
+    def as_model_instance(self) -> WM.DashboardSchedule:
+        return WM.DashboardSchedule(
+            dashboard_id=self.dashboard_id,
+            cron=self.cron,
+            last_run_at=self.last_run_at,
+        )
+
+    @classmethod
+    def from_model_instance(
+        self, schedule: WM.DashboardSchedule
+    ) -> DashboardScheduleStorageRecord:
+        return DashboardScheduleStorageRecord(
+            dashboard_id=schedule.dashboard_id,
+            cron=schedule.cron,
+            last_run_at=schedule.last_run_at,
+        )
+
+
 class OnboardingFlowStateStorageRecord(Base):
     __tablename__ = "onboarding_flow_states"
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import base64
 from typing import Optional, cast
 
 import dash.development.base_component as bc
@@ -16,6 +17,7 @@ import mitzu.webapp.dependencies as DEPS
 import mitzu.webapp.storage as S
 import mitzu.webapp.offcanvas as OC
 import mitzu.webapp.pages.explore.explore_page as EXP
+import mitzu.webapp.pages.explore.table_handler as TAB
 import mitzu.webapp.pages.paths as P
 import mitzu.webapp.service.user_service as US
 from mitzu.helper import LOGGER
@@ -29,6 +31,7 @@ MDB_CSS = "https://cdnjs.cloudflare.com/ajax/libs/mdb-ui-kit/6.0.1/mdb.min.css"
 DCC_DBC_CSS = (
     "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"
 )
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
 
 
 def create_webapp_layout() -> bc.Component:
@@ -46,6 +49,30 @@ def get_callback_manager(dependencies: DEPS.Dependencies) -> BaseLongCallbackMan
     return DiskcacheManager(cast(C.DiskMitzuCache, dependencies.queue).get_disk_cache())
 
 
+def create_image_response(image_id: str) -> flask.Response:
+    content = DEPS.Dependencies.get().storage.get_image(image_id)
+    if content is None:
+        return flask.Response(status=404)
+
+    mimetype = "text/plain"
+    data = content.encode()
+    if content.startswith("data:") and ";base64," in content:
+        header, encoded = content.split(",", 1)
+        mimetype = header.split(":", 1)[1].split(";")[0]
+        data = base64.b64decode(encoded)
+
+    response = flask.Response(data, mimetype=mimetype)
+    # the images are content addressed, so they never change,
+    # but they show private data, so only the browser of the user may keep them
+    response.set_etag(image_id)
+    response.cache_control.private = True
+    response.cache_control.max_age = IMAGE_CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    # answers with 304 Not Modified if the browser has the image already
+    response.make_conditional(flask.request)
+    return response
+
+
 def create_dash_app(dependencies: Optional[DEPS.Dependencies] = None) -> Dash:
     server = flask.Flask(__name__)
     if dependencies is None:
@@ -121,6 +148,14 @@ def create_dash_app(dependencies: Optional[DEPS.Dependencies] = None) -> Dash:
     app._favicon = configs.DASH_FAVICON_PATH
     app.layout = create_webapp_layout()
 
+    @server.route(P.SAVED_METRIC_IMAGES_PATH)
+    def saved_metric_image(image_id: str):
+        return create_image_response(image_id)
+
+    @server.route(P.METRIC_RESULT_CSV_PATH)
+    def metric_result_csv(hash_key: str):
+        return TAB.create_csv_response(hash_key)
+
     @server.route(P.HEALTHCHECK_PATH)
     def healthcheck():
         dependencies = DEPS.Dependencies.get()
@@ -0,0 +1,90 @@
+import argparse
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+import mitzu.model as M
+import mitzu.webapp.cache_codec as CC
+from mitzu.samples.data_ingestion import create_and_ingest_sample_project
+
+CODECS: Dict[str, CC.CacheCodec] = {
+    "pickle": CC.PickleCodec(),
+    "arrow": CC.ArrowCodec(compression=None),
+    "arrow_zstd": CC.ArrowCodec(compression="zstd"),
+    "arrow_lz4": CC.ArrowCodec(compression="lz4"),
+}
+
+
+def create_result_dfs(
+    event_count: int, number_of_users: int
+) -> Dict[str, pd.DataFrame]:
+    connection = M.Connection(
+        connection_name="Sample connection",
+        connection_type=M.ConnectionType.SQLITE,
+        host="sample_project",
+    )
+    project = create_and_ingest_sample_project(
+        connection,
+        event_count=event_count,
+        number_of_users=number_of_users,
+        schema="main",
+        overwrite_records=True,
+        seed=1000,
+    )
+    m = project.discover_project().create_notebook_class_model()
+    config = dict(
+        start_dt="2021-01-01", end_dt="2023-01-01", time_group=M.TimeGroup.DAY
+    )
+    return {
+        "segmentation": m.page_visit.config(
+            group_by=m.page_visit.domain, **config
+        ).get_df(),
+        "conversion": (m.page_visit >> m.checkout)
+        .config(group_by=m.page_visit.domain, **config)
+        .get_df(),
+        "retention": (m.page_visit >= m.checkout)
+        .config(
+            group_by=m.page_visit.domain,
+            start_dt="2021-01-01",
+            end_dt="2023-01-01",
+            time_group=M.TimeGroup.WEEK,
+        )
+        .get_df(),
+    }
+
+
+def measure(codec: CC.CacheCodec, df: pd.DataFrame, repeat: int) -> List[float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        data = codec.encode(df)
+    encoded = time.perf_counter()
+    for _ in range(repeat):
+        codec.decode(data)
+    decoded = time.perf_counter()
+    return [
+        len(data),
+        (encoded - start) / repeat * 1000,
+        (decoded - encoded) / repeat * 1000,
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Compare the cache codecs on metric results")
+    parser.add_argument("--event-count", type=int, default=200000)
+    parser.add_argument("--user-count", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = []
+    for metric_type, df in create_result_dfs(args.event_count, args.user_count).items():
+        for codec_name, codec in CODECS.items():
+            size, put_ms, get_ms = measure(codec, df, args.repeat)
+            rows.append([metric_type, len(df), codec_name, size, put_ms, get_ms])
+
+    print(
+        pd.DataFrame(
+            rows,
+            columns=["metric", "rows", "codec", "bytes", "put_ms", "get_ms"],
+        ).to_string(index=False, float_format="{:.3f}".format)
+    )
@@ -0,0 +1,126 @@
+import argparse
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import mitzu.adapters.generic_adapter as GA
+import mitzu.model as M
+import mitzu.visualization.charts as CHRT
+import mitzu.visualization.plot as PLT
+from mitzu.samples.data_ingestion import create_and_ingest_sample_project
+
+GROUP_COUNT = 10
+
+
+def create_metrics() -> Dict[str, M.Metric]:
+    connection = M.Connection(
+        connection_name="Sample connection",
+        connection_type=M.ConnectionType.SQLITE,
+        host="visualization_benchmark",
+    )
+    project = create_and_ingest_sample_project(
+        connection,
+        event_count=10000,
+        number_of_users=100,
+        schema="main",
+        overwrite_records=True,
+        seed=1000,
+    )
+    m = project.discover_project().create_notebook_class_model()
+    config = dict(
+        start_dt="2021-01-01",
+        end_dt="2023-01-01",
+        time_group=M.TimeGroup.DAY,
+        chart_type=M.SimpleChartType.BAR,
+    )
+    return {
+        "segmentation": m.page_visit.group_by(m.page_visit.domain).config(**config),
+        "conversion": (m.page_visit.group_by(m.page_visit.domain) >> m.checkout).config(
+            **config
+        ),
+        "retention": (m.page_visit >= m.checkout).config(
+            start_dt="2021-01-01",
+            end_dt="2023-01-01",
+            time_group=M.TimeGroup.DAY,
+            retention_window="1 day",
+            chart_type=M.SimpleChartType.HEATMAP,
+        ),
+    }
+
+
+def create_result_df(metric_type: str, rows: int) -> pd.DataFrame:
+    """Creates a metric result with the columns of the adapters and random values"""
+    rng = np.random.default_rng(1000)
+    if metric_type == "retention":
+        periods = 10
+        dates = pd.date_range("2000-01-01", periods=rows // periods, freq="D")
+        return pd.DataFrame(
+            {
+                GA.DATETIME_COL: np.repeat(dates, periods),
+                GA.RETENTION_INDEX: np.tile(np.arange(periods), len(dates)),
+                GA.GROUP_COL: None,
+                f"{GA.USER_COUNT_COL}_1": rng.integers(1, 1000, len(dates) * periods),
+                f"{GA.USER_COUNT_COL}_2": rng.integers(1, 1000, len(dates) * periods),
+                GA.AGG_VALUE_COL: rng.random(len(dates) * periods) * 100,
+            }
+        )
+
+    dates = pd.date_range("2000-01-01", periods=rows // GROUP_COUNT, freq="D")
+    size = len(dates) * GROUP_COUNT
+    columns = {
+        GA.DATETIME_COL: np.repeat(dates, GROUP_COUNT),
+        GA.GROUP_COL: np.tile([f"group_{i}" for i in range(GROUP_COUNT)], len(dates)),
+    }
+    if metric_type == "segmentation":
+        columns[GA.AGG_VALUE_COL] = rng.integers(0, 10000, size)
+    else:
+        for step in [1, 2]:
+            columns[f"{GA.USER_COUNT_COL}_{step}"] = rng.integers(1, 1000, size)
+            columns[f"{GA.AGG_VALUE_COL}_{step}"] = rng.random(size) * 100
+    return pd.DataFrame(columns)
+
+
+def measure(
+    metric: M.Metric, df: pd.DataFrame, repeat: int
+) -> Tuple[float, float, float]:
+    chart_times: List[float] = []
+    plot_times: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        simple_chart = CHRT.get_simple_chart(metric, df.copy())
+        charted = time.perf_counter()
+        fig = PLT.plot_chart(simple_chart, metric)
+        plotted = time.perf_counter()
+        chart_times.append(charted - start)
+        plot_times.append(plotted - charted)
+    return (
+        sum(chart_times) / repeat * 1000,
+        sum(plot_times) / repeat * 1000,
+        # the size of the figure sent to the browser
+        len(fig.to_json()) / 1024,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        "Measure preparing and plotting the charts of large metric results"
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    result = []
+    for metric_type, metric in create_metrics().items():
+        for rows in args.rows:
+            df = create_result_df(metric_type, rows)
+            chart_ms, plot_ms, figure_kb = measure(metric, df, args.repeat)
+            result.append([metric_type, len(df), chart_ms, plot_ms, figure_kb])
+
+    print(
+        pd.DataFrame(
+            result,
+            columns=["metric", "rows", "chart_ms", "plot_ms", "figure_kb"],
+        ).to_string(index=False, float_format="{:.1f}".format)
+    )
@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+
+import mitzu.adapters.generic_adapter as GA
+import mitzu.model as M
+import mitzu.visualization.charts as CHRT
+import mitzu.visualization.common as C
+import mitzu.visualization.downsampling as DS
+import mitzu.visualization.plot as PLT
+from tests.unit.webapp.fixtures import discovered_project  # noqa: F401
+
+
+def test_labels_of_large_results_are_formatted_column_wise(
+    discovered_project: M.DiscoveredProject,  # noqa: F811
+):
+    m = discovered_project.create_notebook_class_model()
+    config = dict(
+        start_dt="2021-01-01",
+        end_dt="2023-01-01",
+        time_group=M.TimeGroup.DAY,
+        chart_type=M.SimpleChartType.BAR,
+    )
+    dates = pd.date_range("2000-01-01", periods=1000, freq="D")
+    groups = ["a", "b", "", None, "e"]
+    rng = np.random.default_rng(1)
+
+    segmentation = m.page_visit.group_by(m.page_visit.domain).config(**config)
+    chart = CHRT.get_simple_chart(
+        segmentation,
+        pd.DataFrame(
+            {
+                GA.DATETIME_COL: np.repeat(dates, len(groups)),
+                GA.GROUP_COL: groups * len(dates),
+                GA.AGG_VALUE_COL: rng.integers(0, 100, len(dates) * len(groups)),
+            }
+        ),
+    )
+    assert set(chart.dataframe[C.COLOR_COL]) == {"a", "b", "<no value>", "<n/a>", "e"}
+    fig = PLT.plot_chart(chart, segmentation)
+    assert sum(len(trace.x) for trace in fig.data) == 5000
+    assert fig.data[0].x[0] == "2000-01-01"
+
+    conversion = (m.page_visit.group_by(m.page_visit.domain) >> m.checkout).config(
+        **config
+    )
+    values = rng.random(len(dates)) * 100
+    chart = CHRT.get_simple_chart(
+        conversion,
+        pd.DataFrame(
+            {
+                GA.DATETIME_COL: dates,
+                GA.GROUP_COL: "a",
+                f"{GA.USER_COUNT_COL}_1": 10,
+                f"{GA.AGG_VALUE_COL}_1": 100.0,
+                f"{GA.USER_COUNT_COL}_2": 5,
+                f"{GA.AGG_VALUE_COL}_2": values,
+            }
+        ),
+    )
+    assert chart.dataframe[C.TEXT_COL].tolist() == [f"{val:.1f} %" for val in values]
+
+    retention = (m.page_visit >= m.checkout).config(
+        time_group=M.TimeGroup.TOTAL,
+        retention_window="1 week",
+        start_dt="2021-01-01",
+        end_dt="2021-03-01",
+    )
+    chart = CHRT.get_simple_chart(
+        retention,
+        pd.DataFrame(
+            {
+                GA.RETENTION_INDEX: [0, 1, 2],
+                GA.GROUP_COL: None,
+                f"{GA.USER_COUNT_COL}_1": [10, 10, 10],
+                f"{GA.USER_COUNT_COL}_2": [10, 4, 0],
+                GA.AGG_VALUE_COL: [100.0, 40.0, 0.0],
+            }
+        ),
+    )
+    assert chart.dataframe[C.TEXT_COL].tolist() == ["100.0%", "40.0%", ""]
+    assert C.retention_period_label(
+        chart.dataframe[C.X_AXIS_COL], retention
+    ).tolist() == [
+        "0 to 1 week",
+        "1 to 2 week",
+        "2 to 3 week",
+    ]
+    # only the heatmaps need the formatted tooltips
+    assert C.TOOLTIP_COL not in chart.dataframe.columns
+
+
+def test_numbers_are_formatted_with_array_operations():
+    values = pd.Series([0.04, -0.04, -1.25, 12.96, np.nan, 3, 100.0])
+    assert C.format_numbers(values, suffix="%").tolist() == [
+        "0.0%",
+        "-0.0%",
+        "-1.2%",
+        "13.0%",
+        "nan%",
+        "3.0%",
+        "100.0%",
+    ]
+    assert C.format_numbers(pd.Series([1.5, 0.01]), decimals=2).tolist() == [
+        "1.50",
+        "0.01",
+    ]
+    assert C.format_numbers(pd.Series([2.4, 1e30]), decimals=0).tolist() == [
+        "2",
+        "1e+30",
+    ]
+
+
+def test_lttb_keeps_the_shape_of_the_series():
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 10
+
+    indices = DS.lttb_indices(x, y, 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == 9999
+    assert 4321 in indices
+    assert (np.diff(indices) > 0).all()
+
+    assert DS.lttb_indices(x[:100], y[:100], 500).tolist() == list(range(100))
+
+
+def test_dense_time_series_are_downsampled(
+    discovered_project: M.DiscoveredProject,  # noqa: F811
+):
+    m = discovered_project.create_notebook_class_model()
+    dates = pd.date_range("2021-01-01", periods=20000, freq="T")
+    result_df = pd.DataFrame(
+        {
+            GA.DATETIME_COL: np.tile(dates, 2),
+            GA.GROUP_COL: np.repeat(["a", "b"], len(dates)),
+            GA.AGG_VALUE_COL: np.random.default_rng(1).integers(0, 100, 40000),
+        }
+    )
+
+    for chart_type in [M.SimpleChartType.LINE, M.SimpleChartType.STACKED_AREA]:
+        metric = m.page_visit.group_by(m.page_visit.domain).config(
+            start_dt="2021-01-01",
+            end_dt="2021-02-01",
+            time_group=M.TimeGroup.MINUTE,
+            chart_type=chart_type,
+        )
+        chart = CHRT.get_simple_chart(metric, result_df.copy())
+        pdf = chart.dataframe
+        assert pdf.groupby(C.COLOR_COL).size().to_dict() == {
+            "a": DS.MAX_POINTS_PER_SERIES,
+            "b": DS.MAX_POINTS_PER_SERIES,
+        }
+        assert pdf[C.X_AXIS_COL].min() == dates[0]
+        assert pdf[C.X_AXIS_COL].max() == dates[-1]
+        if chart_type == M.SimpleChartType.STACKED_AREA:
+            xs = pdf.groupby(C.COLOR_COL)[C.X_AXIS_COL].apply(set)
+            assert xs["a"] == xs["b"]
+        PLT.plot_chart(chart, metric)
+
+    # the bar charts are not downsampled
+    metric = m.page_visit.config(
+        start_dt="2021-01-01",
+        end_dt="2021-02-01",
+        time_group=M.TimeGroup.MINUTE,
+        chart_type=M.SimpleChartType.BAR,
+    )
+    chart = CHRT.get_simple_chart(metric, result_df.head(5000).copy())
+    assert chart.dataframe.shape[0] == 5000
+
+
+def test_dense_line_and_area_charts_are_drawn_with_webgl(
+    discovered_project: M.DiscoveredProject,  # noqa: F811
+):
+    m = discovered_project.create_notebook_class_model()
+    dates = pd.date_range("2021-01-01", periods=600, freq="H")
+    result_df = pd.DataFrame(
+        {
+            GA.DATETIME_COL: np.tile(dates, 3),
+            GA.GROUP_COL: np.repeat(["a", "b", "c"], len(dates)),
+            GA.AGG_VALUE_COL: np.repeat([1, 2, 3], len(dates)),
+        }
+    )
+
+    for chart_type in [M.SimpleChartType.LINE, M.SimpleChartType.STACKED_AREA]:
+        metric = m.page_visit.group_by(m.page_visit.domain).config(
+            start_dt="2021-01-01",
+            end_dt="2021-02-01",
+            time_group=M.TimeGroup.HOUR,
+            chart_type=chart_type,
+        )
+        fig = PLT.plot_chart(CHRT.get_simple_chart(metric, result_df.copy()), metric)
+        assert [trace.type for trace in fig.data] == ["scattergl"] * 3
+        assert all(trace.text is None and trace.mode == "lines" for trace in fig.data)
+
+        if chart_type == M.SimpleChartType.STACKED_AREA:
+            assert [trace.fill for trace in fig.data] == [
+                "tozeroy",
+                "tonexty",
+                "tonexty",
+            ]
+            # the groups are stacked on each other for every hour
+            assert [set(trace.y) for trace in fig.data] == [{3}, {5}, {6}]
+
+        sparse_fig = PLT.plot_chart(
+            CHRT.get_simple_chart(metric, result_df.head(300).copy()), metric
+        )
+        assert sparse_fig.data[0].type == "scatter"
+        assert sparse_fig.data[0].text is not None
+
+
+def test_figures_share_the_hover_templates_of_the_traces(
+    discovered_project: M.DiscoveredProject,  # noqa: F811
+):
+    m = discovered_project.create_notebook_class_model()
+    config = dict(start_dt="2021-01-01", end_dt="2023-01-01")
+    metrics = [
+        m.page_visit.group_by(m.page_visit.domain).config(**config),
+        (m.page_visit >> m.checkout).config(**config),
+        (m.page_visit >> m.checkout).config(
+            time_group=M.TimeGroup.TOTAL, chart_type=M.SimpleChartType.BAR, **config
+        ),
+        (m.page_visit >= m.checkout).config(
+            time_group=M.TimeGroup.TOTAL,
+            retention_window="1 week",
+            start_dt="2021-01-01",
+            end_dt="2021-03-01",
+            chart_type=M.SimpleChartType.LINE,
+        ),
+    ]
+    for metric in metrics:
+        chart = CHRT.get_simple_chart(metric, metric.get_df())
+        fig = PLT.plot_chart(chart, metric)
+        assert C.TOOLTIP_COL not in chart.dataframe.columns
+        for trace in fig.data:
+            assert trace.hovertemplate.endswith("<extra></extra>")
+            if trace.customdata is not None:
+                assert np.issubdtype(np.asarray(trace.customdata).dtype, np.number)
+
+    # dense heatmaps are sent without the empty annotations
+    retention = (m.page_visit >= m.checkout).config(
+        time_group=M.TimeGroup.DAY,
+        retention_window="1 day",
+        start_dt="2021-01-01",
+        end_dt="2021-03-01",
+        chart_type=M.SimpleChartType.HEATMAP,
+    )
+    dates = pd.date_range("2021-01-01", periods=60, freq="D")
+    result_df = pd.DataFrame(
+        {
+            GA.DATETIME_COL: np.repeat(dates, 10),
+            GA.RETENTION_INDEX: np.tile(np.arange(10), len(dates)),
+            GA.GROUP_COL: None,
+            f"{GA.USER_COUNT_COL}_1": 10,
+            f"{GA.USER_COUNT_COL}_2": 5,
+            GA.AGG_VALUE_COL: 50.0,
+        }
+    )
+    fig = PLT.plot_chart(CHRT.get_simple_chart(retention, result_df.copy()), retention)
+    assert fig.data[0].type == "heatmap"
+    assert len(fig.layout.annotations) == 0
+    assert "<b>Retention period: </b>0 to 1 day" in fig.data[0].hovertext[0][0]
+
+    fig = PLT.plot_chart(
+        CHRT.get_simple_chart(retention, result_df.head(100)), retention
+    )
+    assert len(fig.layout.annotations) == 100
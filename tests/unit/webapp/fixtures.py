@@ -9,12 +9,16 @@ import mitzu.webapp.service.navbar_service as NB
 import mitzu.webapp.service.secret_service as SS
 import mitzu.webapp.service.user_service as US
 import mitzu.webapp.service.notification_service as NS
+import mitzu.webapp.service.schema_catalog_service as SC
+import mitzu.webapp.service.cache_generation_service as CGS
+import mitzu.webapp.service.thumbnail_render_service as TRS
 import mitzu.model as M
 import mitzu.webapp.configs as configs
 from mitzu.webapp.cache import MitzuCache
 import flask
 from mitzu.samples.data_ingestion import create_and_ingest_sample_project
 from unittest.mock import MagicMock
+from concurrent.futures import ThreadPoolExecutor
 
 
 @dataclass(frozen=True)
@@ -48,7 +52,8 @@ class InMemoryCache(MitzuCache):
 def dependencies() -> DEPS.Dependencies:
     cache = InMemoryCache()
     queue = InMemoryCache()
-    storage = S.MitzuStorage()
+    cache_generation_service = CGS.CacheGenerationService(cache)
+    storage = S.MitzuStorage(cache_generations=cache_generation_service)
     storage.init_db_schema()
 
     evt_service = E.EventsService(storage)
@@ -77,6 +82,11 @@ def dependencies() -> DEPS.Dependencies:
         notification_service=NS.DummyNotificationService(),
         tracking_service=MagicMock(),
         onboarding_service=MagicMock(),
+        schema_catalog_service=SC.SchemaCatalogService(cache),
+        cache_generation_service=cache_generation_service,
+        thumbnail_render_service=TRS.ThumbnailRenderService(
+            storage, cache, executor_factory=ThreadPoolExecutor
+        ),
     )
 
 
@@ -2,10 +2,13 @@ from flask import Flask
 import mitzu.webapp.dependencies as DEPS
 import mitzu.webapp.model as WM
 import mitzu.model as M
+import mitzu.visualization.charts as CHRT
 import mitzu.visualization.common as C
 import pandas as pd
 import mitzu.webapp.pages.dashboards_page as DP
 import mitzu.webapp.pages.dashboards.manage_dashboards_component as MD
+import mitzu.webapp.pages.explore.graph_handler as GH
+import mitzu.webapp.service.dashboard_refresh_service as DRS
 
 from tests.helper import to_dict, find_component_by_id
 from unittest.mock import patch
@@ -179,3 +182,56 @@ def test_delete_saved_metric(
         new_dash = dependencies.storage.get_dashboard(dash.id)
 
         assert len(new_dash.dashboard_metrics) == 0
+
+
+def test_stale_dashboard_charts_are_refreshed_by_one_viewer(
+    server: Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    with server.test_request_context(), patch.object(
+        MD, "is_saved_metric_stale", return_value=True
+    ):
+        dash = create_test_dashboard(dependencies, discovered_project)
+        saved_metric = dash.dashboard_metrics[0].saved_metric
+        assert saved_metric is not None
+        metric = discovered_project.create_notebook_class_model().page_visit.config(
+            start_dt="2021-01-01", end_dt="2023-01-01"
+        )
+        saved_metric = WM.SavedMetric(
+            id=saved_metric.id,
+            name=saved_metric.name,
+            project=discovered_project.project,
+            image_base64="",
+            small_base64="",
+            metric=metric,
+            chart=CHRT.get_simple_chart(metric),
+            last_updated_at=saved_metric.last_updated_at,
+        )
+        dependencies.storage.set_saved_metric(saved_metric.id, saved_metric)
+        hash_key = GH.create_metric_hash_key(
+            metric,
+            dependencies.cache_generation_service.get_namespace(
+                discovered_project.project
+            ),
+        )
+
+        # e.g. another viewer of the dashboard is refreshing the chart
+        assert GH.start_revalidation(hash_key, dependencies.cache)
+        with patch.object(
+            DRS.DashboardRefreshService, "refresh_dashboards"
+        ) as refresh_dashboards:
+            figures, _, _ = MD.handle_dashboard_refresh(
+                lambda *args: None, dash.id, force_refresh=False
+            )
+            refresh_dashboards.assert_not_called()
+        assert len(figures) == 1
+
+        dependencies.cache.clear(hash_key + GH.REVALIDATING_SUFFIX)
+        MD.handle_dashboard_refresh(lambda *args: None, dash.id, force_refresh=False)
+        assert dependencies.cache.get(hash_key) is not None
+        assert dependencies.cache.get(hash_key + GH.REVALIDATING_SUFFIX) is None
+        assert (
+            dependencies.storage.get_saved_metric("test_sm").last_updated_at
+            > saved_metric.last_updated_at
+        )
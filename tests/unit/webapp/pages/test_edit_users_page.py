@@ -71,6 +71,9 @@ class RequestContextLoggedInAsRootUser:
             notification_service=NS.DummyNotificationService(),
             tracking_service=MagicMock(),
             onboarding_service=MagicMock(),
+            schema_catalog_service=MagicMock(),
+            cache_generation_service=MagicMock(),
+            thumbnail_render_service=MagicMock(),
         )
 
         self.context = self._server.test_request_context(
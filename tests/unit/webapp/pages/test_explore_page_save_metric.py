@@ -27,6 +27,7 @@ def test_metric_dialog_open(ctx, server: Flask):
             "metric_name_input": None,
             "metric_save_dialog": True,
             "metric_save_dialog_info": "",
+            "metric_thumbnail_render": no_update,
         }
 
 
@@ -49,6 +50,7 @@ def test_metric_dialog_close(ctx, server: Flask):
             "metric_name_input": None,
             "metric_save_dialog": False,
             "metric_save_dialog_info": "",
+            "metric_thumbnail_render": no_update,
         }
 
 
@@ -70,6 +72,7 @@ def test_metric_save_invalid_url(ctx, server: Flask):
         assert res == {
             "metric_name_input": no_update,
             "metric_save_dialog_info": "Couldn't save metric. Something went wrong.",
+            "metric_thumbnail_render": no_update,
             "metric_save_dialog": True,
         }
 
@@ -101,6 +104,7 @@ def test_metric_save_valid(
         assert res == {
             "metric_name_input": no_update,
             "metric_save_dialog_info": "",
+            "metric_thumbnail_render": no_update,
             "metric_save_dialog": False,
         }
         new_metric_id = dependencies.storage.list_saved_metrics()[0]
@@ -151,6 +155,7 @@ def test_metric_save_update_metric(
         assert res == {
             "metric_name_input": no_update,
             "metric_save_dialog_info": "",
+            "metric_thumbnail_render": no_update,
             "metric_save_dialog": False,
         }
 
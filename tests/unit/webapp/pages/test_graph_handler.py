@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import flask
+import pandas as pd
+
+import mitzu.model as M
+import mitzu.serialization as SE
+import mitzu.webapp.configs as configs
+import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.pages.explore.graph_handler as GH
+from tests.unit.webapp.fixtures import InMemoryCache
+
+
+def test_stale_metric_results_are_served_from_cache(
+    discovered_project: M.DiscoveredProject,
+):
+    cache = InMemoryCache()
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+    hash_key = GH.create_metric_hash_key(metric, "ns")
+
+    result = GH.get_metric_result(hash_key, metric, cache, MagicMock())
+    assert not result.from_cache
+    assert not result.is_stale
+
+    result = GH.get_metric_result(hash_key, metric, cache, MagicMock())
+    assert result.from_cache
+    assert not result.is_stale
+
+    expired_at = datetime.now() - timedelta(seconds=configs.CACHE_EXPIRATION + 1)
+    cache.put(hash_key + GH.AS_OF_SUFFIX, expired_at.timestamp())
+    with patch.object(M.SegmentationMetric, "get_df") as get_df:
+        result = GH.get_metric_result(hash_key, metric, cache, MagicMock())
+        get_df.assert_not_called()
+    assert result.from_cache
+    assert result.is_stale
+    assert result.as_of == expired_at
+    assert "refreshing" in GH.create_as_of_label(result).children
+
+    assert GH.start_revalidation(hash_key, cache)
+    assert not GH.start_revalidation(hash_key, cache)
+
+    GH.put_metric_result(hash_key, pd.DataFrame({"a": [1]}), cache)
+    result = GH.get_metric_result(hash_key, metric, cache, MagicMock())
+    assert not result.is_stale
+    assert list(result.df.columns) == ["a"]
+
+
+def test_revalidation_computes_the_cache_key_on_the_server(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+    project = dependencies.storage.get_project(discovered_project.project.id)
+    hash_key = GH.create_metric_hash_key(
+        metric, dependencies.cache_generation_service.get_namespace(project)
+    )
+    dependencies.cache.put("other_key", "other_value")
+    assert GH.start_revalidation(hash_key, dependencies.cache)
+
+    with server.test_request_context():
+        res = GH.handle_revalidation(
+            {
+                "project_id": project.id,
+                "metric": SE.to_compressed_string(metric),
+                "hash_key": "other_key",
+            }
+        )
+    assert res["hash_key"] == hash_key
+    assert dependencies.cache.get("other_key") == "other_value"
+    assert isinstance(dependencies.cache.get(hash_key), pd.DataFrame)
+    assert dependencies.cache.get(hash_key + GH.REVALIDATING_SUFFIX) is None
@@ -1,7 +1,9 @@
 from flask import Flask
+import pytest
 import mitzu.webapp.pages.projects.manage_project_component as MPP
 import mitzu.webapp.pages.projects.event_tables_config as ETC
 import mitzu.webapp.storage as S
+import mitzu.webapp.service.schema_catalog_service as SC
 from unittest.mock import patch
 from typing import Optional, List
 from tests.helper import to_dict
@@ -508,3 +510,32 @@ def test_manage_event_data_table_body_configure_properties(ctx, server: Flask):
         assert res[1]["children"][4]["props"]["children"] == "event_name"
         assert res[1]["children"][5]["props"]["children"] is None
         assert res[1]["children"][6]["props"]["children"] == "item"
+
+
+def test_configure_properties_reports_the_tables_failed_to_reflect(server: Flask):
+    with server.test_request_context(), patch.object(
+        SC.SchemaCatalogService,
+        "list_table_columns",
+        side_effect=PermissionError("permission denied for schema main"),
+    ):
+        tbl_body = [
+            get_table_row(
+                full_table_name="main.page_events",
+                check_box=True,
+                user_id_column="",
+                event_time_column="",
+                event_name_column="",
+                date_partition_column="",
+                ignore_cols="",
+            ),
+        ]
+        with pytest.raises(ValueError) as exc_info:
+            ETC.handle_configure_modal_confirm(
+                set_progress=lambda *args: print(args),
+                connection_id=S.SAMPLE_CONNECTION_ID,
+                tbl_body_children=tbl_body,
+                edt_properties=[["user_id"], ["event_time"], ["event_name"], [], []],
+            )
+        assert str(exc_info.value) == (
+            "Couldn't list the columns of main.page_events: permission denied for schema main"
+        )
@@ -0,0 +1,112 @@
+import flask
+import pandas as pd
+from dash import no_update
+
+import mitzu.model as M
+import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.pages.explore.table_handler as TAB
+import mitzu.webapp.pages.paths as P
+
+RESULT_DF = pd.DataFrame(
+    {
+        "_datetime": pd.date_range("2021-01-01", periods=50, freq="D").repeat(2),
+        "_group": ["a", "b"] * 50,
+        "_agg_value": range(100),
+    }
+)
+
+
+def test_table_pages_are_served_from_the_cached_result(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    m = discovered_project.create_notebook_class_model()
+    dependencies.cache.put("hash_key", RESULT_DF)
+    table_key = TAB.create_table_key("hash_key")
+    with server.test_request_context():
+        table = TAB.create_table(m.page_visit.config(), RESULT_DF, "hash_key")
+        assert table is not None
+        data_table = table.children[1]
+        assert data_table.page_action == "custom"
+        assert data_table.page_count == 5
+        assert len(data_table.data) == TAB.PAGE_SIZE
+        assert table.children[0].href == f"/metric_results/{table_key}.csv"
+        assert table.children[2].data == table_key
+
+        data, page_count = TAB.handle_table_page_change(
+            1, 20, [{"column_id": "Agg Value", "direction": "desc"}], "", table_key
+        )
+        assert page_count == 5
+        assert [row["Agg Value"] for row in data] == list(range(79, 59, -1))
+
+        data, page_count = TAB.handle_table_page_change(
+            0,
+            20,
+            [],
+            "{Group} contains b && {Agg Value} ge 90 && {Datetime} datestartswith 2021-02",
+            table_key,
+        )
+        assert page_count == 1
+        assert [row["Agg Value"] for row in data] == [91, 93, 95, 97, 99]
+
+        data, _ = TAB.handle_table_page_change(
+            0, 20, [], "{Datetime} < 2021-01-02 && {Group} = a", table_key
+        )
+        assert [row["Agg Value"] for row in data] == [0]
+
+        missing_key = TAB.create_table_key("missing")
+        assert TAB.handle_table_page_change(0, 20, [], "", missing_key) == (
+            no_update,
+            no_update,
+        )
+
+
+def test_tables_only_read_the_signed_metric_results(
+    server: flask.Flask, dependencies: DEPS.Dependencies
+):
+    dependencies.cache.put("hash_key", RESULT_DF)
+    dependencies.cache.put("other_entry", RESULT_DF)
+    table_key = TAB.create_table_key("hash_key")
+    assert TAB.get_result_hash_key(table_key) == "hash_key"
+
+    for key in [
+        "hash_key",
+        "other_entry",
+        table_key.replace("hash_key", "other_entry"),
+        table_key[:-1],
+        "",
+        None,
+    ]:
+        assert TAB.get_result_hash_key(key) is None
+        assert TAB.handle_table_page_change(0, 20, [], "", key) == (
+            no_update,
+            no_update,
+        )
+        with server.test_request_context():
+            assert TAB.create_csv_response(key or "").status_code == 404
+
+
+def test_csv_export_is_streamed_from_the_server(
+    server: flask.Flask, dependencies: DEPS.Dependencies
+):
+    dependencies.cache.put("hash_key", RESULT_DF)
+    table_key = TAB.create_table_key("hash_key")
+    csv_url = P.create_path(P.METRIC_RESULT_CSV_PATH, hash_key=table_key)
+
+    chunks = list(TAB.iterate_csv_chunks(RESULT_DF, chunk_size=30))
+    assert len(chunks) == 4
+    assert chunks[0].startswith("Datetime,Group,Agg Value\n")
+    assert not chunks[1].startswith("Datetime")
+
+    with server.test_request_context(csv_url):
+        response = TAB.create_csv_response(table_key)
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == "text/csv"
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 101
+        assert lines[1] == "2021-01-01,a,0"
+
+        missing_key = TAB.create_table_key("missing")
+        assert TAB.create_csv_response(missing_key).status_code == 404
@@ -0,0 +1,239 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import flask
+import pandas as pd
+import pytest
+
+import mitzu.adapters.sqlalchemy_adapter as SAA
+import mitzu.model as M
+import mitzu.visualization.common as C
+import mitzu.webapp.cron as CRON
+import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.model as WM
+import mitzu.webapp.pages.explore.graph_handler as GH
+import mitzu.webapp.service.dashboard_refresh_service as DRS
+import mitzu.webapp.prewarm as PW
+
+
+def create_test_chart() -> C.SimpleChart:
+    return C.SimpleChart(
+        title="title",
+        x_axis_label="x",
+        y_axis_label="y",
+        color_label="c",
+        yaxis_ticksuffix="x_s",
+        chart_type=M.SimpleChartType.LINE,
+        dataframe=pd.DataFrame(),
+    )
+
+
+def create_test_dashboard(
+    dependencies: DEPS.Dependencies, discovered_project: M.DiscoveredProject
+) -> WM.Dashboard:
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+    chart = create_test_chart()
+    saved_metric = WM.SavedMetric(
+        id="test_sm",
+        name="test_saved_metric",
+        project=discovered_project.project,
+        image_base64="",
+        small_base64="",
+        metric=metric,
+        chart=chart,
+        last_updated_at=datetime(2023, 1, 1),
+    )
+    dependencies.storage.set_saved_metric(saved_metric.id, saved_metric)
+    dashboard = WM.Dashboard(
+        "test_dash",
+        dashboard_metrics=[WM.DashboardMetric(saved_metric=saved_metric)],
+    )
+    dependencies.storage.set_dashboard(dashboard.id, dashboard)
+    return dashboard
+
+
+def test_cron_expression():
+    cron = CRON.CronExpression.parse("*/15 6-8 * * 1-5")
+    assert cron.matches(datetime(2023, 3, 6, 6, 30))  # monday
+    assert not cron.matches(datetime(2023, 3, 6, 6, 31))
+    assert not cron.matches(datetime(2023, 3, 6, 9, 0))
+    assert not cron.matches(datetime(2023, 3, 5, 6, 30))  # sunday
+
+    sundays = CRON.CronExpression.parse("0 0 * * 7")
+    assert sundays.matches(datetime(2023, 3, 5, 0, 0))
+
+    daily = CRON.CronExpression.parse("0 6 * * *")
+    assert daily.is_due(None, datetime(2023, 3, 6, 5, 0))
+    assert not daily.is_due(datetime(2023, 3, 6, 5, 0), datetime(2023, 3, 6, 5, 59))
+    assert daily.is_due(datetime(2023, 3, 6, 5, 0), datetime(2023, 3, 6, 6, 0))
+    assert not daily.is_due(datetime(2023, 3, 6, 6, 0), datetime(2023, 3, 6, 18, 0))
+    assert daily.is_due(datetime(2023, 3, 1, 6, 0), datetime(2023, 3, 6, 5, 0))
+
+    for invalid in ["* * * *", "60 * * * *", "*/0 * * * *", "a * * * *", "5-1 * * * *"]:
+        with pytest.raises(CRON.InvalidCronExpression):
+            CRON.CronExpression.parse(invalid)
+
+
+def test_dashboard_schedules_are_stored(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    storage = dependencies.storage
+    dashboard = create_test_dashboard(dependencies, discovered_project)
+
+    PW.main(["schedule", dashboard.id, "0 6 * * *"], deps=dependencies)
+    assert storage.list_dashboard_schedules() == [
+        WM.DashboardSchedule(dashboard_id=dashboard.id, cron="0 6 * * *")
+    ]
+    with pytest.raises(CRON.InvalidCronExpression):
+        PW.main(["schedule", dashboard.id, "0 6 * *"], deps=dependencies)
+
+    storage.clear_dashboard(dashboard.id)
+    assert storage.get_dashboard_schedule(dashboard.id) is None
+
+
+def test_dashboards_are_refreshed_by_schedule(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    storage = dependencies.storage
+    dashboard = create_test_dashboard(dependencies, discovered_project)
+    saved_metric = storage.get_saved_metric("test_sm")
+    service = DRS.DashboardRefreshService(
+        storage=storage,
+        cache=dependencies.cache,
+        cache_generation_service=dependencies.cache_generation_service,
+    )
+    storage.set_dashboard_schedule(
+        WM.DashboardSchedule(dashboard_id=dashboard.id, cron="0 6 * * *")
+    )
+
+    now = datetime(2023, 3, 6, 6, 0)
+    # the failed refreshes are retried at the next check
+    with patch.object(M.SegmentationMetric, "get_df") as get_df:
+        get_df.side_effect = ValueError("warehouse is down")
+        assert service.refresh_due_dashboards(now) == []
+    schedule = storage.get_dashboard_schedule(dashboard.id)
+    assert schedule is not None and schedule.last_run_at is None
+    with patch.object(
+        storage, "set_saved_metrics", side_effect=ValueError("storage is down")
+    ):
+        assert service.refresh_due_dashboards(now) == []
+
+    assert service.refresh_due_dashboards(now) == [dashboard.id]
+    assert service.refresh_due_dashboards(now) == []
+    schedule = storage.get_dashboard_schedule(dashboard.id)
+    assert schedule is not None and schedule.last_run_at == now
+
+    refreshed = storage.get_saved_metric("test_sm")
+    assert refreshed.chart.dataframe.shape[0] > 0
+    assert refreshed.last_updated_at > saved_metric.last_updated_at
+    assert refreshed.metric is not None and refreshed.project is not None
+
+    # the explore page serves the pre-computed result
+    hash_key = GH.create_metric_hash_key(
+        refreshed.metric,
+        dependencies.cache_generation_service.get_namespace(refreshed.project),
+    )
+    assert dependencies.cache.get(hash_key) is not None
+
+    with patch.object(M.SegmentationMetric, "get_df") as get_df:
+        results = service.refresh_saved_metrics([refreshed])
+        get_df.assert_not_called()
+    assert list(results.keys()) == ["test_sm"]
+
+    with patch.object(M.SegmentationMetric, "get_df") as get_df:
+        get_df.side_effect = ValueError("warehouse is down")
+        assert service.refresh_saved_metrics([refreshed], force=True) == {}
+
+
+def test_dashboard_refresh_reports_progress_and_stores_results_at_once(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    storage = dependencies.storage
+    dashboard = create_test_dashboard(dependencies, discovered_project)
+    service = DRS.DashboardRefreshService(
+        storage=storage,
+        cache=dependencies.cache,
+        cache_generation_service=dependencies.cache_generation_service,
+        concurrency=2,
+    )
+    finished = []
+    with patch.object(
+        storage, "set_saved_metrics", wraps=storage.set_saved_metrics
+    ) as set_saved_metrics:
+        results = service.refresh_dashboards(
+            [dashboard], on_refreshed=lambda sm: finished.append(sm.id)
+        )
+        set_saved_metrics.assert_called_once()
+    assert finished == ["test_sm"]
+    assert dashboard.dashboard_metrics[0].saved_metric is results["test_sm"]
+    assert storage.get_saved_metric("test_sm").chart.dataframe.shape[0] > 0
+
+    assert (
+        service.refresh_dashboards(
+            [dashboard], saved_metric_filter=lambda sm: sm.id != "test_sm"
+        )
+        == {}
+    )
+
+
+@pytest.mark.parametrize("keep_alive_connection", [True, False])
+def test_saved_metrics_are_refreshed_in_parallel_on_one_adapter(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+    keep_alive_connection: bool,
+):
+    m = discovered_project.create_notebook_class_model()
+    project = discovered_project.project
+    config = dict(start_dt="2021-01-01", end_dt="2023-01-01")
+    metrics = [
+        m.page_visit.config(**config),
+        m.checkout.config(**config),
+        m.page_visit.group_by(m.page_visit.domain).config(**config),
+        (m.page_visit >> m.checkout).config(**config),
+    ]
+    saved_metrics = [
+        WM.SavedMetric(
+            id=f"sm_{i}",
+            name=f"saved_metric_{i}",
+            project=project,
+            image_base64="",
+            small_base64="",
+            metric=metric,
+            chart=create_test_chart(),
+        )
+        for i, metric in enumerate(metrics)
+    ]
+    expected = {sm.id: sm.metric.get_df() for sm in saved_metrics if sm.metric}
+    adapter = project.get_adapter()
+    assert isinstance(adapter, SAA.SQLAlchemyAdapter)
+    service = DRS.DashboardRefreshService(
+        storage=dependencies.storage,
+        cache=dependencies.cache,
+        cache_generation_service=dependencies.cache_generation_service,
+        concurrency=4,
+    )
+
+    with patch.object(
+        type(adapter), "keep_alive_connection", return_value=keep_alive_connection
+    ):
+        results = service.refresh_saved_metrics(saved_metrics, force=True)
+
+    assert sorted(results.keys()) == sorted(expected.keys())
+    for sm_id, refreshed in results.items():
+        assert refreshed.metric is not None and refreshed.project is not None
+        hash_key = GH.create_metric_hash_key(
+            refreshed.metric,
+            dependencies.cache_generation_service.get_namespace(refreshed.project),
+        )
+        result_df = dependencies.cache.get(hash_key)
+        assert list(result_df.columns) == list(expected[sm_id].columns)
+        assert result_df.shape == expected[sm_id].shape
+    assert adapter._running_connections == set()
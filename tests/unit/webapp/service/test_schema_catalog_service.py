@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import mitzu.adapters.sqlalchemy_adapter as SAA
+import mitzu.model as M
+import mitzu.webapp.service.schema_catalog_service as SC
+from tests.unit.webapp.fixtures import InMemoryCache
+
+
+def test_schema_catalog_lists_and_caches_table_columns(
+    discovered_project: M.DiscoveredProject,
+):
+    connection = discovered_project.project.connection
+    service = SC.SchemaCatalogService(InMemoryCache())
+
+    assert "main" in service.list_schemas(connection)
+    assert "page_events" in service.list_tables(connection, "main")
+
+    columns = service.list_table_columns(
+        connection, "main", ["page_events", "add_to_carts", "missing_table"]
+    )
+    assert set(columns.keys()) == {"page_events", "add_to_carts"}
+    assert "user_id" in [f._get_name() for f in columns["page_events"]]
+
+    with patch.object(
+        SAA.SQLAlchemyAdapter, "list_all_table_columns_bulk"
+    ) as list_columns:
+        list_columns.return_value = {}
+        cached = service.list_table_columns(
+            connection, "main", ["page_events", "add_to_carts"]
+        )
+        assert cached == columns
+        list_columns.assert_not_called()
+
+        service.invalidate(connection.id, "main", ["page_events"])
+        service.list_table_columns(connection, "main", ["page_events", "add_to_carts"])
+        list_columns.assert_called_once_with("main", ["page_events"])
+
+
+def test_schema_catalog_invalidates_the_whole_connection(
+    discovered_project: M.DiscoveredProject,
+):
+    connection = discovered_project.project.connection
+    cache = InMemoryCache()
+    service = SC.SchemaCatalogService(cache)
+
+    service.list_schemas(connection)
+    service.list_tables(connection, "main")
+    service.list_table_columns(connection, "main", ["page_events"])
+    assert len(cache.list_keys(SC.SCHEMA_CATALOG_PREFIX)) == 3
+
+    service.invalidate(connection.id)
+    assert cache.list_keys(SC.SCHEMA_CATALOG_PREFIX) == []
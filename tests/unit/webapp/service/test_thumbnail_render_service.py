@@ -0,0 +1,149 @@
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from unittest.mock import patch
+
+import plotly.graph_objects as go
+
+import flask
+
+import mitzu.model as M
+import mitzu.visualization.charts as CHRT
+import mitzu.visualization.plot as PLT
+import mitzu.visualization.thumbnail as TN
+import mitzu.webapp.dependencies as DEPS
+import mitzu.webapp.pages.explore.graph_handler as GH
+import mitzu.webapp.service.thumbnail_render_service as TRS
+import mitzu.webapp.storage as S
+from tests.unit.webapp.fixtures import InMemoryCache
+
+IMAGE = "data:image/svg+xml;base64,PHN2Zz48L3N2Zz4="
+
+
+def test_thumbnails_are_rendered_once_per_figure(
+    tmp_path, discovered_project: M.DiscoveredProject
+):
+    # the images are stored by other threads, they wouldn't see an in-memory database
+    storage = S.MitzuStorage(f"sqlite:///{tmp_path}/storage.db?check_same_thread=False")
+    storage.init_db_schema()
+    storage.set_project(discovered_project.project.id, discovered_project.project)
+    service = TRS.ThumbnailRenderService(
+        storage,
+        InMemoryCache(),
+        executor_factory=ThreadPoolExecutor,
+        renderer=TRS.KALEIDO_RENDERER,
+    )
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+    chart = CHRT.get_simple_chart(metric, metric.get_df())
+
+    released = threading.Event()
+
+    def render(*args):
+        released.wait(timeout=10)
+        return IMAGE
+
+    with patch.object(TRS, "render_figure", side_effect=render) as render_figure:
+        for metric_id in ["first", "second"]:
+            thumbnail_metric_id = GH.store_rendered_saved_metric(
+                metric_name=metric_id,
+                metric=metric,
+                simple_chart=chart,
+                project=discovered_project.project,
+                storage=storage,
+                thumbnail_render_service=service,
+                metric_id=metric_id,
+            )
+            assert thumbnail_metric_id == metric_id
+            # the saved metric is stored before its thumbnail is rendered
+            assert storage.get_saved_metric(metric_id).image_base64 == (
+                PLT.EMPTY_IMAGE_BASE64
+            )
+            # the web server process submits the render after the background callback saved the metric
+            GH.render_saved_metric_thumbnail(metric_id, storage, service)
+
+        released.set()
+        service.shutdown(wait=True)
+        render_figure.assert_called_once()
+
+    for metric_id in ["first", "second"]:
+        saved_metric = storage.get_saved_metric(metric_id)
+        assert saved_metric.image_base64 == IMAGE
+        assert saved_metric.small_base64 == IMAGE
+
+    # the same figure is served from the cache
+    with patch.object(TRS, "render_figure") as render_figure:
+        future = service.render_saved_metric("third", chart, metric)
+        assert future.result() == IMAGE
+        render_figure.assert_not_called()
+
+    # thumbnails of deleted saved metrics are dropped
+    storage.clear_saved_metric("first")
+    with patch.object(TRS, "render_figure", return_value=IMAGE):
+        other_chart = replace(chart, title="other")
+        service.render_saved_metric("first", other_chart, metric).result()
+        service.shutdown(wait=True)
+    assert storage.list_saved_metrics() == ["second"]
+
+
+def test_figures_are_rendered_in_the_workers():
+    figure_json = go.Figure().to_json()
+    with patch.object(PLT, "figure_to_base64_image", return_value=IMAGE) as to_image:
+        assert TRS.render_figure(figure_json, 0.5, None) == IMAGE
+        assert to_image.call_args[0][1] == 0.5
+    assert TRS.create_figure_hash(figure_json, 0.5) != TRS.create_figure_hash(
+        figure_json, 1.0
+    )
+
+
+def test_svg_thumbnails_are_drawn_without_a_browser(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    m = discovered_project.create_notebook_class_model()
+    config = dict(start_dt="2021-01-01", end_dt="2023-01-01")
+    metrics = [
+        m.page_visit.group_by(m.page_visit.domain).config(**config),
+        (m.page_visit >> m.checkout).config(**config),
+        (m.page_visit >= m.checkout).config(
+            time_group=M.TimeGroup.TOTAL,
+            retention_window="1 week",
+            start_dt="2021-01-01",
+            end_dt="2021-03-01",
+        ),
+    ]
+    for metric in metrics:
+        simple_chart = CHRT.get_simple_chart(metric, metric.get_df())
+        for chart_type in M.SimpleChartType:
+            chart = replace(simple_chart, chart_type=chart_type)
+            started = time.perf_counter()
+            svg = TN.chart_to_svg(chart)
+            assert time.perf_counter() - started < 0.5
+            root = ET.fromstring(svg)
+            assert root.tag == "{http://www.w3.org/2000/svg}svg"
+            assert len(root) > 1, chart_type
+
+    empty_chart = replace(chart, dataframe=chart.dataframe.head(0))
+    assert ET.fromstring(TN.chart_to_svg(empty_chart)) is not None
+
+    # the svg thumbnails are stored with the saved metric
+    service = TRS.ThumbnailRenderService(
+        dependencies.storage, dependencies.cache, renderer=TRS.SVG_RENDERER
+    )
+    with patch.object(PLT, "figure_to_base64_image") as figure_to_base64_image:
+        thumbnail_metric_id = GH.store_rendered_saved_metric(
+            metric_name="svg",
+            metric=metrics[0],
+            simple_chart=CHRT.get_simple_chart(metrics[0], metrics[0].get_df()),
+            project=discovered_project.project,
+            storage=dependencies.storage,
+            thumbnail_render_service=service,
+            metric_id="svg",
+        )
+        figure_to_base64_image.assert_not_called()
+    assert thumbnail_metric_id is None
+    image = dependencies.storage.get_saved_metric("svg").image_base64
+    assert image.startswith("data:image/svg+xml;base64,")
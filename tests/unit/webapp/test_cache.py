@@ -0,0 +1,266 @@
+import pickle
+import sys
+from datetime import datetime
+from unittest.mock import MagicMock, call, patch
+
+import flask
+import pandas as pd
+import pytest
+
+import mitzu.webapp.cache as C
+import mitzu.webapp.cache_codec as CC
+import mitzu.webapp.configs as configs
+import mitzu.webapp.pages.explore.graph_handler as GH
+import mitzu.webapp.service.cache_generation_service as CGS
+from tests.unit.webapp.fixtures import InMemoryCache
+
+
+def test_lru_cache_serves_values_from_memory():
+    delegate = InMemoryCache()
+    cache = C.LRUMitzuCache(delegate, max_bytes=1024 * 1024, max_expire=600)
+    df = pd.DataFrame({"a": [1, 2, 3]})
+
+    cache.put("key", df)
+    assert delegate.get("key") is df
+
+    with patch.object(InMemoryCache, "get") as delegate_get:
+        res = cache.get("key")
+        delegate_get.assert_not_called()
+    pd.testing.assert_frame_equal(res, df)
+
+    res.columns = ["b"]
+    assert list(cache.get("key").columns) == ["a"]
+
+    cache.clear("key")
+    assert cache.get("key") is None
+    assert delegate.get("key") is None
+
+
+def test_lru_cache_is_bounded_by_size_and_expiration():
+    delegate = InMemoryCache()
+    cache = C.LRUMitzuCache(delegate, max_bytes=150, max_expire=600)
+
+    cache.put("a", "x" * 40)
+    cache.put("b", "y" * 40)
+    cache.get("a")
+    cache.put("c", "z" * 40)
+    assert set(cache._entries.keys()) == {"a", "c"}
+    assert cache.get("b") == "y" * 40  # loaded from the delegate
+
+    cache.put("too_large", "x" * 300)
+    assert "too_large" not in cache._entries
+    assert cache.get("too_large") == "x" * 300
+
+    expiring = C.LRUMitzuCache(delegate, max_bytes=1000, max_expire=0)
+    expiring.put("d", "value")
+    delegate.clear("d")
+    assert expiring.get("d") is None
+
+
+def test_lru_cache_does_not_keep_the_shared_state_of_the_workers():
+    delegate = InMemoryCache()
+    cache = C.LRUMitzuCache(delegate, max_bytes=1024 * 1024, max_expire=600)
+    generation_key = CGS.CacheGenerationService(cache)._get_project_key("project_id")
+    revalidating_key = "hash_key" + GH.REVALIDATING_SUFFIX
+
+    cache.put(generation_key, 1)
+    cache.put(revalidating_key, True)
+    assert cache.get(revalidating_key) is True
+    assert cache._entries == {}
+
+    # e.g. set by the background process
+    delegate.put(generation_key, 2)
+    delegate.clear(revalidating_key)
+    assert cache.get(generation_key) == 2
+    assert cache.get(revalidating_key) is None
+
+
+def test_lru_cache_keeps_the_values_until_they_expire_in_the_delegate():
+    redis_client = MagicMock()
+    codec = CC.PickleCodec()
+    cache = C.LRUMitzuCache(
+        C.RedisMitzuCache(redis_client, codec=codec),
+        max_bytes=1024 * 1024,
+        max_expire=600,
+    )
+    pipeline = redis_client.pipeline.return_value
+
+    # e.g. a failed query result cached for a few seconds by another worker
+    pipeline.execute.return_value = [
+        [codec.encode("short"), codec.encode("long")],
+        2000,
+        -1,
+    ]
+    with patch.object(C.time, "monotonic", return_value=100):
+        assert cache.get_many(["short", "long"]) == {"short": "short", "long": "long"}
+    pipeline.pttl.assert_has_calls([call("short"), call("long")])
+
+    pipeline.execute.return_value = [[None], -2]
+    with patch.object(C.time, "monotonic", return_value=101):
+        assert cache.get("short") == "short"
+    with patch.object(C.time, "monotonic", return_value=103):
+        assert cache.get("short") is None
+        assert cache.get("long") == "long"
+
+    # the caches not telling the expiration are not kept in memory
+    delegate = InMemoryCache()
+    delegate.put("key", "value")
+    cache = C.LRUMitzuCache(delegate, max_bytes=1024 * 1024, max_expire=600)
+    assert cache.get("key") == "value"
+    assert cache._entries == {}
+
+
+def test_request_cache_put_populates_the_request_cache():
+    delegate = InMemoryCache()
+    cache = C.RequestCache(delegate)
+    app = flask.Flask(__name__)
+    with app.app_context():
+        cache.put("key", "value")
+        delegate.clear("key")
+        assert cache.get("key") == "value"
+
+    assert cache.get("key") is None
+
+
+def test_pickle_codec_reads_legacy_values():
+    codec = CC.PickleCodec()
+    assert codec.decode(codec.encode({"a": [1, 2]})) == {"a": [1, 2]}
+    assert codec.decode(pickle.dumps("legacy")) == "legacy"
+
+
+@pytest.mark.parametrize("compression", [None, "zstd", "lz4"])
+def test_arrow_codec_round_trip(compression):
+    codec = CC.ArrowCodec(compression=compression)
+    df = pd.DataFrame(
+        {
+            "_datetime": [datetime(2021, 1, 1), datetime(2021, 1, 2)] * 10,
+            "_group": ["a", None] * 10,
+            "_user_count": range(20),
+        }
+    )
+    data = codec.encode(df)
+    assert data.startswith(CC.ARROW_HEADER)
+    pd.testing.assert_frame_equal(codec.decode(data), df)
+
+    mixed_df = pd.DataFrame({"_group": [1, "a", None]})
+    data = codec.encode(mixed_df)
+    assert data.startswith(CC.PICKLE_HEADER)
+    pd.testing.assert_frame_equal(codec.decode(data), mixed_df)
+    assert codec.decode(codec.encode([1, 2])) == [1, 2]
+
+
+def test_arrow_codec_falls_back_to_pickle():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+
+    class ArrowException(Exception):
+        pass
+
+    class ArrowMemoryError(ArrowException, MemoryError):
+        pass
+
+    pyarrow = MagicMock(ArrowException=ArrowException)
+    with patch.dict(sys.modules, {"pyarrow": pyarrow}), patch.object(
+        CC.ArrowCodec, "_encode_df", side_effect=ArrowMemoryError("out of memory")
+    ):
+        data = CC.ArrowCodec().encode(df)
+    assert data.startswith(CC.PICKLE_HEADER)
+    pd.testing.assert_frame_equal(CC.PickleCodec().decode(data), df)
+
+    # e.g. pyarrow built against another numpy version
+    with patch.dict(sys.modules, {"pyarrow": None}):
+        assert CC.create_codec("arrow", "zstd") == CC.PickleCodec()
+        data = CC.ArrowCodec().encode(df)
+    assert data.startswith(CC.PICKLE_HEADER)
+
+
+@pytest.mark.parametrize("global_prefix", [None, "mitzu"])
+def test_disk_cache_lists_and_clears_keys_by_prefix(
+    tmp_path, monkeypatch, global_prefix
+):
+    monkeypatch.chdir(tmp_path)
+    cache = C.DiskMitzuCache("cache", global_prefix=global_prefix)
+    for key in ["a.1", "a.2", "ab.1", "b.1"]:
+        cache.put(key, key)
+    cache.put("a.expired", "value", expire=-1)
+
+    assert sorted(cache.list_keys()) == ["a.1", "a.2", "ab.1", "b.1"]
+    assert sorted(cache.list_keys("a.")) == ["1", "2"]
+    assert sorted(cache.list_keys("a.", strip_prefix=False)) == ["a.1", "a.2"]
+
+    cache.clear_all("a.")
+    assert sorted(cache.list_keys()) == ["ab.1", "b.1"]
+    assert cache.get("ab.1") == "ab.1"
+
+    cache.clear_all()
+    assert cache.list_keys() == []
+
+
+def test_redis_cache_scans_and_unlinks_keys_in_batches(monkeypatch):
+    monkeypatch.setattr(configs, "CACHE_CLEAR_BATCH_SIZE", 2)
+    redis_client = MagicMock()
+    redis_client.scan_iter.return_value = [b"mitzu.a.1", b"mitzu.a.2", b"mitzu.a.3"]
+    cache = C.RedisMitzuCache(
+        redis_client, global_prefix="mitzu", codec=CC.PickleCodec()
+    )
+
+    assert cache.list_keys("a.") == ["1", "2", "3"]
+    assert cache.list_keys() == ["a.1", "a.2", "a.3"]
+    redis_client.scan_iter.assert_called_with(match="mitzu.*", count=2)
+
+    pipeline = redis_client.pipeline.return_value
+    cache.clear_all("a.")
+    redis_client.scan_iter.assert_called_with(match="mitzu.a.*", count=2)
+    pipeline.unlink.assert_has_calls(
+        [call("mitzu.a.1", "mitzu.a.2"), call("mitzu.a.3")]
+    )
+    redis_client.publish.assert_called_with(
+        "mitzu.__INVALIDATE__", f"{cache._instance_id}:P:a."
+    )
+
+
+def test_disk_cache_multi_key_operations(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = C.DiskMitzuCache("cache", global_prefix="mitzu")
+
+    cache.put("a", 1)
+    cache.put("a", 2)
+    assert cache.get("a") == 2
+
+    cache.put_many({"b": 3, "c": 4})
+    assert cache.get_many(["a", "b", "c", "missing"]) == {"a": 2, "b": 3, "c": 4}
+
+    cache.clear_many(["a", "b"])
+    assert cache.list_keys() == ["c"]
+
+    assert cache.add("a", 5, expire=10)
+    assert not cache.add("a", 6, expire=10)
+    assert cache.get("a") == 5
+
+
+def test_redis_cache_multi_key_operations():
+    redis_client = MagicMock()
+    codec = CC.PickleCodec()
+    cache = C.RedisMitzuCache(redis_client, global_prefix="mitzu", codec=codec)
+
+    redis_client.mget.return_value = [codec.encode(1), None]
+    assert cache.get_many(["a", "b"]) == {"a": 1}
+    redis_client.mget.assert_called_once_with(["mitzu.a", "mitzu.b"])
+
+    pipeline = redis_client.pipeline.return_value
+    pipeline.execute.return_value = [True, 1, True, 1]
+    cache.put_many({"a": 1, "b": 2}, expire=10)
+    pipeline.set.assert_has_calls(
+        [
+            call(name="mitzu.a", value=codec.encode(1), ex=10),
+            call(name="mitzu.b", value=codec.encode(2), ex=10),
+        ]
+    )
+
+    cache.clear_many(["a", "b"])
+    pipeline.unlink.assert_called_once_with("mitzu.a", "mitzu.b")
+
+    redis_client.set.return_value = None
+    assert not cache.add("a", 1, expire=10)
+    redis_client.set.assert_called_once_with(
+        name="mitzu.a", value=codec.encode(1), ex=10, nx=True
+    )
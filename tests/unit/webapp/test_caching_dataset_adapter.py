@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+import mitzu.adapters.sqlalchemy_adapter as SAA
+import mitzu.model as M
+import mitzu.webapp.caching_dataset_adapter as CDA
+import mitzu.webapp.service.cache_generation_service as CGS
+from tests.unit.webapp.fixtures import InMemoryCache
+
+
+def create_adapter(
+    discovered_project: M.DiscoveredProject, cache: InMemoryCache, **kwargs
+) -> CDA.CachingDatasetAdapter:
+    expirations = CDA.CacheExpirations(metric=600, query=600, discovery=600, **kwargs)
+    return CDA.CachingDatasetAdapter(
+        discovered_project.project.get_adapter(), cache, expirations
+    )
+
+
+def test_metric_results_are_cached(discovered_project: M.DiscoveredProject):
+    cache = InMemoryCache()
+    adapter = create_adapter(discovered_project, cache)
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+
+    CDA.STATS.reset()
+    df = adapter.get_segmentation_df(metric)
+    assert CDA.STATS.misses == {CDA.METRIC: 1}
+
+    with patch.object(SAA.SQLAlchemyAdapter, "get_segmentation_df") as get_df:
+        cached_df = adapter.get_segmentation_df(metric)
+        get_df.assert_not_called()
+    pd.testing.assert_frame_equal(df, cached_df)
+    assert CDA.STATS.hits == {CDA.METRIC: 1}
+    assert CDA.STATS.hit_ratio(CDA.METRIC) == 0.5
+
+    # same query of another adapter instance uses the same key
+    other_adapter = create_adapter(discovered_project, cache)
+    with patch.object(SAA.SQLAlchemyAdapter, "get_segmentation_df") as get_df:
+        other_adapter.get_segmentation_df(metric)
+        get_df.assert_not_called()
+
+    adapter.clear_metric(metric)
+    assert cache.list_keys(CDA.METRIC_PREFIX) == []
+
+
+def test_errors_are_cached_for_a_short_period(
+    discovered_project: M.DiscoveredProject,
+):
+    cache = InMemoryCache()
+    adapter = create_adapter(discovered_project, cache, error=10)
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+
+    with patch.object(SAA.SQLAlchemyAdapter, "get_segmentation_df") as get_df:
+        get_df.side_effect = ValueError("warehouse is down")
+        with pytest.raises(ValueError):
+            adapter.get_segmentation_df(metric)
+
+        with pytest.raises(CDA.CachedAdapterError, match="warehouse is down"):
+            adapter.get_segmentation_df(metric)
+        get_df.assert_called_once()
+
+
+def test_disabled_expiration_bypasses_the_cache(
+    discovered_project: M.DiscoveredProject,
+):
+    cache = InMemoryCache()
+    adapter = CDA.CachingDatasetAdapter(
+        discovered_project.project.get_adapter(),
+        cache,
+        CDA.CacheExpirations(metric=0, query=0, discovery=0),
+    )
+    edt = discovered_project.project.event_data_tables[0]
+    assert len(adapter.get_distinct_event_names(edt)) > 0
+    assert cache.list_keys() == []
+
+
+def test_bumping_generations_invalidates_the_cached_results(
+    discovered_project: M.DiscoveredProject,
+):
+    cache = InMemoryCache()
+    generations = CGS.CacheGenerationService(cache)
+    project = discovered_project.project
+    adapter = CDA.CachingDatasetAdapter(
+        project.get_adapter(),
+        cache,
+        CDA.CacheExpirations(metric=600, query=600, discovery=600),
+        generations=generations,
+    )
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+
+    namespace = generations.get_namespace(project)
+    df = adapter.get_segmentation_df(metric)
+    assert len(cache.list_keys(CDA.METRIC_PREFIX + namespace)) == 1
+
+    for bump in [
+        lambda: generations.bump_project(project.id),
+        lambda: generations.bump_connection(project.connection.id),
+    ]:
+        bump()
+        assert generations.get_namespace(project) != namespace
+        namespace = generations.get_namespace(project)
+        with patch.object(SAA.SQLAlchemyAdapter, "get_segmentation_df") as get_df:
+            get_df.return_value = df
+            adapter.get_segmentation_df(metric)
+            get_df.assert_called_once()
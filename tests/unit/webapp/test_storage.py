@@ -1,7 +1,24 @@
+import base64
+import json
+from dataclasses import replace
+from typing import Dict
+from unittest.mock import MagicMock, patch
+
+import flask
+import pandas as pd
 import pytest
+import sqlalchemy as SA
 from hypothesis import HealthCheck, given, settings
+import mitzu.adapters.sqlalchemy_adapter as SAA
+import mitzu.model as M
+import mitzu.webapp.dependencies as DEPS
 import mitzu.webapp.storage as S
+import mitzu.webapp.webapp as WA
+import mitzu.webapp.storage_model as SM
 import mitzu.webapp.model as WM
+from mitzu.visualization.common import SimpleChart
+import mitzu.webapp.service.cache_generation_service as CGS
+from tests.unit.webapp.fixtures import InMemoryCache
 from tests.unit.webapp.generators import (
     connection,
     project,
@@ -114,6 +131,432 @@ def test_storing_discovered_projects(project):
             assert stored_event_def == event_def.get_value()
 
 
+def test_storing_reflected_table_columns(discovered_project: M.DiscoveredProject):
+    storage = create_storage()
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+
+    stored_project = storage.get_project(project.id)
+    adapter = stored_project.get_adapter()
+    assert isinstance(adapter, SAA.SQLAlchemyAdapter)
+    for edt in project.event_data_tables:
+        stored_columns = stored_project.get_table_columns(edt)
+        expected_columns = project.get_table_columns(edt)
+        assert stored_columns is not None and expected_columns is not None
+        assert [name for name, _ in stored_columns] == [
+            name for name, _ in expected_columns
+        ]
+        assert adapter.list_fields(edt) == project.get_adapter().list_fields(edt)
+        assert f"{edt.schema}.{edt.table_name}" in adapter._restored_tables
+
+    # Without the known columns the tables are reflected again
+    stored_project._table_columns.set_value(None)
+    for edt in project.event_data_tables:
+        adapter.get_table(edt)
+        assert f"{edt.schema}.{edt.table_name}" not in adapter._restored_tables
+        assert stored_project.get_table_columns(edt) is not None
+
+
+def test_storing_projects_bumps_cache_generations(
+    discovered_project: M.DiscoveredProject,
+):
+    generations = CGS.CacheGenerationService(InMemoryCache())
+    storage = S.MitzuStorage(cache_generations=generations)
+    storage.init_db_schema()
+    project = discovered_project.project
+
+    namespaces = {generations.get_namespace(project)}
+    storage.set_project(project.id, project)
+    namespaces.add(generations.get_namespace(project))
+    storage.set_connection(project.connection.id, project.connection)
+    namespaces.add(generations.get_namespace(project))
+    assert len(namespaces) == 3
+
+
+def test_populating_discovered_project_in_bulk(
+    discovered_project: M.DiscoveredProject,
+):
+    storage = create_storage()
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+
+    stored_project = storage.get_project(project.id)
+    stored_dp = stored_project._discovered_project.get_value()
+    assert stored_dp is not None
+    storage.populate_discovered_project(stored_dp)
+
+    for edt, defs in discovered_project.definitions.items():
+        for event_name, event_def in defs.items():
+            stored_def = stored_dp.definitions[edt][event_name]._value_state.get_value()
+            assert stored_def == event_def.get_value()
+
+
+def test_reading_legacy_event_definitions(discovered_project: M.DiscoveredProject):
+    storage = create_storage()
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+
+    edt = project.event_data_tables[0]
+    event_def = list(discovered_project.definitions[edt].values())[
+        0
+    ].get_value_if_exists()
+    legacy_fields = [
+        {
+            "_event_name": f._event_name,
+            "_field": SM.serialize_field(f._field),
+            "_event_data_table_id": edt.id,
+            "_enums": f._enums,
+        }
+        for f in event_def._fields
+    ]
+    with storage._new_db_session() as session:
+        storage._delete_event_def_fields([event_def.get_id()], session)
+        record = session.query(SM.EventDefStorageRecord).get(event_def.get_id())
+        record.fields = json.dumps(legacy_fields)
+        session.commit()
+
+    assert storage.get_event_definition(edt, event_def.get_id()) == event_def
+
+
+def test_storing_event_definitions_in_bulk(discovered_project: M.DiscoveredProject):
+    storage = create_storage()
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+
+    edt = project.event_data_tables[0]
+    event_def = list(discovered_project.definitions[edt].values())[
+        0
+    ].get_value_if_exists()
+
+    def create_definitions(prefix: str, count: int) -> Dict[str, M.Reference]:
+        return {
+            f"{prefix}_{i}": M.Reference.create_from_value(
+                replace(
+                    event_def, _event_name=f"{prefix}_{i}", _id=f"{prefix}_{i}_{count}"
+                )
+            )
+            for i in range(count)
+        }
+
+    statement_counts = []
+    for prefix, count in [("small", 1), ("large", S.BULK_WRITE_BATCH_SIZE + 1)]:
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        SA.event.listen(storage._engine, "before_cursor_execute", count_statement)
+        storage.set_event_data_table_definition(edt, create_definitions(prefix, count))
+        SA.event.remove(storage._engine, "before_cursor_execute", count_statement)
+        statement_counts.append(len(statements))
+    # only the id lists of the deletes are split into batches
+    assert statement_counts[1] == statement_counts[0] + 2
+
+    # the discovered definitions replace the earlier ones of the table
+    definitions = create_definitions("large", 10)
+    storage.set_event_data_table_definition(edt, definitions)
+    with storage._new_db_session() as session:
+        stored_ids = {
+            row.id
+            for row in session.query(SM.EventDefStorageRecord.id).filter(
+                SM.EventDefStorageRecord.event_data_table_id == edt.id
+            )
+        }
+    assert stored_ids == {ref.get_id() for ref in definitions.values()}
+    for ref in definitions.values():
+        ref_id = ref.get_id()
+        assert ref_id is not None
+        stored_def = storage.get_event_definition(edt, ref_id)
+        assert stored_def._event_name == ref.get_value_if_exists()._event_name
+        assert [f._field for f in stored_def._fields] == [
+            f._field for f in event_def._fields
+        ]
+
+    # storing a loaded project doesn't rewrite its definitions
+    stored_project = storage.get_project(project.id)
+    with patch.object(storage, "_set_event_data_table_definition") as set_definition:
+        storage.set_project(stored_project.id, stored_project)
+        set_definition.assert_not_called()
+    assert storage.get_event_definition(edt, "large_0_10") is not None
+
+
+def test_loading_dashboards_with_fixed_number_of_queries(
+    discovered_project: M.DiscoveredProject,
+):
+    storage = create_storage()
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+    m = discovered_project.create_notebook_class_model()
+    metric = m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01")
+    chart = SimpleChart(
+        title="title",
+        x_axis_label="x",
+        y_axis_label="y",
+        color_label="c",
+        yaxis_ticksuffix="",
+        chart_type=M.SimpleChartType.LINE,
+        dataframe=pd.DataFrame(),
+    )
+
+    dashboards = []
+    for metric_count in [1, 5]:
+        saved_metrics = [
+            WM.SavedMetric(
+                name=f"metric_{i}",
+                chart=chart,
+                image_base64="",
+                small_base64="",
+                project=project,
+                metric=metric,
+            )
+            for i in range(metric_count)
+        ]
+        for sm in saved_metrics:
+            storage.set_saved_metric(sm.id, sm)
+        dashboard = WM.Dashboard(
+            name=f"dashboard_{metric_count}",
+            dashboard_metrics=[WM.DashboardMetric(sm) for sm in saved_metrics],
+        )
+        storage.set_dashboard(dashboard.id, dashboard)
+        dashboards.append(dashboard)
+
+    query_counts = []
+    for dashboard in dashboards:
+        # the changed project is loaded again
+        storage.set_project(project.id, project)
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        SA.event.listen(storage._engine, "before_cursor_execute", count_statement)
+        loaded = storage.get_dashboard(dashboard.id)
+        SA.event.remove(storage._engine, "before_cursor_execute", count_statement)
+        query_counts.append(len(statements))
+
+        assert [dm.id for dm in loaded.dashboard_metrics] == [
+            dm.id for dm in dashboard.dashboard_metrics
+        ]
+        loaded_metrics = [dm.saved_metric for dm in loaded.dashboard_metrics]
+        assert all(sm is not None for sm in loaded_metrics)
+        assert len({id(sm.project) for sm in loaded_metrics if sm is not None}) == 1
+    assert query_counts[0] == query_counts[1]
+
+    assert [d.id for d in storage.get_dashboards([dashboards[1].id, "missing"])] == [
+        dashboards[1].id
+    ]
+    sm_ids = storage.list_saved_metrics()
+    assert [sm.id for sm in storage.get_saved_metrics(sm_ids)] == sm_ids
+
+
+def test_sqlite_storage_pragmas_and_indexes(tmp_path):
+    connection_string = f"sqlite:///{tmp_path}/storage.db?check_same_thread=False"
+    storage = S.MitzuStorage(connection_string)
+    storage.init_db_schema()
+    # databases created before the index was declared get it on the next start
+    index = next(
+        index
+        for index in SM.EventDataTableStorageRecord.__table__.indexes
+        if "project_id" in index.columns
+    )
+    index.drop(storage._engine)
+    storage.init_db_schema()
+    assert index.name in {
+        idx["name"]
+        for idx in SA.inspect(storage._engine).get_indexes(
+            SM.EventDataTableStorageRecord.__tablename__
+        )
+    }
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    SA.event.listen(storage._engine, "before_cursor_execute", count_statement)
+    storage.list_projects()
+    SA.event.remove(storage._engine, "before_cursor_execute", count_statement)
+    assert not any("PRAGMA" in statement for statement in statements)
+
+    with storage._new_db_session() as session:
+        assert session.execute("PRAGMA journal_mode").scalar() == "wal"
+        assert session.execute("PRAGMA foreign_keys").scalar() == 1
+
+
+def test_read_only_methods_use_the_read_database(
+    tmp_path, discovered_project: M.DiscoveredProject
+):
+    primary = f"sqlite:///{tmp_path}/primary.db?check_same_thread=False"
+    replica = f"sqlite:///{tmp_path}/replica.db?check_same_thread=False"
+    storage = S.MitzuStorage(primary, read_connection_string=replica, pool_size=1)
+    storage.init_db_schema()
+    replica_storage = S.MitzuStorage(replica)
+    replica_storage.init_db_schema()
+
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+    assert storage.list_projects() == []
+    assert not storage.project_exists(project.id)
+
+    # the replica caught up
+    replica_storage.set_project(project.id, project)
+    assert [p.id for p in storage.list_projects()] == [project.id]
+    storage.health_check()
+
+    delayed_storage = S.MitzuStorage(
+        primary, read_connection_string=replica, read_after_write_seconds=60
+    )
+    assert delayed_storage.list_connections() == [project.connection.id]
+    delayed_storage.delete_project(project.id)
+    # the own writes are read from the primary
+    assert delayed_storage.list_projects() == []
+
+
+def test_loaded_projects_are_reused_until_they_change(
+    tmp_path, discovered_project: M.DiscoveredProject
+):
+    connection_string = f"sqlite:///{tmp_path}/storage.db?check_same_thread=False"
+    storage = S.MitzuStorage(connection_string)
+    storage.init_db_schema()
+    other_worker_storage = S.MitzuStorage(connection_string)
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+
+    def count_get_project_statements() -> int:
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        SA.event.listen(storage._engine, "before_cursor_execute", count_statement)
+        storage.get_project(project.id)
+        SA.event.remove(storage._engine, "before_cursor_execute", count_statement)
+        return len(statements)
+
+    load_statements = count_get_project_statements()
+    # only the version is checked
+    assert count_get_project_statements() == 1
+
+    storage.set_project(project.id, project)
+    assert count_get_project_statements() == load_statements
+    assert count_get_project_statements() == 1
+
+    other_worker_storage.set_connection(project.connection.id, project.connection)
+    assert count_get_project_statements() == load_statements
+
+    edt = project.event_data_tables[0]
+    other_worker_storage.set_event_data_table_definition(
+        edt, discovered_project.definitions[edt]
+    )
+    assert count_get_project_statements() == load_statements
+
+    other_worker_storage.delete_project(project.id)
+    with pytest.raises(ValueError):
+        storage.get_project(project.id)
+
+
+def test_reused_projects_are_not_shared_by_the_callers(
+    discovered_project: M.DiscoveredProject,
+):
+    storage = create_storage()
+    project = discovered_project.project
+    storage.set_project(project.id, project)
+    edt = project.event_data_tables[0]
+
+    loaded = storage.get_project(project.id)
+    loaded.set_adapter(MagicMock())
+    loaded.restore_table_columns(edt, [("modified", None)])
+    loaded._discovered_project.set_value(None)
+    loaded.event_data_tables.clear()
+
+    other = storage.get_project(project.id)
+    assert other is not loaded
+    assert other.get_adapter() is not loaded.get_adapter()
+    assert not isinstance(other.get_adapter(), MagicMock)
+    assert len(other.event_data_tables) == len(project.event_data_tables)
+    assert other.get_table_columns(other.event_data_tables[0]) != [("modified", None)]
+    assert other._discovered_project.get_value() is not None
+
+
+def test_saved_metric_images_are_stored_separately(
+    server: flask.Flask,
+    dependencies: DEPS.Dependencies,
+    discovered_project: M.DiscoveredProject,
+):
+    storage = dependencies.storage
+    project = discovered_project.project
+    m = discovered_project.create_notebook_class_model()
+    image = "data:image/svg+xml;base64," + base64.b64encode(b"<svg></svg>").decode()
+    saved_metrics = [
+        WM.SavedMetric(
+            name=f"metric_{i}",
+            chart=SimpleChart(
+                title="title",
+                x_axis_label="x",
+                y_axis_label="y",
+                color_label="c",
+                yaxis_ticksuffix="",
+                chart_type=M.SimpleChartType.LINE,
+                dataframe=pd.DataFrame(),
+            ),
+            image_base64=image,
+            small_base64=image,
+            project=project,
+            metric=m.page_visit.config(start_dt="2021-01-01", end_dt="2023-01-01"),
+        )
+        for i in range(2)
+    ]
+    storage.set_saved_metrics(saved_metrics)
+    with storage._new_db_session() as session:
+        assert session.query(SM.ImageStorageRecord).count() == 1
+
+    sm_ids = [sm.id for sm in saved_metrics]
+    assert [sm.small_base64 for sm in storage.get_saved_metrics(sm_ids)] == [
+        image,
+        image,
+    ]
+    lean_metrics = storage.get_saved_metrics(sm_ids, with_images=False)
+    image_url = lean_metrics[0].small_base64
+    image_id = S.get_image_id_from_url(image_url)
+    assert image_id is not None
+    assert image_url == S.create_image_url(SM.ImageStorageRecord.create_image_id(image))
+
+    # storing the metric loaded without images keeps its images
+    storage.set_saved_metric(lean_metrics[0].id, lean_metrics[0])
+    assert storage.get_saved_metric(lean_metrics[0].id).image_base64 == image
+
+    with server.test_request_context(image_url):
+        response = WA.create_image_response(image_id)
+        assert response.status_code == 200
+        assert response.mimetype == "image/svg+xml"
+        assert response.get_data() == b"<svg></svg>"
+        assert response.get_etag() == (image_id, False)
+        assert response.cache_control.private
+        assert not response.cache_control.public
+    with server.test_request_context(
+        image_url, headers={"If-None-Match": f'"{image_id}"'}
+    ):
+        assert WA.create_image_response(image_id).status_code == 304
+
+    for sm_id in sm_ids:
+        storage.clear_saved_metric(sm_id)
+    assert storage.get_image(image_id) is None
+
+    # the records stored before the images table keep their images inline
+    legacy_record = SM.SavedMetricStorageRecord.from_model_instance(saved_metrics[0])
+    legacy_record.image_base64 = image
+    legacy_record.small_image_base64 = image
+    with storage._new_db_session() as session:
+        session.add(legacy_record)
+        session.commit()
+    assert (
+        storage.get_saved_metrics([saved_metrics[0].id], with_images=False)[
+            0
+        ].small_base64
+        == image
+    )
+
+
 @given(user(), user())
 @settings(deadline=None, max_examples=MAX_EXAMPLES)
 def test_storing_users(user, updated_user):
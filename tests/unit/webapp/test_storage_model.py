@@ -69,7 +69,10 @@ def test_saved_metric_storage_record(saved_metric):
 
     sm = SavedMetricStorageRecord().from_model_instance(saved_metric)
 
-    parsed_dict = sm.as_model_instance(saved_metric.project).__dict__
+    # the images are stored in a separate table
+    assert sm.image_base64 is None
+    images = (saved_metric.image_base64, saved_metric.small_base64)
+    parsed_dict = sm.as_model_instance(saved_metric.project, images).__dict__
     for key, value in saved_metric.__dict__.items():
         if key != "chart" and not key.startswith("_"):
             assert value == parsed_dict[key]